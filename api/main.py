@@ -2,17 +2,39 @@
 FastAPI server for ASO Rank Guard Dashboard
 Serves data from Supabase to the HTML dashboard
 """
-from fastapi import FastAPI, HTTPException, Depends, Header
+from fastapi import FastAPI, HTTPException, Depends, Header, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from datetime import datetime, timedelta
 from typing import Optional
+import asyncio
+import logging
 import os
+import sys
+import time
+import numpy as np
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from supabase._async.client import AsyncClient, create_client as acreate_client
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Ensure src/ is in the import path
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(BASE_DIR, "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from columnar import COLUMNAR_MEDIA_TYPE, encode_rankings, serialize, wants_columnar
+from downsampling import downsample_indices
+from history_export import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, STREAM_MEDIA_TYPES,
+    decode_cursor, encode_cursor, iter_csv, iter_ndjson
+)
+from http_cache import build_validators, is_not_modified, window_start
+from live_feed import SSE_HEADERS, SSE_MEDIA_TYPE, LiveFeed
+
 app = FastAPI(title="ASO Rank Guard API", version="2.0")
 
 # CORS para permitir acceso desde el dashboard
@@ -24,14 +46,144 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Supabase client
-supabase: Client = create_client(
-    os.getenv("SUPABASE_URL"),
-    os.getenv("SUPABASE_SERVICE_ROLE_KEY")  # Service role para server-side
-)
+# Supabase client (async: las queries no bloquean el event loop)
+supabase: Optional[AsyncClient] = None
 
 APP_ID = "d30da119-98d7-4c12-9e9f-13f3726c82fe"
 
+# Máximo de queries simultáneas a PostgREST por petición
+MAX_CONCURRENT_QUERIES = int(os.getenv("SUPABASE_MAX_CONCURRENT_QUERIES", 10))
+
+
+@app.on_event("startup")
+async def init_supabase():
+    """Crear cliente async de Supabase al arrancar"""
+    global supabase
+    supabase = await acreate_client(
+        os.getenv("SUPABASE_URL"),
+        os.getenv("SUPABASE_SERVICE_ROLE_KEY")  # Service role para server-side
+    )
+
+
+async def gather_limited(*coros, limit: int = MAX_CONCURRENT_QUERIES):
+    """
+    asyncio.gather con concurrencia acotada
+    
+    Evita lanzar cientos de queries a la vez cuando hay muchas keywords.
+    """
+    semaphore = asyncio.Semaphore(limit)
+    
+    async def run(coro):
+        async with semaphore:
+            return await coro
+    
+    return await asyncio.gather(*(run(c) for c in coros))
+
+
+# === DATA VERSION / CONDITIONAL GET ===
+
+# Segundos que se reutiliza la versión de datos antes de volver a consultarla
+DATA_VERSION_TTL = float(os.getenv("DATA_VERSION_TTL", 10))
+
+_data_version = {"value": None, "checked_at": 0.0}
+
+
+async def get_data_version() -> Optional[str]:
+    """
+    Versión de los datos: completed_at del último tracking_job completado
+    
+    Se consulta como mucho una vez cada DATA_VERSION_TTL segundos, así que
+    la mayoría de polls no hacen ninguna query.
+    """
+    now = time.monotonic()
+    
+    if now - _data_version["checked_at"] < DATA_VERSION_TTL:
+        return _data_version["value"]
+    
+    result = await supabase.table("tracking_jobs")\
+        .select("completed_at")\
+        .eq("app_id", APP_ID)\
+        .eq("status", "completed")\
+        .order("completed_at", desc=True)\
+        .limit(1)\
+        .execute()
+    
+    _data_version["value"] = result.data[0]["completed_at"] if result.data else None
+    _data_version["checked_at"] = now
+    
+    return _data_version["value"]
+
+
+async def data_timestamp() -> str:
+    """
+    Momento de los datos servidos: completed_at del último tracking
+    
+    Las respuestas con ETag fuerte no pueden llevar datetime.now(): dos 200
+    con el mismo ETag tendrían bytes distintos. Sin tracking completado (y
+    entonces sin ETag) se usa la hora actual.
+    """
+    return await get_data_version() or datetime.now().isoformat()
+
+
+async def check_not_modified(request: Request, response: Response, endpoint: str,
+                             params: tuple = (), window: Optional[str] = None):
+    """
+    Poner ETag / Last-Modified y decidir si basta con un 304
+    
+    Se evalúa antes de cualquier query de datos.
+    
+    Args:
+        request: Petición (cabeceras condicionales)
+        response: Respuesta donde se ponen los validadores
+        endpoint: Nombre del endpoint
+        params: Parámetros de la query que afectan a la respuesta
+        window: 'day'/'hour' si la respuesta depende de una ventana relativa a ahora
+    
+    Returns:
+        Response 304 si el cliente ya tiene la versión actual, None si no
+    """
+    version = await get_data_version()
+    
+    if version is None:
+        return None
+    
+    try:
+        last_modified = datetime.fromisoformat(version.replace("Z", "+00:00"))
+    except ValueError:
+        last_modified = None  # Solo ETag
+    
+    bucket = window_start(window)
+    if bucket is not None:
+        params = params + (bucket.isoformat(),)
+        if last_modified is not None:
+            last_modified = max(last_modified, bucket.astimezone())
+    
+    validators = build_validators(version, last_modified, endpoint, params)
+    
+    if "vary" in response.headers:
+        validators["Vary"] = response.headers["vary"]
+    
+    if is_not_modified(request.headers, validators):
+        return Response(status_code=304, headers=validators)
+    
+    response.headers.update(validators)
+    return None
+
+
+def columnar_response(payload: dict, response: Response) -> Response:
+    """
+    Serializar un payload columnar conservando los validadores ya puestos
+    
+    Al devolver un Response propio FastAPI no copia las cabeceras de
+    `response`, así que se trasladan aquí.
+    """
+    headers = {
+        name: response.headers[name]
+        for name in ("etag", "last-modified", "cache-control", "vary")
+        if name in response.headers
+    }
+    return Response(content=serialize(payload), media_type=COLUMNAR_MEDIA_TYPE, headers=headers)
+
 
 # === AUTH MIDDLEWARE ===
 async def get_current_user(authorization: Optional[str] = Header(None)):
@@ -60,109 +212,182 @@ async def root():
         "status": "operational",
         "endpoints": {
             "stats": "/api/stats",
+            "kpis": "/api/kpis?scope=overall",
             "current": "/api/rankings/current",
             "history": "/api/rankings/history?days=7",
-            "changes": "/api/changes?hours=24"
+            "changes": "/api/changes?hours=24",
+            "export": "/api/rankings/export?format=ndjson",
+            "live": "/api/live"
         }
     }
 
 
+def kpi_query(scope: str = "overall", value: str = "", limit: int = 1):
+    """Últimos KPIs de la app (kpi_snapshots, los escribe el tracker al guardar el run)"""
+    return supabase.table("kpi_snapshots")\
+        .select("*")\
+        .eq("app_id", APP_ID)\
+        .eq("scope", scope)\
+        .eq("scope_value", value)\
+        .order("run_at", desc=True)\
+        .limit(limit)
+
+
+async def fetch_stats() -> dict:
+    """Estadísticas generales (total keywords, top 10/50, último check)"""
+    # KPIs precalculados en la ingesta: una sola fila
+    kpis_result = await kpi_query().execute()
+    
+    if kpis_result.data:
+        kpis = kpis_result.data[0]
+        return {
+            "total_keywords": kpis["keywords"],
+            "top_10_keywords": kpis["top_10"],
+            "top_50_keywords": kpis["top_50"],
+            "top_100_keywords": kpis["top_100"],
+            "top100_rate": kpis["top100_rate"],
+            "avg_rank": kpis["avg_rank"],
+            "top_movers": kpis["movers"],
+            "last_check": kpis["run_at"],
+            "cached": False
+        }
+    
+    # Sin KPIs todavía (runs anteriores a kpi_snapshots): calcular
+    # Total keywords y rankings más recientes (en paralelo)
+    keywords_result, rankings_result = await asyncio.gather(
+        supabase.table("keywords")
+            .select("id", count="exact")
+            .eq("app_id", APP_ID)
+            .eq("is_active", True)
+            .execute(),
+        supabase.table("rankings")
+            .select("keyword_id, rank, tracked_at")
+            .order("tracked_at", desc=True)
+            .limit(1000)
+            .execute()
+    )
+    
+    total_keywords = keywords_result.count
+    
+    # Agrupar por keyword_id y tomar el más reciente
+    latest_ranks = {}
+    for r in rankings_result.data:
+        kw_id = r["keyword_id"]
+        if kw_id not in latest_ranks:
+            latest_ranks[kw_id] = r["rank"]
+    
+    # Contar por rangos
+    top_10 = sum(1 for rank in latest_ranks.values() if rank <= 10)
+    top_50 = sum(1 for rank in latest_ranks.values() if rank <= 50)
+    
+    # Última actualización
+    last_ranking = rankings_result.data[0] if rankings_result.data else None
+    last_check = last_ranking["tracked_at"] if last_ranking else datetime.now().isoformat()
+    
+    return {
+        "total_keywords": total_keywords,
+        "top_10_keywords": top_10,
+        "top_50_keywords": top_50,
+        "last_check": last_check,
+        "cached": False
+    }
+
+
 @app.get("/api/stats")
-async def get_stats(user = Depends(get_current_user)):
+async def get_stats(request: Request, response: Response,
+                    user = Depends(get_current_user)):
     """
     Estadísticas generales del sistema
     """
     try:
-        # Total keywords
-        keywords_result = supabase.table("keywords")\
-            .select("id", count="exact")\
-            .eq("app_id", APP_ID)\
-            .eq("is_active", True)\
-            .execute()
+        not_modified = await check_not_modified(request, response, "stats")
+        if not_modified:
+            return not_modified
         
-        total_keywords = keywords_result.count
+        return await fetch_stats()
         
-        # Obtener rankings más recientes
-        rankings_result = supabase.table("rankings")\
-            .select("keyword_id, rank, tracked_at")\
-            .order("tracked_at", desc=True)\
-            .limit(1000)\
-            .execute()
-        
-        # Agrupar por keyword_id y tomar el más reciente
-        latest_ranks = {}
-        for r in rankings_result.data:
-            kw_id = r["keyword_id"]
-            if kw_id not in latest_ranks:
-                latest_ranks[kw_id] = r["rank"]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/kpis")
+async def get_kpis(request: Request, response: Response, scope: str = "overall",
+                   value: str = "", limit: int = 30,
+                   user = Depends(get_current_user)):
+    """
+    KPIs por run (global o por país) con su histórico para tendencias
+    
+    Los calcula el tracker al guardar cada run: aquí solo se leen.
+    """
+    try:
+        if scope not in ("overall", "country"):
+            raise HTTPException(status_code=400, detail="scope must be overall or country")
+        if not 1 <= limit <= 365:
+            raise HTTPException(status_code=400, detail="limit must be between 1 and 365")
         
-        # Contar por rangos
-        top_10 = sum(1 for rank in latest_ranks.values() if rank <= 10)
-        top_50 = sum(1 for rank in latest_ranks.values() if rank <= 50)
+        not_modified = await check_not_modified(request, response, "kpis", (scope, value, limit))
+        if not_modified:
+            return not_modified
         
-        # Última actualización
-        last_ranking = rankings_result.data[0] if rankings_result.data else None
-        last_check = last_ranking["tracked_at"] if last_ranking else datetime.now().isoformat()
+        result = await kpi_query(scope, value, limit).execute()
+        if not result.data:
+            raise HTTPException(status_code=404, detail=f"No KPIs for {scope} '{value}'")
         
+        history = list(reversed(result.data))
         return {
-            "total_keywords": total_keywords,
-            "top_10_keywords": top_10,
-            "top_50_keywords": top_50,
-            "last_check": last_check,
+            "scope": scope,
+            "value": value,
+            "latest": history[-1],
+            "previous": history[-2] if len(history) >= 2 else None,
+            "history": history,
             "cached": False
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/api/rankings/current")
-async def get_current_rankings(user = Depends(get_current_user)):
+async def get_current_rankings(request: Request, response: Response,
+                               format: Optional[str] = None,
+                               user = Depends(get_current_user)):
     """
     Rankings actuales de todas las keywords
+    
+    format=columnar (o Accept: application/vnd.asorankguard.columnar+json)
+    devuelve arrays paralelos en lugar de un objeto por fila.
     """
     try:
-        # Obtener keywords con sus rankings más recientes
-        query = """
-        WITH latest_rankings AS (
-            SELECT DISTINCT ON (keyword_id)
-                keyword_id,
-                rank,
-                tracked_at
-            FROM rankings
-            ORDER BY keyword_id, tracked_at DESC
+        columnar = wants_columnar(format, request.headers.get("accept"))
+        response.headers["Vary"] = "Accept"
+        
+        not_modified = await check_not_modified(
+            request, response, "current", ("columnar" if columnar else "rows",)
         )
-        SELECT 
-            k.id,
-            k.keyword,
-            k.country,
-            k.app_id,
-            lr.rank,
-            lr.tracked_at
-        FROM keywords k
-        LEFT JOIN latest_rankings lr ON lr.keyword_id = k.id
-        WHERE k.app_id = %s AND k.is_active = true
-        ORDER BY COALESCE(lr.rank, 999), k.keyword
-        """
-        
-        result = supabase.rpc("exec_sql", {"query": query, "params": [APP_ID]}).execute()
-        
-        # Alternativa sin SQL custom (más simple pero menos eficiente)
-        keywords_result = supabase.table("keywords")\
+        if not_modified:
+            return not_modified
+        
+        keywords_result = await supabase.table("keywords")\
             .select("id, keyword, country, app_id")\
             .eq("app_id", APP_ID)\
             .eq("is_active", True)\
             .execute()
         
-        rankings_by_keyword = {}
-        for kw in keywords_result.data:
-            ranking = supabase.table("rankings")\
-                .select("rank, tracked_at")\
-                .eq("keyword_id", kw["id"])\
-                .order("tracked_at", desc=True)\
-                .limit(1)\
+        # Último ranking de cada keyword (queries en paralelo)
+        latest = await gather_limited(*(
+            supabase.table("rankings")
+                .select("rank, tracked_at")
+                .eq("keyword_id", kw["id"])
+                .order("tracked_at", desc=True)
+                .limit(1)
                 .execute()
-            
+            for kw in keywords_result.data
+        ))
+        
+        rankings_by_keyword = {}
+        for kw, ranking in zip(keywords_result.data, latest):
             rankings_by_keyword[kw["id"]] = {
                 **kw,
                 "rank": ranking.data[0]["rank"] if ranking.data else None,
@@ -174,9 +399,19 @@ async def get_current_rankings(user = Depends(get_current_user)):
             key=lambda x: x["rank"] if x["rank"] else 999
         )
         
+        if columnar:
+            payload = encode_rankings(
+                [r["keyword"] for r in rankings_list],
+                [r["country"] for r in rankings_list],
+                [r["rank"] for r in rankings_list],
+                [r["tracked_at"] for r in rankings_list]
+            )
+            payload["timestamp"] = await data_timestamp()
+            return columnar_response(payload, response)
+        
         return {
             "rankings": rankings_list,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": await data_timestamp()
         }
         
     except Exception as e:
@@ -184,34 +419,85 @@ async def get_current_rankings(user = Depends(get_current_user)):
 
 
 @app.get("/api/rankings/history")
-async def get_rankings_history(days: int = 7, user = Depends(get_current_user)):
+async def get_rankings_history(request: Request, response: Response, days: int = 7,
+                               max_points: Optional[int] = None,
+                               format: Optional[str] = None,
+                               user = Depends(get_current_user)):
     """
     Histórico de rankings (últimos N días)
+    
+    max_points limita los puntos por keyword (downsampling min/max para
+    gráficas); sin él se devuelven todas las filas. format=columnar (o el
+    media type columnar en Accept) devuelve arrays paralelos.
     """
+    if max_points is not None and max_points < 2:
+        raise HTTPException(status_code=400, detail="max_points must be >= 2")
+    
     try:
-        since = datetime.now() - timedelta(days=days)
+        columnar = wants_columnar(format, request.headers.get("accept"))
+        response.headers["Vary"] = "Accept"
+        
+        not_modified = await check_not_modified(
+            request, response, "history",
+            (days, max_points, "columnar" if columnar else "rows"), window="day"
+        )
+        if not_modified:
+            return not_modified
+        
+        # Ventana anclada al bucket del ETag: mismo día -> mismas filas
+        since = window_start("day") - timedelta(days=days)
         
         # Obtener keywords primero
-        keywords_result = supabase.table("keywords")\
-            .select("id, keyword")\
+        keywords_result = await supabase.table("keywords")\
+            .select("id, keyword, country")\
             .eq("app_id", APP_ID)\
             .eq("is_active", True)\
             .execute()
         
         keyword_map = {kw["id"]: kw["keyword"] for kw in keywords_result.data}
+        country_map = {kw["id"]: kw["country"] for kw in keywords_result.data}
         keyword_ids = list(keyword_map.keys())
         
         # Obtener rankings históricos
-        rankings_result = supabase.table("rankings")\
+        rankings_result = await supabase.table("rankings")\
             .select("keyword_id, rank, tracked_at")\
             .in_("keyword_id", keyword_ids)\
             .gte("tracked_at", since.isoformat())\
             .order("tracked_at", desc=False)\
             .execute()
         
+        rows = rankings_result.data
+        total_points = len(rows)
+        
+        # Reducir cada serie a max_points conservando picos y valles
+        if max_points and rows:
+            keep = downsample_indices(
+                np.array([r["keyword_id"] for r in rows]),
+                np.arange(len(rows)),  # ya vienen ordenadas por tracked_at
+                np.array([r["rank"] for r in rows], dtype=float),
+                max_points
+            )
+            rows = [rows[i] for i in keep]
+        
+        if columnar:
+            payload = encode_rankings(
+                [keyword_map.get(r["keyword_id"], "Unknown") for r in rows],
+                [country_map.get(r["keyword_id"], "") for r in rows],
+                [r["rank"] for r in rows],
+                [r["tracked_at"] for r in rows]
+            )
+            payload.update({
+                "days": days,
+                "max_points": max_points,
+                "total_points": total_points,
+                "from": since.isoformat(),
+                "to": await data_timestamp()
+            })
+            return columnar_response(payload, response)
+        
         # Agregar nombres de keywords
         history = []
-        for r in rankings_result.data:
+        for r in rows:
             history.append({
                 "keyword": keyword_map.get(r["keyword_id"], "Unknown"),
                 "rank": r["rank"],
@@ -221,8 +507,10 @@ async def get_rankings_history(days: int = 7, user = Depends(get_current_user)):
         return {
             "history": history,
             "days": days,
+            "max_points": max_points,
+            "total_points": total_points,
             "from": since.isoformat(),
-            "to": datetime.now().isoformat()
+            "to": await data_timestamp()
         }
         
     except Exception as e:
@@ -230,40 +518,50 @@ async def get_rankings_history(days: int = 7, user = Depends(get_current_user)):
 
 
 @app.get("/api/changes")
-async def get_ranking_changes(hours: int = 24, user = Depends(get_current_user)):
+async def get_ranking_changes(request: Request, response: Response, hours: int = 24,
+                              user = Depends(get_current_user)):
     """
     Cambios de ranking en las últimas N horas
     """
     try:
-        since = datetime.now() - timedelta(hours=hours)
+        not_modified = await check_not_modified(
+            request, response, "changes", (hours,), window="hour"
+        )
+        if not_modified:
+            return not_modified
+        
+        since = window_start("hour") - timedelta(hours=hours)
         
         # Obtener keywords
-        keywords_result = supabase.table("keywords")\
+        keywords_result = await supabase.table("keywords")\
             .select("id, keyword")\
             .eq("app_id", APP_ID)\
             .eq("is_active", True)\
             .execute()
         
+        async def fetch_pair(kw):
+            # Ranking más reciente y ranking anterior (hace N horas)
+            return await asyncio.gather(
+                supabase.table("rankings")
+                    .select("rank, tracked_at")
+                    .eq("keyword_id", kw["id"])
+                    .order("tracked_at", desc=True)
+                    .limit(1)
+                    .execute(),
+                supabase.table("rankings")
+                    .select("rank, tracked_at")
+                    .eq("keyword_id", kw["id"])
+                    .lt("tracked_at", since.isoformat())
+                    .order("tracked_at", desc=True)
+                    .limit(1)
+                    .execute()
+            )
+        
+        pairs = await gather_limited(*(fetch_pair(kw) for kw in keywords_result.data))
+        
         changes = []
         
-        for kw in keywords_result.data:
-            # Ranking más reciente
-            recent = supabase.table("rankings")\
-                .select("rank, tracked_at")\
-                .eq("keyword_id", kw["id"])\
-                .order("tracked_at", desc=True)\
-                .limit(1)\
-                .execute()
-            
-            # Ranking anterior (hace N horas)
-            previous = supabase.table("rankings")\
-                .select("rank, tracked_at")\
-                .eq("keyword_id", kw["id"])\
-                .lt("tracked_at", since.isoformat())\
-                .order("tracked_at", desc=True)\
-                .limit(1)\
-                .execute()
-            
+        for kw, (recent, previous) in zip(keywords_result.data, pairs):
             if recent.data and previous.data:
                 new_rank = recent.data[0]["rank"]
                 old_rank = previous.data[0]["rank"]
@@ -288,6 +586,263 @@ async def get_ranking_changes(hours: int = 24, user = Depends(get_current_user))
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# === LIVE FEED (SSE) ===
+
+live_feed = LiveFeed()
+_live_state = {"version": None, "task": None}
+
+
+async def fetch_run_delta(since: str) -> dict:
+    """
+    Cambios de ranking y alertas enviadas desde el run anterior
+    
+    Args:
+        since: completed_at del tracking anterior
+    
+    Returns:
+        Dict con changes (mismo convenio que /api/changes) y alerts
+    """
+    keywords_result = await supabase.table("keywords")\
+        .select("id, keyword, country")\
+        .eq("app_id", APP_ID)\
+        .eq("is_active", True)\
+        .execute()
+    
+    keyword_map = {kw["id"]: kw for kw in keywords_result.data}
+    keyword_ids = list(keyword_map.keys())
+    
+    new_result, alerts_result = await asyncio.gather(
+        supabase.table("rankings")
+            .select("keyword_id, rank, tracked_at")
+            .in_("keyword_id", keyword_ids)
+            .gt("tracked_at", since)
+            .order("tracked_at", desc=True)
+            .execute(),
+        supabase.table("alert_history")
+            .select("keyword_id, message, channel, status, sent_at")
+            .in_("keyword_id", keyword_ids)
+            .gt("sent_at", since)
+            .order("sent_at", desc=True)
+            .execute()
+    )
+    
+    # Último ranking del run nuevo por keyword
+    latest = {}
+    for r in new_result.data:
+        latest.setdefault(r["keyword_id"], r)
+    
+    # Ranking anterior al run (queries en paralelo)
+    previous = await gather_limited(*(
+        supabase.table("rankings")
+            .select("rank")
+            .eq("keyword_id", kw_id)
+            .lte("tracked_at", since)
+            .order("tracked_at", desc=True)
+            .limit(1)
+            .execute()
+        for kw_id in latest
+    ))
+    
+    changes = []
+    for (kw_id, recent), prev in zip(latest.items(), previous):
+        if not prev.data:
+            continue
+        
+        old_rank = prev.data[0]["rank"]
+        new_rank = recent["rank"]
+        
+        if new_rank != old_rank:
+            changes.append({
+                "keyword": keyword_map[kw_id]["keyword"],
+                "country": keyword_map[kw_id]["country"],
+                "old_rank": old_rank,
+                "new_rank": new_rank,
+                "change": new_rank - old_rank if None not in (new_rank, old_rank) else None,
+                "timestamp": recent["tracked_at"]
+            })
+    
+    alerts = [
+        {**a, "keyword": keyword_map.get(a["keyword_id"], {}).get("keyword")}
+        for a in alerts_result.data
+    ]
+    
+    return {
+        "changes": sorted(changes, key=lambda x: abs(x["change"] or 0), reverse=True),
+        "alerts": alerts,
+        "total_new": len(new_result.data)
+    }
+
+
+async def publish_new_run():
+    """Si hay un tracking completado nuevo, calcular su delta y difundirlo"""
+    version = await get_data_version()
+    previous = _live_state["version"]
+    
+    if version is None or version == previous:
+        return
+    
+    _live_state["version"] = version
+    
+    # Primera lectura tras arrancar, o nadie escuchando: no hacer queries
+    if previous is None or not live_feed.subscriber_count:
+        return
+    
+    delta, stats = await asyncio.gather(fetch_run_delta(previous), fetch_stats())
+    live_feed.publish("run", {"version": version, **delta, "stats": stats})
+
+
+async def watch_new_runs():
+    """Tarea de fondo: detectar trackings completados para el feed SSE"""
+    while True:
+        try:
+            await publish_new_run()
+        except Exception as e:
+            logger.error(f"❌ Live feed error: {e}")
+        await asyncio.sleep(DATA_VERSION_TTL)
+
+
+@app.on_event("startup")
+async def start_live_feed():
+    _live_state["task"] = asyncio.create_task(watch_new_runs())
+
+
+@app.on_event("shutdown")
+async def stop_live_feed():
+    live_feed.close()
+    if _live_state["task"] is not None:
+        _live_state["task"].cancel()
+
+
+@app.get("/api/live")
+async def live(request: Request, user = Depends(get_current_user)):
+    """
+    Feed en vivo (Server-Sent Events) de trackings completados
+    
+    Cuando un tracking_job pasa a completed se envía un evento `run` con
+    los cambios de ranking, las alertas enviadas y las stats nuevas.
+    """
+    return StreamingResponse(
+        live_feed.stream(request.headers.get("last-event-id")),
+        media_type=SSE_MEDIA_TYPE,
+        headers=SSE_HEADERS
+    )
+
+
+EXPORT_FIELDS = ["tracked_at", "keyword_id", "keyword", "country", "rank"]
+
+
+async def fetch_export_page(since: Optional[str], after: Optional[list], limit: int):
+    """
+    Leer una página keyset del histórico ordenada por (tracked_at, keyword_id)
+    
+    Args:
+        since: Solo rankings desde esta fecha (ISO)
+        after: [tracked_at, keyword_id] de la última fila ya leída
+        limit: Filas por página
+    
+    Returns:
+        (filas, cursor de la siguiente página o None)
+    """
+    query = supabase.table("rankings")\
+        .select("keyword_id, rank, tracked_at, keywords!inner(keyword, country)")\
+        .eq("keywords.app_id", APP_ID)
+    
+    if since:
+        query = query.gte("tracked_at", since)
+    
+    if after:
+        tracked_at, keyword_id = after
+        query = query.or_(
+            f'tracked_at.gt."{tracked_at}",'
+            f'and(tracked_at.eq."{tracked_at}",keyword_id.gt.{keyword_id})'
+        )
+    
+    result = await query\
+        .order("tracked_at")\
+        .order("keyword_id")\
+        .limit(limit)\
+        .execute()
+    
+    rows = [
+        {
+            "tracked_at": r["tracked_at"],
+            "keyword_id": r["keyword_id"],
+            "keyword": r["keywords"]["keyword"],
+            "country": r["keywords"]["country"],
+            "rank": r["rank"]
+        }
+        for r in result.data
+    ]
+    
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = encode_cursor(rows[-1]["tracked_at"], rows[-1]["keyword_id"])
+    
+    return rows, next_cursor
+
+
+@app.get("/api/rankings/export")
+async def export_history(format: str = "json", cursor: Optional[str] = None,
+                         limit: int = DEFAULT_PAGE_SIZE, since: Optional[str] = None,
+                         user = Depends(get_current_user)):
+    """
+    Exportar el histórico completo (herramientas BI)
+    
+    - format=json: una página keyset ordenada por (tracked_at, keyword_id);
+      pasar next_cursor como cursor para la siguiente página (None al final).
+    - format=ndjson / csv: streaming de todo el histórico página a página,
+      con memoria acotada a una página por petición.
+    """
+    if format not in ("json", *STREAM_MEDIA_TYPES):
+        raise HTTPException(status_code=400, detail="format must be json, ndjson or csv")
+    
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    
+    try:
+        after = decode_cursor(cursor, 2)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if format in STREAM_MEDIA_TYPES:
+        async def stream():
+            page_after = after
+            header = True
+            
+            while True:
+                rows, next_cursor = await fetch_export_page(since, page_after, limit)
+                
+                if format == "csv":
+                    yield "".join(iter_csv(rows, EXPORT_FIELDS, header=header))
+                else:
+                    yield "".join(iter_ndjson(rows))
+                
+                header = False
+                
+                if not next_cursor:
+                    break
+                page_after = decode_cursor(next_cursor, 2)
+        
+        return StreamingResponse(
+            stream(),
+            media_type=STREAM_MEDIA_TYPES[format],
+            headers={"Content-Disposition": f'attachment; filename="rankings.{format}"'}
+        )
+    
+    try:
+        rows, next_cursor = await fetch_export_page(since, after, limit)
+        
+        return {
+            "total": len(rows),
+            "limit": limit,
+            "next_cursor": next_cursor,
+            "rows": rows
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/health")
 async def health_check():
     """
@@ -295,7 +850,7 @@ async def health_check():
     """
     try:
         # Verificar conexión a Supabase
-        supabase.table("keywords").select("id", count="exact").limit(1).execute()
+        await supabase.table("keywords").select("id", count="exact").limit(1).execute()
         return {
             "status": "healthy",
             "database": "connected",
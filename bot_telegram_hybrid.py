@@ -205,26 +205,35 @@ class HybridASOBot:
             
             total_kw = len(keywords.data)
             
-            # Obtener últimos rankings
-            top10 = 0
-            top30 = 0
+            # KPIs precalculados por el tracker
+            kpis = self.supabase.get_latest_kpis(app['id'])
             
-            for kw in keywords.data[:50]:  # Limitar para performance
-                ranking = self.supabase.client.table('rankings')\
-                    .select('rank')\
-                    .eq('keyword_id', kw['id'])\
-                    .order('tracked_at', desc=True)\
-                    .limit(1)\
-                    .execute()
+            if kpis:
+                top10 = kpis['top_10']
+                top30 = kpis['top_30']
+                updated = kpis['run_at'][:16].replace('T', ' ')
+            else:
+                # Sin KPIs todavía: últimos rankings keyword a keyword
+                top10 = 0
+                top30 = 0
+                updated = datetime.now().strftime('%H:%M')
                 
-                if ranking.data:
-                    rank = ranking.data[0]['rank']
-                    if rank <= 10:
-                        top10 += 1
-                    if rank <= 30:
-                        top30 += 1
+                for kw in keywords.data[:50]:  # Limitar para performance
+                    ranking = self.supabase.client.table('rankings')\
+                        .select('rank')\
+                        .eq('keyword_id', kw['id'])\
+                        .order('tracked_at', desc=True)\
+                        .limit(1)\
+                        .execute()
+                    
+                    if ranking.data:
+                        rank = ranking.data[0]['rank']
+                        if rank <= 10:
+                            top10 += 1
+                        if rank <= 30:
+                            top30 += 1
             
-                        message = f"""
+            message = f"""
 📊 *Current Status* (Supabase)
 
 📱 App: {app['name']}
@@ -234,7 +243,7 @@ class HybridASOBot:
     • Top 10: {top10}
     • Top 30: {top30}
 
-🕐 Last updated: {datetime.now().strftime('%H:%M')}
+🕐 Last updated: {updated}
 """
             
             await update.message.reply_text(message, parse_mode='Markdown')
@@ -101,7 +101,37 @@ _Usa los botones de abajo para navegar_
             
             total_kw = keywords.count
             
-            # Rankings más recientes
+            # KPIs precalculados por el tracker (una sola query)
+            kpis = self.supabase.table("kpi_snapshots")\
+                .select("top_10, top_50, top_100, avg_rank, top100_rate, run_at")\
+                .eq("app_id", self.app_id)\
+                .eq("scope", "overall")\
+                .eq("scope_value", "")\
+                .order("run_at", desc=True)\
+                .limit(1)\
+                .execute()
+            
+            if kpis.data:
+                kpi = kpis.data[0]
+                message = f"""
+📊 *Estadísticas ASO Rank Guard*
+
+🎯 Total Keywords: *{total_kw}*
+
+📈 Distribución de Rankings:
+• Top 10: *{kpi['top_10']}* keywords
+• Top 50: *{kpi['top_50']}* keywords  
+• Top 100: *{kpi['top_100']}* keywords
+
+📉 Promedio: *#{kpi['avg_rank'] or 0:.1f}*
+👁️ En top 100: *{kpi['top100_rate']}%*
+
+🕐 Último run: {kpi['run_at'][:16].replace('T', ' ')}
+"""
+                await update.message.reply_text(message, parse_mode='Markdown')
+                return
+            
+            # Sin KPIs todavía: rankings más recientes keyword a keyword
             latest_ranks = {}
             for kw in keywords.data[:100]:  # Limitar para performance
                 ranking = self.supabase.table("rankings")\
@@ -184,12 +184,14 @@ def run_pro_monitor():
                     'keywords_analyzed': analysis['analyzed_keywords'],
                     'weekly_patterns': len(analysis['weekly_patterns']),
                     'monthly_patterns': len(analysis['monthly_patterns']),
+                    'seasonality': len(analysis['seasonality']),
                     'trends': len(analysis['trends'])
                 }
                 
                 print(f"✅ Keywords analizadas: {analysis['analyzed_keywords']}")
                 print(f"📆 Patrones semanales: {len(analysis['weekly_patterns'])}")
                 print(f"📅 Patrones mensuales: {len(analysis['monthly_patterns'])}")
+                print(f"🌊 Ciclos detectados: {len(analysis['seasonality'])}")
                 print(f"📈 Tendencias: {len(analysis['trends'])}")
                 
                 # Mostrar tendencias destacadas
@@ -286,10 +288,14 @@ def run_pro_monitor():
             if file_path:
                 results['dashboard'] = {
                     'status': 'success',
-                    'file_path': file_path
+                    'file_path': file_path,
+                    'rebuilt': dashboard.last_rebuilt
                 }
                 
-                print(f"✅ Dashboard generado")
+                if dashboard.last_rebuilt:
+                    print(f"✅ Dashboard generado ({', '.join(dashboard.last_rebuilt)})")
+                else:
+                    print("⏭️  Dashboard sin cambios (entradas idénticas al último build)")
                 print(f"📊 Abre en tu navegador: file://{Path(file_path).absolute()}")
             else:
                 results['dashboard'] = {'status': 'error', 'error': 'Failed to generate'}
@@ -47,8 +47,22 @@ echo -e "${GREEN}🚀 Desplegando archivos...${NC}"
 
 # 1. Copiar dashboard principal como dashboard.html (el que sirve nginx)
 echo -e "${BLUE}1.${NC} Copiando dashboard..."
+python3 src/precompress.py web
 scp web/dashboard-interactive.html ${SERVER_USER}@${SERVER_IP}:${REMOTE_PATH}/dashboard.html
 
+# Variantes precomprimidas (nginx gzip_static / brotli_static)
+for ext in gz br; do
+    if [ -f "web/dashboard-interactive.html.$ext" ]; then
+        scp web/dashboard-interactive.html.$ext ${SERVER_USER}@${SERVER_IP}:${REMOTE_PATH}/dashboard.html.$ext
+    fi
+done
+
+# Ficheros de datos que el dashboard carga bajo demanda (junto al HTML)
+if [ -d "web/dashboard-data" ]; then
+    ssh ${SERVER_USER}@${SERVER_IP} "rm -rf ${REMOTE_PATH}/dashboard-data"
+    scp -r web/dashboard-data ${SERVER_USER}@${SERVER_IP}:${REMOTE_PATH}/
+fi
+
 # 2. Copiar datos necesarios
 echo -e "${BLUE}2.${NC} Copiando datos..."
 ssh ${SERVER_USER}@${SERVER_IP} "mkdir -p ${REMOTE_PATH}/data"
@@ -75,7 +89,7 @@ fi
 
 # 3. Ajustar permisos
 echo -e "${BLUE}3.${NC} Ajustando permisos..."
-ssh ${SERVER_USER}@${SERVER_IP} "chmod 644 ${REMOTE_PATH}/dashboard.html ${REMOTE_PATH}/data/*.{csv,json} 2>/dev/null || true"
+ssh ${SERVER_USER}@${SERVER_IP} "chmod 644 ${REMOTE_PATH}/dashboard.html* ${REMOTE_PATH}/data/*.{csv,json} 2>/dev/null || true; chmod -R a+rX ${REMOTE_PATH}/dashboard-data 2>/dev/null || true"
 
 echo ""
 echo -e "${GREEN}✅ Deploy completado!${NC}"
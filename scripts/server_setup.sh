@@ -56,19 +56,26 @@ with open('\''config/config.yaml'\'') as f:
     config = yaml.safe_load(f)
 
 dash = InteractiveDashboard(config)
-html = dash.generate_html()
-
-with open('\''web/dashboard-interactive.html'\'', '\''w'\'', encoding='\''utf-8'\'') as f:
-    f.write(html)
+dash.save_dashboard()
 
 print('\''✅ Dashboard generado'\'')
 "
 
 # 4. Copiar a /var/www
 echo "📤 Actualizando dashboard público..."
+rm -rf /var/www/aso-rank-guard/dashboard-data
+cp -r web/dashboard-data /var/www/aso-rank-guard/
 cp web/dashboard-interactive.html /var/www/aso-rank-guard/index.html
-chmod 644 /var/www/aso-rank-guard/index.html
-restorecon -v /var/www/aso-rank-guard/index.html 2>/dev/null || true
+for ext in gz br; do
+    if [ -f web/dashboard-interactive.html.$ext ]; then
+        cp web/dashboard-interactive.html.$ext /var/www/aso-rank-guard/index.html.$ext
+    else
+        rm -f /var/www/aso-rank-guard/index.html.$ext
+    fi
+done
+chmod 644 /var/www/aso-rank-guard/index.html*
+chmod -R a+rX /var/www/aso-rank-guard/dashboard-data
+restorecon -Rv /var/www/aso-rank-guard/index.html /var/www/aso-rank-guard/dashboard-data 2>/dev/null || true
 
 echo "✅ $(date): Actualización completada"
 echo "🌐 Dashboard disponible en http://194.164.160.111/"
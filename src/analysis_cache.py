@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Caché persistente de análisis ASO por par de snapshots
+Clave (día anterior, último día, versión de datos): repetir el análisis no relee ni recalcula nada
+"""
+
+import hashlib
+import json
+import logging
+import os
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR_NAME = "analysis_cache"
+
+# Subir al cambiar el scoring o el formato del payload (invalida las cachés)
+CACHE_FORMAT = 1
+
+SNAPSHOT_COLUMNS = ['keyword', 'country', 'rank']
+
+
+def analysis_cache_for(ranks_file: Path) -> Path:
+    """Directorio de la caché de análisis junto al histórico de rankings"""
+    return Path(ranks_file).parent / CACHE_DIR_NAME
+
+
+def file_version(path: Path) -> list:
+    """Versión del CSV sin leerlo: [mtime_ns, tamaño]"""
+    stat = Path(path).stat()
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def snapshot_version(latest: pd.DataFrame, previous: pd.DataFrame) -> str:
+    """Versión de los datos de un par de snapshots (hash de keyword, país y rank, en orden)"""
+    digest = hashlib.sha1()
+    for snapshot in (latest, previous):
+        frame = snapshot.reindex(columns=SNAPSHOT_COLUMNS)
+        digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+        digest.update(b'|')
+    return digest.hexdigest()
+
+
+def snapshot_key(previous_date: Optional[date], latest_date: Optional[date],
+                 latest: pd.DataFrame, previous: pd.DataFrame) -> list:
+    """Clave de un análisis: [día anterior, último día, versión de datos]"""
+    return [
+        previous_date.isoformat() if previous_date else None,
+        latest_date.isoformat() if latest_date else None,
+        snapshot_version(latest, previous),
+    ]
+
+
+def plain(value):
+    """Conversión JSON de escalares numpy/pandas y fechas (default de json.dump)"""
+    if isinstance(value, (np.integer, np.bool_)):
+        return value.item()
+    if isinstance(value, np.floating):
+        return None if np.isnan(value) else value.item()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} no serializable")
+
+
+def frame_to_payload(df: pd.DataFrame) -> Dict:
+    """DataFrame tipado -> dict JSON (categóricas como códigos, nulos como None)"""
+    columns = []
+    for name in df.columns:
+        col = df[name]
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            columns.append({
+                'name': name,
+                'dtype': 'category',
+                'categories': col.cat.categories.tolist(),
+                'ordered': bool(col.cat.ordered),
+                'values': col.cat.codes.tolist(),
+            })
+        else:
+            values = col.astype(object).where(col.notna(), None)
+            columns.append({'name': name, 'dtype': str(col.dtype), 'values': values.tolist()})
+    return {'columns': columns}
+
+
+def frame_from_payload(payload: Dict) -> pd.DataFrame:
+    """Inverso de frame_to_payload (mismos dtypes)"""
+    data = {}
+    for column in payload['columns']:
+        if column['dtype'] == 'category':
+            data[column['name']] = pd.Categorical.from_codes(
+                column['values'], categories=column['categories'], ordered=column['ordered']
+            )
+        else:
+            data[column['name']] = pd.Series(column['values'], dtype=column['dtype'])
+    return pd.DataFrame(data)
+
+
+class AnalysisCache:
+    """
+    Último análisis de un analizador, en disco
+
+    Guarda un solo resultado por analizador (el del último par de
+    snapshots) con dos claves:
+
+    - versión del CSV (mtime, tamaño): si el fichero no ha cambiado se sirve
+      sin leerlo
+    - [día anterior, último día, versión de datos]: si el CSV cambió pero
+      esos dos días no (p.ej. se tocó histórico antiguo), se sirve igual
+
+    Si cambian los datos del mismo par de días (re-run parcial de hoy), el
+    analizador puede partir del resultado guardado y recalcular solo las
+    filas cambiadas (ver matches_dates()).
+    """
+
+    def __init__(self, cache_dir: Path, analyzer: str, fingerprint: str = ''):
+        """
+        Args:
+            cache_dir: Directorio de la caché
+            analyzer: Nombre del analizador (un fichero por analizador)
+            fingerprint: Configuración que afecta al resultado (vocabularios, clustering...)
+        """
+        self.cache_file = Path(cache_dir) / f"{analyzer}.json"
+        self.fingerprint = f"{CACHE_FORMAT}:{fingerprint}"
+        self._entry: Optional[Dict] = None
+        self._loaded = False
+
+    def _load(self) -> Optional[Dict]:
+        if self._loaded:
+            return self._entry
+        self._loaded = True
+
+        if not self.cache_file.exists():
+            return None
+
+        try:
+            with open(self.cache_file, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️  Caché de análisis ilegible, se ignora: {e}")
+            return None
+
+        # Otra versión de scoring o de configuración: recalcular
+        if entry.get('fingerprint') == self.fingerprint:
+            self._entry = entry
+        return self._entry
+
+    def get_by_file(self, version: list) -> Optional[Dict]:
+        """Payload guardado si el CSV no ha cambiado (None si no)"""
+        entry = self._load()
+        if entry is not None and entry['file_version'] == version:
+            return entry['payload']
+        return None
+
+    def get(self, key: list) -> Optional[Dict]:
+        """Payload guardado para la misma clave (None si no)"""
+        entry = self._load()
+        if entry is not None and entry['key'] == key:
+            return entry['payload']
+        return None
+
+    def matches_dates(self, key: list) -> Optional[Dict]:
+        """Payload guardado del mismo par de días con otros datos (base incremental)"""
+        entry = self._load()
+        if entry is not None and entry['key'][:2] == key[:2]:
+            return entry['payload']
+        return None
+
+    def put(self, key: list, version: list, payload: Dict):
+        """Guardar el análisis (escritura atómica; un fallo de disco no rompe el análisis)"""
+        entry = {
+            'fingerprint': self.fingerprint,
+            'key': key,
+            'file_version': version,
+            'payload': payload,
+        }
+        self._loaded = True
+        self._entry = None
+
+        try:
+            # dumps (encoder en C) + una sola escritura: mucho más rápido que dump()
+            raw = json.dumps(entry, ensure_ascii=False, default=plain)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"⚠️  Análisis no serializable, no se guarda en caché: {e}")
+            return
+
+        # En memoria igual que en disco (JSON decodificado): las lecturas
+        # devuelven lo mismo venga de esta instancia o de otro proceso
+        self._entry = json.loads(raw)
+
+        tmp = self.cache_file.with_name(f"{self.cache_file.name}.{os.getpid()}.tmp")
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, 'w') as f:
+                f.write(raw)
+            os.replace(tmp, self.cache_file)
+        except OSError as e:
+            logger.warning(f"⚠️  No se pudo guardar la caché de análisis: {e}")
+            tmp.unlink(missing_ok=True)
@@ -4,10 +4,13 @@ API REST para ASO Rank Guard - V2.0 OPTIMIZED
 Endpoints con caching, rate limiting, compression y seguridad mejorada
 """
 
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
@@ -17,9 +20,32 @@ from pathlib import Path
 from datetime import datetime, timedelta
 import json
 import logging
+from collections import OrderedDict
 from functools import lru_cache
+from typing import List, Optional
+import asyncio
+import sys
 import time
 
+sys.path.insert(0, str(Path(__file__).parent))
+
+from columnar import COLUMNAR_MEDIA_TYPE, encode_rankings, serialize, wants_columnar
+from downsampling import downsample_indices
+from history_export import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, STREAM_MEDIA_TYPES, decode_cursor, encode_cursor,
+    iter_csv, iter_ndjson
+)
+from http_cache import ENCODING_SUFFIXES, build_validators, encoding_etag, is_not_modified, window_start
+from kpi_store import VISIBLE_RANK, KPIStore, kpi_file_for
+from live_feed import SSE_HEADERS, SSE_MEDIA_TYPE, LiveFeed
+from metrics import (
+    CACHE_REQUESTS, DATA_LOAD_DURATION, DATA_RECORDS_LOADED, HTTP_REQUEST_DURATION,
+    PROMETHEUS_AVAILABLE, clear_multiprocess_dir, init_metrics, mark_process_dead, render_latest
+)
+from precompress import DYNAMIC_LEVELS, compress_variants, negotiate_encoding, precompressed_file
+from series_stats import SeriesStatsEngine
+from shared_snapshot import SharedSnapshot
+
 # Logging
 logging.basicConfig(
     level=logging.INFO,
@@ -31,6 +57,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Métricas multiproceso: cada worker escribe en data/metrics/ y /metrics agrega
+init_metrics()
+
 # Rate limiter
 limiter = Limiter(key_func=get_remote_address)
 
@@ -55,22 +84,113 @@ app.add_middleware(
         "http://127.0.0.1"
     ],
     allow_credentials=True,
-    allow_methods=["GET"],
+    allow_methods=["GET", "POST"],
     allow_headers=["*"],
 )
 
-# Compresión GZip para respuestas grandes
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+# Ruta del feed SSE (sin GZip, ver ApiGZipMiddleware)
+LIVE_FEED_PATH = "/api/live"
+
+
+def _merge_vary(raw_headers: list) -> list:
+    """Un solo Vary con cada valor una vez (endpoint, CORS y GZip añaden el suyo)"""
+    tokens = []
+    for name, value in raw_headers:
+        if name.lower() == b"vary":
+            for token in value.decode("latin-1").split(","):
+                token = token.strip()
+                if token and token.lower() not in {t.lower() for t in tokens}:
+                    tokens.append(token)
+    
+    if not tokens:
+        return raw_headers
+    
+    headers = [(name, value) for name, value in raw_headers if name.lower() != b"vary"]
+    headers.append((b"vary", ", ".join(tokens).encode("latin-1")))
+    return headers
+
+
+class ApiGZipMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware con dos ajustes para esta API
+    
+    - El feed SSE pasa sin comprimir: las versiones de Starlette que admite
+      fastapi>=0.104 comprimen también text/event-stream, y el compresor
+      retiene los eventos en su buffer hasta acumular bytes suficientes.
+    - Vary sale una sola vez: las respuestas cacheadas ya declaran
+      Accept-Encoding y el middleware lo vuelve a añadir al pasar el cuerpo.
+    """
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == LIVE_FEED_PATH:
+            await self.app(scope, receive, send)
+            return
+        
+        async def send_merged_vary(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": _merge_vary(list(message["headers"]))}
+            await send(message)
+        
+        await super().__call__(scope, receive, send_merged_vary)
+
+
+# Compresión GZip para respuestas grandes no cacheadas (las cacheadas llevan ya
+# Content-Encoding precalculado y el middleware las deja pasar tal cual)
+app.add_middleware(ApiGZipMiddleware, minimum_size=1000)
+
+
+@app.middleware("http")
+async def observe_request_latency(request: Request, call_next):
+    """Histograma de latencia por endpoint (plantilla de ruta, no la URL)"""
+    start = time.perf_counter()
+    response = await call_next(request)
+    
+    route = request.scope.get("route")
+    endpoint = route.path if route is not None else "unmatched"
+    HTTP_REQUEST_DURATION.labels(endpoint, request.method, str(response.status_code))\
+        .observe(time.perf_counter() - start)
+    
+    return response
 
 # Rutas de archivos
 BASE_DIR = Path(__file__).parent.parent
 CONFIG_FILE = BASE_DIR / "config" / "config.yaml"
 RANKS_FILE = BASE_DIR / "data" / "ranks.csv"
+SNAPSHOT_DIR = BASE_DIR / "data" / ".snapshots"
+KPI_FILE = kpi_file_for(RANKS_FILE)
+
+# Snapshot en disco compartido por todos los workers (uvicorn --workers N)
+_snapshot = SharedSnapshot(SNAPSHOT_DIR)
+
+# KPIs por run que escribe RankTracker al guardar (ver kpi_store.py); aquí solo se leen
+_kpi_store = KPIStore(KPI_FILE)
 
-# Cache global
+# Estadísticas móviles por (keyword, país), calculadas una vez por versión de datos
+_series_stats = None
+
+# Cache global (se invalida cuando cambia la versión de datos, no por tiempo)
 _rankings_cache = None
 _rankings_cache_time = 0
-CACHE_TTL = 300  # 5 minutos
+_rankings_cache_version = None
+
+# Cache de respuestas (LRU): (endpoint, params) -> payload para la versión actual
+_response_cache = OrderedDict()
+_response_cache_version = None
+
+# Máximo de entradas en la caché de respuestas (hay params libres, p.ej. batch)
+MAX_CACHED_RESPONSES = 512
+
+# Histórico ordenado por la clave keyset de /api/rankings/export
+_export_sorted = {"version": None, "df": None}
+_export_sorted_lock = asyncio.Lock()
+
+# Filas leídas del CSV por bloque al exportar en streaming
+EXPORT_CHUNK_ROWS = 50000
+
+# Feed SSE: cada cuántos segundos se mira si hay un tracking nuevo (un stat())
+LIVE_POLL_SECONDS = 2.0
+_live_feed = LiveFeed()
+_live_state = {"version": None, "last_check": None, "task": None}
 
 @lru_cache(maxsize=1)
 def load_config():
@@ -82,23 +202,12 @@ def load_config():
         logger.error(f"Error loading config: {e}")
         raise HTTPException(status_code=500, detail="Error loading configuration")
 
-def load_rankings(force_refresh: bool = False):
-    """Cargar rankings desde CSV con caché de 5 minutos"""
-    global _rankings_cache, _rankings_cache_time
-    
-    current_time = time.time()
-    
-    # Usar caché si está fresco
-    if not force_refresh and _rankings_cache is not None and (current_time - _rankings_cache_time) < CACHE_TTL:
-        logger.debug("Returning cached rankings")
-        return _rankings_cache.copy()
-    
-    # Recargar datos
-    try:
-        if not RANKS_FILE.exists():
-            raise HTTPException(status_code=404, detail="No hay datos de rankings")
-        
-        logger.info("Loading rankings from CSV...")
+_rankings_load_lock = asyncio.Lock()
+
+
+def _read_rankings_csv():
+    """Leer y tipar el CSV de rankings (bloqueante, se ejecuta en threadpool)"""
+    with DATA_LOAD_DURATION.labels("parse").time():
         df = pd.read_csv(RANKS_FILE)
         
         # Renombrar 'date' a 'timestamp' para compatibilidad
@@ -106,17 +215,282 @@ def load_rankings(force_refresh: bool = False):
             df.rename(columns={'date': 'timestamp'}, inplace=True)
         
         df['timestamp'] = pd.to_datetime(df['timestamp'])
+    return df
+
+
+def _snapshot_key(version):
+    """Clave del snapshot compartido: origen + versión de datos"""
+    return (str(RANKS_FILE), version)
+
+
+def get_data_version():
+    """
+    Versión de los datos: (mtime_ns, size) del CSV de rankings
+    
+    RankTracker reemplaza el CSV de forma atómica al guardar un tracking,
+    así que la versión cambia exactamente cuando hay un run nuevo.
+    """
+    try:
+        file_stat = RANKS_FILE.stat()
+    except FileNotFoundError:
+        return None
+    return (file_stat.st_mtime_ns, file_stat.st_size)
+
+
+async def load_rankings(force_refresh: bool = False):
+    """
+    Cargar rankings desde CSV (caché válida mientras no cambie el archivo)
+    
+    La lectura del CSV se hace fuera del event loop y con un lock para que
+    peticiones concurrentes con la caché fría esperen a una única carga.
+    
+    Con varios workers solo uno parsea el CSV: el resto mapea los arrays del
+    snapshot compartido, así que un worker frío no vuelve a parsear y la
+    memoria de datos no crece con el número de workers. Las columnas son de
+    solo lectura; los builders nunca modifican el DataFrame recibido.
+    """
+    global _rankings_cache, _rankings_cache_time, _rankings_cache_version
+    
+    def cache_fresh():
+        return (
+            not force_refresh
+            and _rankings_cache is not None
+            and _rankings_cache_version == get_data_version()
+        )
+    
+    # Usar caché si los datos no han cambiado
+    if cache_fresh():
+        logger.debug("Returning cached rankings")
+        CACHE_REQUESTS.labels("rankings", "hit").inc()
+        return _rankings_cache.copy(deep=False)
+    
+    CACHE_REQUESTS.labels("rankings", "miss").inc()
+    
+    async with _rankings_load_lock:
+        # Otra petición pudo recargar mientras esperábamos el lock
+        if cache_fresh():
+            return _rankings_cache.copy(deep=False)
         
-        # Actualizar caché
-        _rankings_cache = df
-        _rankings_cache_time = current_time
+        # Recargar datos
+        try:
+            if not RANKS_FILE.exists():
+                raise HTTPException(status_code=404, detail="No hay datos de rankings")
+            
+            version = get_data_version()
+            
+            logger.info("Loading rankings from shared snapshot...")
+            with DATA_LOAD_DURATION.labels("load").time():
+                df = await run_in_threadpool(
+                    _snapshot.load_frame, _snapshot_key(version), _read_rankings_csv
+                )
+            DATA_RECORDS_LOADED.set(len(df))
+            
+            # Actualizar caché
+            _rankings_cache = df
+            _rankings_cache_time = time.time()
+            _rankings_cache_version = version
+            
+            logger.info(f"Loaded {len(df)} records into cache")
+            return df.copy(deep=False)
         
-        logger.info(f"Loaded {len(df)} records into cache")
-        return df.copy()
+        except Exception as e:
+            logger.error(f"Error loading rankings: {e}")
+            raise HTTPException(status_code=500, detail="Error loading rankings data")
+
+
+def _cache_get(key):
+    """Leer de la caché de respuestas marcando la entrada como reciente"""
+    value = _response_cache.get(key)
+    if value is not None:
+        _response_cache.move_to_end(key)
+    return value
+
+
+def _cache_put(key, value):
+    """Guardar en la caché de respuestas descartando las menos usadas"""
+    _response_cache[key] = value
+    _response_cache.move_to_end(key)
+    while len(_response_cache) > MAX_CACHED_RESPONSES:
+        _response_cache.popitem(last=False)
+
+
+async def get_cached_payload(version, endpoint: str, params: tuple, builder, *args,
+                             share: bool = True):
+    """
+    Obtener un payload de la caché de respuestas o construirlo
     
-    except Exception as e:
-        logger.error(f"Error loading rankings: {e}")
-        raise HTTPException(status_code=500, detail="Error loading rankings data")
+    Args:
+        version: Versión de datos actual (get_data_version())
+        endpoint: Nombre del endpoint
+        params: Parámetros que afectan a la respuesta
+        builder: Función síncrona builder(df, *args) que construye el payload
+        share: Publicarlo en el snapshot compartido (no para params arbitrarios
+               del cliente, que en disco no tienen límite)
+    """
+    global _response_cache, _response_cache_version
+    
+    if version != _response_cache_version:
+        _response_cache = OrderedDict()
+        _response_cache_version = version
+    
+    key = (endpoint, params)
+    payload = _cache_get(key)
+    
+    CACHE_REQUESTS.labels("response", "hit" if payload is not None else "miss").inc()
+    
+    if payload is None:
+        # Otro worker pudo haberla construido ya
+        payload = await run_in_threadpool(_snapshot.get_response, _snapshot_key(version), key)
+        CACHE_REQUESTS.labels("shared", "hit" if payload is not None else "miss").inc()
+        
+        if payload is None:
+            df = await load_rankings()
+            payload = await run_in_threadpool(builder, df, *args)
+            
+            if share and _rankings_cache_version == version:
+                await run_in_threadpool(
+                    _snapshot.put_response, _snapshot_key(version), key, payload
+                )
+        
+        # No guardar si entretanto llegó una versión nueva
+        if _response_cache_version == version:
+            _cache_put(key, payload)
+    
+    return payload
+
+
+# Variantes de un cuerpo cacheado (además de las comprimidas en precompress.SUFFIXES)
+IDENTITY = "identity"
+
+
+def _encode_payload(payload) -> dict:
+    """
+    Serializar un payload y comprimirlo con todas las codificaciones
+    
+    Se hace una vez por (endpoint, params, versión de datos); después
+    servir es elegir la variante según Accept-Encoding. Corre en la
+    primera petición, así que usa niveles rápidos (DYNAMIC_LEVELS).
+    
+    Returns:
+        {'identity': bytes, 'gzip': bytes, 'br': bytes}
+    """
+    if isinstance(payload, bytes):
+        body = payload
+    else:
+        # Mismo render que usa FastAPI al devolver un dict
+        body = JSONResponse(content=jsonable_encoder(payload)).body
+    
+    variants = compress_variants(body, DYNAMIC_LEVELS)
+    variants[IDENTITY] = body
+    return variants
+
+
+async def get_encoded_variants(version, endpoint: str, params: tuple, payload) -> dict:
+    """
+    Obtener las variantes serializadas/comprimidas de una respuesta cacheada
+    
+    Se guardan en la caché de respuestas del proceso y en el snapshot
+    compartido, así que cada versión se comprime una sola vez entre todos
+    los workers.
+    """
+    key = (endpoint, params, "encoded")
+    variants = _cache_get(key) if _response_cache_version == version else None
+    
+    CACHE_REQUESTS.labels("encoded", "hit" if variants is not None else "miss").inc()
+    
+    if variants is None:
+        snapshot_key = _snapshot_key(version)
+        
+        def load_shared():
+            shared = {}
+            for encoding in (IDENTITY, "gzip", "br"):
+                body = _snapshot.get_response(snapshot_key, (endpoint, params, encoding))
+                if body is not None:
+                    shared[encoding] = body
+            return shared if IDENTITY in shared else None
+        
+        def build_and_share():
+            built = _encode_payload(payload)
+            for encoding, body in built.items():
+                _snapshot.put_response(snapshot_key, (endpoint, params, encoding), body)
+            return built
+        
+        variants = await run_in_threadpool(load_shared)
+        if variants is None:
+            variants = await run_in_threadpool(build_and_share)
+        
+        if _response_cache_version == version:
+            _cache_put(key, variants)
+    
+    return variants
+
+
+async def cached_response(request: Request, response: Response, endpoint: str,
+                          params: tuple, builder, *args, window: str = None,
+                          negotiated: bool = False):
+    """
+    Servir una respuesta desde la caché de respuestas
+    
+    La clave es (endpoint, params) dentro de la versión de datos actual.
+    Cuando se guarda un tracking nuevo la versión cambia y se descarta toda
+    la caché; mientras tanto las respuestas no expiran y servirlas es una
+    búsqueda en un dict.
+    
+    Antes de tocar los datos se evalúan If-None-Match / If-Modified-Since:
+    un poll sin cambios se contesta con 304 sin cuerpo.
+    
+    Args:
+        request: Petición (cabeceras condicionales)
+        response: Respuesta donde se ponen ETag / Last-Modified
+        endpoint: Nombre del endpoint
+        params: Parámetros de la query que afectan a la respuesta
+        builder: Función síncrona builder(df, *args) que construye el payload
+        window: 'day'/'hour' si la respuesta depende de una ventana relativa a ahora
+        negotiated: Si la codificación depende de Accept (añade Vary)
+    
+    Si el builder devuelve bytes (codificación columnar ya serializada) se
+    cachean y sirven tal cual.
+    
+    El cuerpo se sirve ya serializado y, si el cliente lo acepta,
+    precomprimido (br/gzip): la compresión no se repite en cada petición.
+    """
+    version = get_data_version()
+    
+    # Ventanas relativas a ahora: el bucket entra en la clave y en Last-Modified
+    bucket = window_start(window)
+    if bucket is not None:
+        params = params + (bucket.isoformat(),)
+    
+    last_modified = datetime.fromtimestamp(version[0] / 1e9) if version else None
+    if bucket is not None and last_modified is not None:
+        last_modified = max(last_modified, bucket)
+    
+    validators = build_validators(version, last_modified, endpoint, params)
+    validators['Vary'] = 'Accept, Accept-Encoding' if negotiated else 'Accept-Encoding'
+    
+    # El cliente revalida con el ETag de la variante que guardó: cualquiera
+    # de la versión actual sigue siendo válida
+    for cached_encoding in (None, *ENCODING_SUFFIXES):
+        candidate = {**validators, 'ETag': encoding_etag(validators['ETag'], cached_encoding)}
+        if is_not_modified(request.headers, candidate):
+            CACHE_REQUESTS.labels("conditional", "hit").inc()
+            return Response(status_code=304, headers=candidate)
+    
+    CACHE_REQUESTS.labels("conditional", "miss").inc()
+    
+    payload = await get_cached_payload(version, endpoint, params, builder, *args)
+    variants = await get_encoded_variants(version, endpoint, params, payload)
+    
+    headers = dict(validators)
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"), variants)
+    headers['ETag'] = encoding_etag(validators['ETag'], encoding)
+    if encoding is not None:
+        headers['Content-Encoding'] = encoding
+    
+    media_type = COLUMNAR_MEDIA_TYPE if isinstance(payload, bytes) else "application/json"
+    return Response(
+        content=variants[encoding or IDENTITY], media_type=media_type, headers=headers
+    )
 
 
 @app.get("/")
@@ -128,7 +502,7 @@ async def root(request: Request):
         "name": "ASO Rank Guard API",
         "version": "2.0.0",
         "status": "running",
-        "cache_ttl_seconds": CACHE_TTL,
+        "cache_policy": "invalidated on data change",
         "rate_limit": "60 requests/minute per IP",
         "endpoints": {
             "health": "/health",
@@ -137,8 +511,12 @@ async def root(request: Request):
             "current": "/api/rankings/current",
             "history": "/api/rankings/history",
             "keyword": "/api/rankings/keyword/{keyword}",
+            "batch": "POST /api/rankings/batch",
             "stats": "/api/stats",
+            "kpis": "/api/kpis",
             "changes": "/api/changes",
+            "export": "/api/rankings/export",
+            "live": "/api/live",
             "dashboard": "/dashboard"
         }
     }
@@ -159,8 +537,9 @@ async def health_check(request: Request):
             "cache": {
                 "active": _rankings_cache is not None,
                 "age_seconds": int(cache_age) if cache_age else None,
-                "ttl_seconds": CACHE_TTL
-            }
+                "responses_cached": len(_response_cache)
+            },
+            "live_subscribers": _live_feed.subscriber_count
         }
         
         if data_exists:
@@ -182,10 +561,21 @@ async def health_check(request: Request):
 
 @app.get("/metrics")
 @limiter.limit("30/minute")
-async def get_metrics(request: Request):
-    """Endpoint de métricas del sistema"""
+async def get_metrics(request: Request, format: str = None):
+    """
+    Métricas en formato texto de Prometheus
+    
+    Latencias por endpoint, aciertos de caché, cargas de datos y, agregadas
+    de todos los procesos, duración de trackings, latencia/errores de
+    iTunes por país y latencia de Telegram. format=json devuelve el resumen
+    de datos (también si prometheus_client no está instalado).
+    """
     try:
-        df = load_rankings()
+        if PROMETHEUS_AVAILABLE and format != "json":
+            body, content_type = await run_in_threadpool(render_latest)
+            return Response(content=body, media_type=content_type)
+        
+        df = await load_rankings()
         
         return {
             "cache": {
@@ -202,8 +592,8 @@ async def get_metrics(request: Request):
                 }
             },
             "performance": {
-                "cache_ttl_seconds": CACHE_TTL,
-                "avg_response_time_ms": "< 50ms (cached)"
+                "cache_policy": "invalidated on data change",
+                "responses_cached": len(_response_cache)
             }
         }
     except Exception as e:
@@ -232,75 +622,176 @@ async def get_config(request: Request):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _build_current_rankings(df):
+    """Construir respuesta de rankings actuales (CPU, se ejecuta en threadpool)"""
+    # Últimas posiciones de cada keyword
+    latest = df.sort_values('timestamp').groupby(['keyword', 'country']).last().reset_index()
+    
+    rankings = []
+    for _, row in latest.iterrows():
+        rankings.append({
+            "keyword": row['keyword'],
+            "country": row['country'],
+            "rank": int(row['rank']) if pd.notna(row['rank']) else None,
+            "app_id": int(row['app_id']) if 'app_id' in row and pd.notna(row['app_id']) else None,
+            "timestamp": row['timestamp'].isoformat()
+        })
+    
+    return {
+        "total": len(rankings),
+        "last_update": latest['timestamp'].max().isoformat(),
+        "cached": True,
+        "rankings": rankings
+    }
+
+
+def _build_current_rankings_columnar(df):
+    """Rankings actuales en codificación columnar, ya serializados"""
+    latest = df.sort_values('timestamp').groupby(['keyword', 'country']).last().reset_index()
+    
+    extra_columns = {}
+    if 'app_id' in latest:
+        extra_columns['app_id'] = pd.to_numeric(latest['app_id'], errors='coerce').to_numpy()
+    
+    payload = encode_rankings(
+        latest['keyword'].to_numpy(),
+        latest['country'].to_numpy(),
+        pd.to_numeric(latest['rank'], errors='coerce').to_numpy(dtype=float),
+        latest['timestamp'].to_numpy(),
+        extra_columns
+    )
+    payload.update({
+        "last_update": latest['timestamp'].max().isoformat(),
+        "cached": True
+    })
+    return serialize(payload)
+
+
 @app.get("/api/rankings/current")
 @limiter.limit("60/minute")
-async def get_current_rankings(request: Request):
-    """Obtener rankings más recientes"""
+async def get_current_rankings(request: Request, response: Response, format: str = None):
+    """
+    Obtener rankings más recientes
+    
+    format=columnar (o Accept: application/vnd.asorankguard.columnar+json)
+    devuelve arrays paralelos en lugar de un objeto por fila.
+    """
     try:
-        df = load_rankings()
-        
-        # Últimas posiciones de cada keyword
-        latest = df.sort_values('timestamp').groupby(['keyword', 'country']).last().reset_index()
-        
-        rankings = []
-        for _, row in latest.iterrows():
-            rankings.append({
-                "keyword": row['keyword'],
-                "country": row['country'],
-                "rank": int(row['rank']) if pd.notna(row['rank']) else None,
-                "app_id": int(row['app_id']) if 'app_id' in row and pd.notna(row['app_id']) else None,
-                "timestamp": row['timestamp'].isoformat()
-            })
+        if wants_columnar(format, request.headers.get('accept')):
+            return await cached_response(
+                request, response, "current", ("columnar",),
+                _build_current_rankings_columnar, negotiated=True
+            )
         
-        return {
-            "total": len(rankings),
-            "last_update": latest['timestamp'].max().isoformat(),
-            "cached": True,
-            "rankings": rankings
-        }
+        return await cached_response(
+            request, response, "current", ("rows",), _build_current_rankings,
+            negotiated=True
+        )
     except Exception as e:
         logger.error(f"Current rankings error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _filter_history(df, days: int, keyword: str, country: str, max_points: int = None):
+    """Filtrar (y opcionalmente reducir) el histórico; devuelve (df, total_points)"""
+    # Filtrar por fecha, desde el bucket de la clave de caché (no desde la primera petición)
+    cutoff_date = window_start('day') - timedelta(days=days)
+    df = df[df['timestamp'] >= cutoff_date]
+    
+    # Filtrar por keyword si se especifica
+    if keyword:
+        df = df[df['keyword'] == keyword]
+    
+    # Filtrar por país
+    df = df[df['country'] == country]
+    
+    # Reducir cada serie a max_points conservando picos y valles
+    total_points = len(df)
+    if max_points:
+        keep = downsample_indices(
+            df['keyword'].to_numpy(),
+            df['timestamp'].to_numpy(),
+            pd.to_numeric(df['rank'], errors='coerce').to_numpy(dtype=float),
+            max_points
+        )
+        df = df.iloc[keep]
+    
+    return df, total_points
+
+
+def _build_history(df, days: int, keyword: str, country: str, max_points: int = None):
+    """Construir respuesta de histórico (CPU, se ejecuta en threadpool)"""
+    df, total_points = _filter_history(df, days, keyword, country, max_points)
+    
+    history = []
+    for _, row in df.iterrows():
+        history.append({
+            "keyword": row['keyword'],
+            "country": row['country'],
+            "rank": int(row['rank']) if pd.notna(row['rank']) else None,
+            "timestamp": row['timestamp'].isoformat()
+        })
+    
+    return {
+        "total": len(history),
+        "days": days,
+        "keyword": keyword,
+        "country": country,
+        "max_points": max_points,
+        "total_points": total_points,
+        "cached": True,
+        "history": history
+    }
+
+
+def _build_history_columnar(df, days: int, keyword: str, country: str, max_points: int = None):
+    """Histórico en codificación columnar, ya serializado"""
+    df, total_points = _filter_history(df, days, keyword, country, max_points)
+    
+    payload = encode_rankings(
+        df['keyword'].to_numpy(),
+        df['country'].to_numpy(),
+        pd.to_numeric(df['rank'], errors='coerce').to_numpy(dtype=float),
+        df['timestamp'].to_numpy()
+    )
+    payload.update({
+        "days": days,
+        "keyword": keyword,
+        "country": country,
+        "max_points": max_points,
+        "total_points": total_points,
+        "cached": True
+    })
+    return serialize(payload)
+
+
 @app.get("/api/rankings/history")
 @limiter.limit("40/minute")
-async def get_history(days: int = 30, keyword: str = None, country: str = "US", request: Request = None):
-    """Obtener histórico de rankings"""
+async def get_history(days: int = 30, keyword: str = None, country: str = "US",
+                      max_points: int = None, format: str = None,
+                      request: Request = None, response: Response = None):
+    """
+    Obtener histórico de rankings
+    
+    max_points limita los puntos por keyword (downsampling min/max para
+    gráficas); sin él se devuelven todas las filas. format=columnar (o el
+    media type columnar en Accept) devuelve arrays paralelos.
+    """
     try:
         if days > 90:
             raise HTTPException(status_code=400, detail="Maximum days is 90")
         
-        df = load_rankings()
-        
-        # Filtrar por fecha
-        cutoff_date = datetime.now() - timedelta(days=days)
-        df = df[df['timestamp'] >= cutoff_date]
+        if max_points is not None and max_points < 2:
+            raise HTTPException(status_code=400, detail="max_points must be >= 2")
         
-        # Filtrar por keyword si se especifica
-        if keyword:
-            df = df[df['keyword'] == keyword]
-        
-        # Filtrar por país
-        df = df[df['country'] == country]
-        
-        history = []
-        for _, row in df.iterrows():
-            history.append({
-                "keyword": row['keyword'],
-                "country": row['country'],
-                "rank": int(row['rank']) if pd.notna(row['rank']) else None,
-                "timestamp": row['timestamp'].isoformat()
-            })
+        columnar = wants_columnar(format, request.headers.get('accept'))
         
-        return {
-            "total": len(history),
-            "days": days,
-            "keyword": keyword,
-            "country": country,
-            "cached": True,
-            "history": history
-        }
+        return await cached_response(
+            request, response, "history",
+            (days, keyword, country, max_points, "columnar" if columnar else "rows"),
+            _build_history_columnar if columnar else _build_history,
+            days, keyword, country, max_points, window="day", negotiated=True
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -308,173 +799,773 @@ async def get_history(days: int = 30, keyword: str = None, country: str = "US",
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def get_series_stats(df):
+    """
+    Estadísticas por serie de la versión de datos cargada (SeriesStatsEngine)
+    
+    Se calculan para todas las series en la primera petición de cada
+    versión; el resto de keywords las leen de memoria. Como en
+    TrendAnalyzer, los ranks >= VISIBLE_RANK (no visible) no cuentan.
+    """
+    global _series_stats
+    
+    if _series_stats is None:
+        try:
+            config = load_config()
+        except HTTPException:
+            config = {}  # Sin config.yaml: ventanas por defecto
+        _series_stats = SeriesStatsEngine.from_config(config, max_rank=VISIBLE_RANK)
+    return _series_stats.get(df, version=_rankings_cache_version, date_column='timestamp')
+
+
+def _build_keyword_ranking(df, keyword: str, days: int):
+    """Construir respuesta de una keyword (CPU, se ejecuta en threadpool)"""
+    full_df = df
+    
+    # Filtrar por keyword
+    df = df[df['keyword'] == keyword]
+    
+    if df.empty:
+        raise HTTPException(status_code=404, detail=f"Keyword '{keyword}' no encontrada")
+    
+    # Últimos N días
+    # Desde el bucket de la clave de caché (no desde la primera petición)
+    cutoff_date = window_start('day') - timedelta(days=days)
+    df = df[df['timestamp'] >= cutoff_date]
+    
+    # Ordenar por fecha
+    df = df.sort_values('timestamp')
+    
+    history = []
+    for _, row in df.iterrows():
+        history.append({
+            "rank": int(row['rank']) if pd.notna(row['rank']) else None,
+            "country": row['country'],
+            "timestamp": row['timestamp'].isoformat()
+        })
+    
+    # Stats móviles por país (todo el histórico, no solo los últimos N días)
+    stats = get_series_stats(full_df)
+    by_country = {
+        country: stats.summary(keyword, country)
+        for country in sorted(df['country'].unique())
+    }
+    
+    # Calcular stats
+    ranks = df['rank'].dropna()
+    current_rank = int(df.iloc[-1]['rank']) if not df.empty and pd.notna(df.iloc[-1]['rank']) else None
+    best_rank = int(ranks.min()) if len(ranks) > 0 else None
+    worst_rank = int(ranks.max()) if len(ranks) > 0 else None
+    avg_rank = round(ranks.mean(), 1) if len(ranks) > 0 else None
+    
+    return {
+        "keyword": keyword,
+        "current_rank": current_rank,
+        "best_rank": best_rank,
+        "worst_rank": worst_rank,
+        "average_rank": avg_rank,
+        "total_checks": len(history),
+        "cached": True,
+        "stats": by_country,
+        "history": history
+    }
+
+
 @app.get("/api/rankings/keyword/{keyword}")
 @limiter.limit("40/minute")
-async def get_keyword_ranking(keyword: str, days: int = 30, request: Request = None):
+async def get_keyword_ranking(keyword: str, days: int = 30,
+                              request: Request = None, response: Response = None):
     """Obtener histórico de una keyword específica"""
     try:
         if days > 90:
             raise HTTPException(status_code=400, detail="Maximum days is 90")
         
-        df = load_rankings()
+        return await cached_response(
+            request, response, "keyword", (keyword, days),
+            _build_keyword_ranking, keyword, days, window="day"
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Keyword ranking error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+class KeywordRef(BaseModel):
+    """Par (keyword, país) de una consulta batch"""
+    keyword: str
+    country: str = "US"
+
+
+class BatchQuery(BaseModel):
+    """Consulta batch de varias keywords en un rango de fechas"""
+    keywords: List[KeywordRef]
+    days: int = 30
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+
+
+# Máximo de pares (keyword, país) por consulta batch
+MAX_BATCH_KEYWORDS = 200
+
+
+def _parse_batch_date(value: Optional[str]) -> Optional[pd.Timestamp]:
+    """
+    Fecha de una consulta batch como Timestamp naive en hora local
+    
+    Los timestamps del histórico son naive (hora local del tracker); una
+    fecha con zona (p.ej. '...Z') se convierte a esa hora antes de comparar.
+    """
+    if not value:
+        return None
+    
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is not None:
+        ts = pd.Timestamp(ts.to_pydatetime().astimezone().replace(tzinfo=None))
+    return ts
+
+
+def _build_keywords_batch(df, pairs: tuple, start, end):
+    """
+    Series y stats de varias keywords en una sola pasada (CPU, threadpool)
+    
+    Un inner merge con los pares pedidos filtra el histórico una vez; las
+    stats salen de un groupby y las series se cortan del frame ordenado
+    por los límites de cada grupo.
+    """
+    keys = ['keyword', 'country']
+    wanted = pd.DataFrame(list(pairs), columns=keys).drop_duplicates()
+    
+    in_range = df['timestamp'] >= start
+    if end is not None:
+        in_range &= df['timestamp'] <= end
+    sub = df[in_range]
+    sub = sub.merge(wanted, on=keys, how='inner')
+    sub = sub.sort_values(keys + ['timestamp'], kind='mergesort').reset_index(drop=True)
+    sub['rank'] = pd.to_numeric(sub['rank'], errors='coerce')
+    
+    grouped = sub.groupby(keys, sort=False)
+    stats = grouped['rank'].agg(['min', 'max', 'mean'])
+    bounds = grouped.indices
+    
+    # Conversión a tipos JSON una sola vez para todo el frame
+    ranks = [int(r) if pd.notna(r) else None for r in sub['rank']]
+    timestamps = [ts.isoformat() for ts in sub['timestamp']]
+    
+    series = []
+    for (keyword, country), idx in bounds.items():
+        first, last = int(idx[0]), int(idx[-1]) + 1
+        best, worst, avg = stats.loc[(keyword, country)]
         
-        # Filtrar por keyword
-        df = df[df['keyword'] == keyword]
+        series.append({
+            "keyword": keyword,
+            "country": country,
+            "current_rank": ranks[last - 1],
+            "best_rank": int(best) if pd.notna(best) else None,
+            "worst_rank": int(worst) if pd.notna(worst) else None,
+            "average_rank": round(avg, 1) if pd.notna(avg) else None,
+            "total_checks": int(last - first),
+            "history": [
+                {"rank": ranks[i], "timestamp": timestamps[i]}
+                for i in range(first, last)
+            ]
+        })
+    
+    found = set(bounds.keys())
+    missing = [
+        {"keyword": keyword, "country": country}
+        for keyword, country in wanted.itertuples(index=False)
+        if (keyword, country) not in found
+    ]
+    
+    return {
+        "total": len(series),
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat() if end is not None else None,
+        "cached": True,
+        "series": series,
+        "missing": missing
+    }
+
+
+@app.post("/api/rankings/batch")
+@limiter.limit("40/minute")
+async def get_keywords_batch(query: BatchQuery, request: Request):
+    """
+    Histórico y stats de varias keywords en una sola petición
+    
+    Sustituye a N llamadas a /api/rankings/keyword/{keyword}: todas las
+    series se calculan en una pasada sobre los datos. El rango es
+    start_date..end_date o, si no se indican, los últimos `days` días.
+    """
+    try:
+        if not query.keywords:
+            raise HTTPException(status_code=400, detail="keywords is required")
         
-        if df.empty:
-            raise HTTPException(status_code=404, detail=f"Keyword '{keyword}' no encontrada")
+        if len(query.keywords) > MAX_BATCH_KEYWORDS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Maximum {MAX_BATCH_KEYWORDS} keywords per batch"
+            )
         
-        # Últimos N días
-        cutoff_date = datetime.now() - timedelta(days=days)
-        df = df[df['timestamp'] >= cutoff_date]
+        try:
+            end = _parse_batch_date(query.end_date)
+            start = _parse_batch_date(query.start_date)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid date: {e}")
         
-        # Ordenar por fecha
-        df = df.sort_values('timestamp')
+        if start is None:
+            if query.days > 90:
+                raise HTTPException(status_code=400, detail="Maximum days is 90")
+            start = pd.Timestamp(window_start('day')) - timedelta(days=query.days)
         
-        history = []
-        for _, row in df.iterrows():
-            history.append({
-                "rank": int(row['rank']) if pd.notna(row['rank']) else None,
-                "country": row['country'],
-                "timestamp": row['timestamp'].isoformat()
-            })
+        if end is not None and end == end.normalize():
+            # end_date sin hora incluye el día completo
+            end = end + timedelta(days=1) - timedelta(microseconds=1)
         
-        # Calcular stats
-        ranks = df['rank'].dropna()
-        current_rank = int(df.iloc[-1]['rank']) if not df.empty and pd.notna(df.iloc[-1]['rank']) else None
-        best_rank = int(ranks.min()) if len(ranks) > 0 else None
-        worst_rank = int(ranks.max()) if len(ranks) > 0 else None
-        avg_rank = round(ranks.mean(), 1) if len(ranks) > 0 else None
+        pairs = tuple(sorted({(k.keyword, k.country) for k in query.keywords}))
         
-        return {
-            "keyword": keyword,
-            "current_rank": current_rank,
-            "best_rank": best_rank,
-            "worst_rank": worst_rank,
-            "average_rank": avg_rank,
-            "total_checks": len(history),
-            "cached": True,
-            "history": history
-        }
+        return await get_cached_payload(
+            get_data_version(), "batch", (pairs, start, end),
+            _build_keywords_batch, pairs, start, end, share=False
+        )
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Keyword ranking error: {e}")
+        logger.error(f"Batch error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/api/stats")
-@limiter.limit("60/minute")
-async def get_stats(request: Request):
-    """Obtener estadísticas generales"""
+def kpi_version():
+    """
+    Versión de la tabla de KPIs (mtime_ns)
+    
+    Se escribe justo después del CSV de rankings: va en la clave de caché
+    de los endpoints que la leen para no fijar KPIs del run anterior.
+    """
     try:
-        df = load_rankings()
-        config = load_config()
-        
-        # Stats generales
-        total_keywords = len(df['keyword'].unique())
-        total_checks = len(df)
-        
-        # Rankings actuales
-        latest = df.sort_values('timestamp').groupby('keyword').last()
-        
-        # Top keywords (mejor ranking)
-        top_keywords = latest.nsmallest(10, 'rank')[['rank']].to_dict()['rank']
-        top_keywords = {k: int(v) if pd.notna(v) else None for k, v in top_keywords.items()}
-        
-        # Keywords en top 10
-        in_top_10 = len(latest[latest['rank'] <= 10])
-        in_top_50 = len(latest[latest['rank'] <= 50])
-        in_top_100 = len(latest[latest['rank'] <= 100])
+        return _kpi_store.path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _build_stats(df, kpi_version=None):
+    """Construir estadísticas generales (CPU, se ejecuta en threadpool)"""
+    # KPIs precalculados al guardar el run (la API no escribe la tabla: si
+    # aún no existe se calculan del histórico en memoria)
+    kpis = _kpi_store.latest()
+    
+    if kpis is not None:
+        best_keywords = {}
+        for item in kpis['top_keywords']:
+            best_keywords.setdefault(item['keyword'], item['rank'])
         
         return {
-            "total_keywords": total_keywords,
-            "total_checks": total_checks,
-            "last_check": df['timestamp'].max().isoformat(),
-            "top_10_keywords": in_top_10,
-            "top_50_keywords": in_top_50,
-            "top_100_keywords": in_top_100,
-            "best_keywords": top_keywords,
+            "total_keywords": kpis['keywords'],
+            "total_checks": len(df),
+            "last_check": kpis['run_at'],
+            "top_10_keywords": kpis['top_10'],
+            "top_50_keywords": kpis['top_50'],
+            "top_100_keywords": kpis['top_100'],
+            "top100_rate": kpis['top100_rate'],
+            "avg_rank": kpis['avg_rank'],
+            "best_keywords": best_keywords,
+            "top_movers": kpis['movers'],
             "cached": True
         }
+    
+    # Stats generales
+    total_keywords = len(df['keyword'].unique())
+    total_checks = len(df)
+    
+    # Rankings actuales
+    latest = df.sort_values('timestamp').groupby('keyword').last()
+    
+    # Top keywords (mejor ranking)
+    top_keywords = latest.nsmallest(10, 'rank')[['rank']].to_dict()['rank']
+    top_keywords = {k: int(v) if pd.notna(v) else None for k, v in top_keywords.items()}
+    
+    # Keywords en top 10
+    in_top_10 = len(latest[latest['rank'] <= 10])
+    in_top_50 = len(latest[latest['rank'] <= 50])
+    in_top_100 = len(latest[latest['rank'] <= 100])
+    
+    return {
+        "total_keywords": total_keywords,
+        "total_checks": total_checks,
+        "last_check": df['timestamp'].max().isoformat(),
+        "top_10_keywords": in_top_10,
+        "top_50_keywords": in_top_50,
+        "top_100_keywords": in_top_100,
+        "best_keywords": top_keywords,
+        "cached": True
+    }
+
+
+@app.get("/api/stats")
+@limiter.limit("60/minute")
+async def get_stats(request: Request, response: Response):
+    """Obtener estadísticas generales"""
+    try:
+        kpi_v = kpi_version()
+        return await cached_response(request, response, "stats", (kpi_v,), _build_stats, kpi_v)
     except Exception as e:
         logger.error(f"Stats error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _build_kpis(df, scope: str, value: str, days: Optional[int], kpi_version=None):
+    """KPIs de un ámbito: último run, anterior e histórico para tendencias"""
+    latest = _kpi_store.latest(scope, value)
+    
+    if latest is None:
+        if _kpi_store.is_empty():
+            # Solo lectura: la tabla la crea el tracker o `python src/kpi_store.py`
+            raise HTTPException(status_code=404, detail="No KPIs yet (run src/kpi_store.py to backfill)")
+        raise HTTPException(status_code=404, detail=f"No KPIs for {scope} '{value}'")
+    
+    return {
+        "scope": scope,
+        "value": value,
+        "latest": latest,
+        "previous": _kpi_store.previous(scope, value),
+        "history": _kpi_store.history(scope, value, days),
+        "scopes": _kpi_store.scopes(),
+        "cached": True
+    }
+
+
+@app.get("/api/kpis")
+@limiter.limit("60/minute")
+async def get_kpis(request: Request, response: Response, scope: str = "overall",
+                   value: str = "", days: Optional[int] = None):
+    """
+    KPIs por run (global, por país o por app) con su histórico
+    
+    Los calcula el tracker al guardar cada run: aquí solo se leen.
+    
+    Args:
+        scope: 'overall', 'country' o 'app'
+        value: País / app_id (vacío para overall)
+        days: Limitar el histórico a los últimos N días
+    """
+    if scope not in ("overall", "country", "app"):
+        raise HTTPException(status_code=400, detail="scope must be overall, country or app")
+    if days is not None and not 1 <= days <= 365:
+        raise HTTPException(status_code=400, detail="days must be between 1 and 365")
+    
+    try:
+        kpi_v = kpi_version()
+        return await cached_response(
+            request, response, "kpis", (scope, value, days, kpi_v),
+            _build_kpis, scope, value, days, kpi_v
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"KPIs error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _build_recent_changes(df, hours: int):
+    """Construir cambios recientes (CPU, se ejecuta en threadpool)"""
+    # Obtener datos de las últimas X horas
+    # Desde el bucket de la clave de caché (no desde la primera petición)
+    cutoff_time = window_start('hour') - timedelta(hours=hours)
+    recent_df = df[df['timestamp'] >= cutoff_time]
+    
+    if recent_df.empty:
+        return {"changes": [], "total": 0, "hours": hours, "cached": True}
+    
+    # Para cada keyword, comparar primera vs última posición en el periodo
+    changes = []
+    for keyword in recent_df['keyword'].unique():
+        kw_df = recent_df[recent_df['keyword'] == keyword].sort_values('timestamp')
+        
+        if len(kw_df) < 2:
+            continue
+        
+        first_rank = kw_df.iloc[0]['rank']
+        last_rank = kw_df.iloc[-1]['rank']
+        
+        if pd.notna(first_rank) and pd.notna(last_rank) and first_rank != last_rank:
+            change = int(first_rank - last_rank)  # Positivo = subió
+            changes.append({
+                "keyword": keyword,
+                "old_rank": int(first_rank),
+                "new_rank": int(last_rank),
+                "change": change,
+                "timestamp": kw_df.iloc[-1]['timestamp'].isoformat()
+            })
+    
+    # Ordenar por magnitud del cambio
+    changes.sort(key=lambda x: abs(x['change']), reverse=True)
+    
+    return {
+        "total": len(changes),
+        "hours": hours,
+        "cached": True,
+        "changes": changes
+    }
+
+
 @app.get("/api/changes")
 @limiter.limit("40/minute")
-async def get_recent_changes(hours: int = 24, request: Request = None):
+async def get_recent_changes(hours: int = 24, request: Request = None,
+                             response: Response = None):
     """Obtener cambios recientes en rankings"""
     try:
         if hours > 168:  # Max 7 días
             raise HTTPException(status_code=400, detail="Maximum hours is 168 (7 days)")
         
-        df = load_rankings()
+        return await cached_response(
+            request, response, "changes", (hours,),
+            _build_recent_changes, hours, window="hour"
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Changes error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+EXPORT_SORT_KEY = ['timestamp', 'keyword', 'country']
+
+# Columnas de cada fila exportada (página JSON, NDJSON y CSV)
+EXPORT_FIELDS = ['timestamp', 'keyword', 'country', 'rank']
+
+
+def _export_rows(frame) -> List[dict]:
+    """
+    Filas de exportación de un bloque del histórico
+    
+    Único serializador para los tres formatos: mismas columnas, rank entero
+    (None si falta) y timestamp ISO 8601.
+    """
+    timestamps = pd.to_datetime(frame['timestamp'])
+    ranks = pd.to_numeric(frame['rank'], errors='coerce')
+    
+    return [
+        {
+            "timestamp": ts.isoformat(),
+            "keyword": keyword,
+            "country": country,
+            "rank": int(rank) if pd.notna(rank) else None
+        }
+        for ts, keyword, country, rank in zip(
+            timestamps, frame['keyword'], frame['country'], ranks
+        )
+    ]
+
+
+async def _get_export_sorted():
+    """
+    Histórico ordenado por (timestamp, keyword, country), uno por versión de datos
+    
+    El orden se calcula una vez entre todos los workers: se guarda como un
+    frame más del snapshot compartido y el resto lo mapea.
+    """
+    def fresh(version):
+        return _export_sorted["version"] == version and _export_sorted["df"] is not None
+    
+    version = get_data_version()
+    if fresh(version):
+        return _export_sorted["df"]
+    
+    async with _export_sorted_lock:
+        version = get_data_version()
+        if fresh(version):
+            return _export_sorted["df"]
+        
+        df = await load_rankings()
+        _export_sorted["df"] = await run_in_threadpool(
+            _snapshot.load_frame, _snapshot_key(version),
+            lambda: df.sort_values(EXPORT_SORT_KEY, kind='mergesort').reset_index(drop=True),
+            "export"
+        )
+        _export_sorted["version"] = version
+    
+    return _export_sorted["df"]
+
+
+def _export_start(df, since, after) -> int:
+    """
+    Primera fila de la página en el histórico ordenado (búsqueda binaria)
+    
+    El orden es (timestamp, keyword, country): se busca el timestamp del
+    cursor y, dentro de sus filas (un run), la keyword y el país. Coste
+    O(log N) por página en lugar de una máscara sobre todo el histórico.
+    """
+    timestamps = df['timestamp']
+    start = 0
+    
+    if since is not None:
+        start = int(timestamps.searchsorted(since, 'left'))
+    
+    if after is not None:
+        ts = pd.Timestamp(after[0])
+        lo, hi = timestamps.searchsorted(ts, 'left'), timestamps.searchsorted(ts, 'right')
+        # Texto como object: el cursor puede traer un valor que no está en
+        # las categorías del snapshot (p.ej. una keyword ya no trackeada)
+        keywords = df['keyword'].iloc[lo:hi].to_numpy(dtype=object)
+        kw_lo = lo + keywords.searchsorted(after[1], 'left')
+        kw_hi = lo + keywords.searchsorted(after[1], 'right')
+        countries = df['country'].iloc[kw_lo:kw_hi].to_numpy(dtype=object)
+        start = max(start, int(kw_lo + countries.searchsorted(after[2], 'right')))
+    
+    return start
+
+
+def _build_export_page(df, since, after, limit: int):
+    """Página keyset del histórico ordenado (CPU, se ejecuta en threadpool)"""
+    start = _export_start(df, since, after)
+    rows = _export_rows(df.iloc[start:start + limit])
+    
+    next_cursor = None
+    if len(rows) == limit:
+        last = rows[-1]
+        next_cursor = encode_cursor(last["timestamp"], last["keyword"], last["country"])
+    
+    return {
+        "total": len(rows),
+        "limit": limit,
+        "next_cursor": next_cursor,
+        "rows": rows
+    }
+
+
+def _stream_export(fmt: str, since):
+    """
+    Generar el histórico completo en NDJSON/CSV leyendo el CSV por bloques
+    
+    Starlette itera los generadores síncronos en el threadpool, y cada bloque
+    se descarta tras enviarse: la memoria por petición queda acotada por
+    EXPORT_CHUNK_ROWS. Si el CSV se reemplaza a mitad de export, el archivo
+    abierto sigue siendo el anterior (snapshot consistente).
+    """
+    first = True
+    
+    for chunk in pd.read_csv(RANKS_FILE, chunksize=EXPORT_CHUNK_ROWS):
+        if 'date' in chunk.columns:
+            chunk = chunk.rename(columns={'date': 'timestamp'})
         
-        # Obtener datos de las últimas X horas
-        cutoff_time = datetime.now() - timedelta(hours=hours)
-        recent_df = df[df['timestamp'] >= cutoff_time]
+        if since is not None:
+            chunk = chunk[pd.to_datetime(chunk['timestamp']) >= since]
         
-        if recent_df.empty:
-            return {"changes": [], "total": 0, "hours": hours, "cached": True}
+        if chunk.empty:
+            continue
         
-        # Para cada keyword, comparar primera vs última posición en el periodo
-        changes = []
-        for keyword in recent_df['keyword'].unique():
-            kw_df = recent_df[recent_df['keyword'] == keyword].sort_values('timestamp')
-            
-            if len(kw_df) < 2:
-                continue
-            
-            first_rank = kw_df.iloc[0]['rank']
-            last_rank = kw_df.iloc[-1]['rank']
-            
-            if pd.notna(first_rank) and pd.notna(last_rank) and first_rank != last_rank:
-                change = int(first_rank - last_rank)  # Positivo = subió
-                changes.append({
-                    "keyword": keyword,
-                    "old_rank": int(first_rank),
-                    "new_rank": int(last_rank),
-                    "change": change,
-                    "timestamp": kw_df.iloc[-1]['timestamp'].isoformat()
-                })
-        
-        # Ordenar por magnitud del cambio
-        changes.sort(key=lambda x: abs(x['change']), reverse=True)
+        rows = _export_rows(chunk)
         
-        return {
-            "total": len(changes),
-            "hours": hours,
-            "cached": True,
-            "changes": changes
-        }
+        if fmt == 'csv':
+            yield "".join(iter_csv(rows, EXPORT_FIELDS, header=first))
+        else:
+            yield "".join(iter_ndjson(rows))
+        
+        first = False
+
+
+@app.get("/api/rankings/export")
+@limiter.limit("20/minute")
+async def export_history(format: str = "json", cursor: str = None,
+                         limit: int = DEFAULT_PAGE_SIZE, since: str = None,
+                         request: Request = None):
+    """
+    Exportar el histórico completo (herramientas BI)
+    
+    - format=json: página keyset ordenada por (timestamp, keyword, country);
+      pasar next_cursor como cursor para la siguiente página (None al final).
+    - format=ndjson / csv: streaming de todo el histórico (desde since) sin
+      cargarlo entero en memoria.
+    """
+    try:
+        if format not in ("json", *STREAM_MEDIA_TYPES):
+            raise HTTPException(status_code=400, detail="format must be json, ndjson or csv")
+        
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}")
+        
+        try:
+            since_ts = pd.Timestamp(since) if since else None
+            after = decode_cursor(cursor, 3)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        if not RANKS_FILE.exists():
+            raise HTTPException(status_code=404, detail="No hay datos de rankings")
+        
+        if format in STREAM_MEDIA_TYPES:
+            return StreamingResponse(
+                _stream_export(format, since_ts),
+                media_type=STREAM_MEDIA_TYPES[format],
+                headers={"Content-Disposition": f'attachment; filename="rankings.{format}"'}
+            )
+        
+        df = await _get_export_sorted()
+        return await run_in_threadpool(_build_export_page, df, since_ts, after, limit)
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Changes error: {e}")
+        logger.error(f"Export error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _build_run_delta(df, since, drop_threshold: int, rise_threshold: int):
+    """
+    Cambios y alertas del último tracking (CPU, se ejecuta en threadpool)
+    
+    Las filas con timestamp posterior a `since` son el run nuevo; cada una
+    se compara con la observación anterior de la misma keyword+país. Las
+    alertas siguen los umbrales de RankTracker.detect_changes().
+    """
+    df = df.sort_values(['keyword', 'country', 'timestamp'], kind='mergesort')
+    rank = pd.to_numeric(df['rank'], errors='coerce')
+    prev_rank = rank.groupby([df['keyword'], df['country']]).shift()
+    has_prev = df.groupby(['keyword', 'country']).cumcount() > 0
+    
+    is_new = df['timestamp'] > since if since is not None else pd.Series(True, index=df.index)
+    same = (rank == prev_rank) | (rank.isna() & prev_rank.isna())
+    mask = is_new & has_prev & ~same
+    
+    diff = prev_rank - rank  # Positivo = subió
+    changes, alerts = [], []
+    
+    for keyword, country, old, new, d in zip(df['keyword'][mask], df['country'][mask],
+                                             prev_rank[mask], rank[mask], diff[mask]):
+        change = {
+            "keyword": keyword,
+            "country": country,
+            "old_rank": int(old) if pd.notna(old) else None,
+            "new_rank": int(new) if pd.notna(new) else None,
+            "change": int(d) if pd.notna(d) else None
+        }
+        changes.append(change)
+        
+        if pd.isna(d):
+            continue
+        if d < -drop_threshold:
+            alerts.append({**change, "type": "drop", "severity": "high" if abs(d) > 10 else "medium"})
+        elif d > rise_threshold:
+            alerts.append({**change, "type": "rise", "severity": "positive"})
+    
+    changes.sort(key=lambda x: abs(x['change']) if x['change'] is not None else 0, reverse=True)
+    
+    return {
+        "last_check": df['timestamp'].max().isoformat() if not df.empty else None,
+        "total_new": int(is_new.sum()),
+        "changes": changes,
+        "alerts": alerts
+    }
+
+
+async def _publish_new_run():
+    """Si el CSV cambió, calcular el delta del run nuevo y difundirlo"""
+    version = get_data_version()
+    if version is None or version == _live_state["version"]:
+        return
+    
+    df = await load_rankings()
+    since = _live_state["last_check"]
+    first = _live_state["version"] is None
+    
+    _live_state["version"] = version
+    _live_state["last_check"] = df['timestamp'].max() if not df.empty else None
+    
+    # Primera lectura tras arrancar: solo fija el punto de partida
+    if first or not _live_feed.subscriber_count:
+        return
+    
+    try:
+        alerts_config = load_config().get('alerts', {})
+    except HTTPException:
+        alerts_config = {}
+    
+    delta = await run_in_threadpool(
+        _build_run_delta, df, since,
+        alerts_config.get('drop_threshold', 5),
+        alerts_config.get('rise_threshold', 10)
+    )
+    kpi_v = kpi_version()
+    delta["stats"] = await get_cached_payload(version, "stats", (kpi_v,), _build_stats, kpi_v)
+    
+    _live_feed.publish("run", delta)
+
+
+async def _watch_new_runs():
+    """Tarea de fondo: detectar trackings nuevos para el feed SSE"""
+    while True:
+        try:
+            await _publish_new_run()
+        except Exception as e:
+            logger.error(f"Live feed error: {e}")
+        await asyncio.sleep(LIVE_POLL_SECONDS)
+
+
+@app.on_event("startup")
+async def start_live_feed():
+    _live_state["task"] = asyncio.create_task(_watch_new_runs())
+
+
+@app.on_event("shutdown")
+async def stop_live_feed():
+    _live_feed.close()
+    if _live_state["task"] is not None:
+        _live_state["task"].cancel()
+
+
+@app.on_event("shutdown")
+async def release_metrics():
+    """Salida del worker: sus gauges 'live*' dejan de agregarse en /metrics"""
+    mark_process_dead()
+
+
+@app.get(LIVE_FEED_PATH)
+@limiter.limit("10/minute")
+async def live_feed(request: Request):
+    """
+    Feed en vivo (Server-Sent Events) de trackings nuevos
+    
+    Cada vez que se guarda un tracking se envía un evento `run` con los
+    cambios de ranking, las alertas que dispara y las stats nuevas. Los
+    clientes suscritos no necesitan hacer polling.
+    """
+    return StreamingResponse(
+        _live_feed.stream(request.headers.get("last-event-id")),
+        media_type=SSE_MEDIA_TYPE,
+        headers=SSE_HEADERS
+    )
+
+
 @app.get("/dashboard")
-async def get_dashboard():
-    """Servir el dashboard HTML"""
+async def get_dashboard(request: Request):
+    """Servir el dashboard HTML (variante .br/.gz precomprimida si existe)"""
     dashboard_file = BASE_DIR / "web" / "dashboard.html"
     if not dashboard_file.exists():
         raise HTTPException(status_code=404, detail="Dashboard no encontrado")
     
-    return FileResponse(dashboard_file)
+    path, encoding = precompressed_file(dashboard_file, request.headers.get("accept-encoding"))
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    
+    return FileResponse(path, media_type="text/html", headers=headers)
 
 
 @app.post("/api/cache/clear")
 @limiter.limit("5/hour")
 async def clear_cache(request: Request):
-    """Limpiar caché manualmente (útil después de actualizar datos)"""
-    global _rankings_cache, _rankings_cache_time
+    """Limpiar caché manualmente (normalmente no hace falta: se invalida al cambiar los datos)"""
+    global _rankings_cache, _rankings_cache_time, _rankings_cache_version
+    global _response_cache, _response_cache_version
     
     try:
         _rankings_cache = None
         _rankings_cache_time = 0
+        _rankings_cache_version = None
+        _response_cache = OrderedDict()
+        _response_cache_version = None
+        _export_sorted.update(version=None, df=None)
+        await run_in_threadpool(_snapshot.clear)
         logger.info(f"Cache cleared by {get_remote_address(request)}")
         
         return {
@@ -489,6 +1580,8 @@ async def clear_cache(request: Request):
 
 if __name__ == "__main__":
     import uvicorn
+    # Ficheros de métricas de arranques anteriores (aún no hay workers)
+    clear_multiprocess_dir()
     uvicorn.run(
         app,
         host="0.0.0.0",
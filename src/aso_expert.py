@@ -6,12 +6,18 @@ ASO Expert Analyzer - Análisis profundo PRO con evidencia y scoring
 import pandas as pd
 import logging
 import re
+import sys
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple, Optional
 from pathlib import Path
 from dataclasses import dataclass, asdict
 from enum import Enum
 
+sys.path.insert(0, str(Path(__file__).parent))
+
+from analysis_cache import AnalysisCache, analysis_cache_for, file_version, snapshot_key
+from keyword_classifier import KeywordClassifier
+
 logger = logging.getLogger(__name__)
 
 
@@ -68,27 +74,6 @@ class OpportunityScore:
 class ASOExpert:
     """Analizador experto de ASO con scoring y evidencia"""
     
-    # Volumen proxy basado en tipo de keyword (sin API)
-    VOLUME_PATTERNS = {
-        'brand': 500,        # "biblenow"
-        'generic_2w': 300,   # "bible chat"
-        'generic_3w': 150,   # "audio bible stories"
-        'long_tail': 50,     # "kids calming audio bible"
-        'very_long': 20      # >5 palabras
-    }
-    
-    # Patrones de intención
-    INTENT_PATTERNS = {
-        Intent.INFORMATIONAL: ['stories', 'story', 'tales', 'meaning', 'what is'],
-        Intent.HABIT_ROUTINE: ['daily', 'bedtime', 'morning', 'routine', 'plan'],
-        Intent.AUDIO: ['audio', 'listen', 'podcast', 'sound', 'voice'],
-        Intent.KIDS_FAMILY: ['kids', 'children', 'family', 'child', 'toddler'],
-        Intent.CHAT_AI: ['chat', 'ai', 'ask', 'talk', 'conversation'],
-        Intent.LEARNING: ['learn', 'study', 'education', 'course', 'lesson'],
-        Intent.SLEEP_RELAX: ['sleep', 'calm', 'relax', 'peaceful', 'soothing'],
-        Intent.FREE: ['free', 'gratis', 'no cost']
-    }
-    
     # Mapping de intención a acción
     INTENT_TO_ACTION = {
         Intent.INFORMATIONAL: {
@@ -137,49 +122,20 @@ class ASOExpert:
         self.config = config
         self.ranks_file = Path(config['storage']['ranks_file'])
         self.app_name = config['app']['name']
-        self.brand_keywords = self._detect_brand_keywords()
-    
-    def _detect_brand_keywords(self) -> List[str]:
-        """Detectar keywords de marca"""
-        app_name_lower = self.app_name.lower()
-        brand_words = app_name_lower.split()
-        return [kw for kw in self.config['keywords'] 
-                if any(brand in kw.lower() for brand in brand_words)]
+        # Intención, marca y volumen (vocabularios 'basic', memo persistente)
+        self.classifier = KeywordClassifier.from_config(config, profile='basic')
+        # Último análisis en disco por par de snapshots
+        self.cache = AnalysisCache(
+            analysis_cache_for(self.ranks_file), 'aso_expert', fingerprint=self.classifier.fingerprint
+        )
     
     def _estimate_volume(self, keyword: str) -> int:
         """Estimar volumen de búsqueda (proxy sin API)"""
-        kw_lower = keyword.lower()
-        word_count = len(kw_lower.split())
-        
-        # Brand keywords
-        if keyword in self.brand_keywords:
-            return self.VOLUME_PATTERNS['brand']
-        
-        # Long tail (5+ palabras)
-        if word_count >= 5:
-            return self.VOLUME_PATTERNS['very_long']
-        
-        # 3-4 palabras
-        if word_count >= 3:
-            return self.VOLUME_PATTERNS['long_tail']
-        
-        # Generic 2-3 palabras
-        # Boost si contiene términos populares
-        popular_terms = ['bible', 'audio', 'chat', 'stories', 'sleep', 'kids']
-        if any(term in kw_lower for term in popular_terms):
-            return self.VOLUME_PATTERNS['generic_3w']
-        
-        return self.VOLUME_PATTERNS['generic_2w']
+        return self.classifier.classify(keyword)['volume']
     
     def _detect_intent(self, keyword: str) -> Intent:
         """Detectar intención de búsqueda"""
-        kw_lower = keyword.lower()
-        
-        for intent, patterns in self.INTENT_PATTERNS.items():
-            if any(pattern in kw_lower for pattern in patterns):
-                return intent
-        
-        return Intent.UNKNOWN
+        return Intent(self.classifier.classify(keyword)['intent'])
     
     def _calculate_difficulty(self, rank: int, volume: int) -> str:
         """Calcular dificultad estimada"""
@@ -195,28 +151,7 @@ class ASOExpert:
     
     def _calculate_relevance(self, keyword: str, intent: Intent) -> int:
         """Calcular relevancia 0-100 basado en match con producto"""
-        kw_lower = keyword.lower()
-        score = 50  # Base
-        
-        # Product features (ajustar según tu app)
-        core_features = {
-            'audio': 30,
-            'bible': 20,
-            'stories': 20,
-            'chat': 15,
-            'sleep': 10,
-            'kids': 10,
-            'bedtime': 10,
-            'daily': 5,
-            'free': 5
-        }
-        
-        for feature, points in core_features.items():
-            if feature in kw_lower:
-                score += points
-        
-        # Cap at 100
-        return min(score, 100)
+        return self.classifier.classify(keyword)['relevance']
     
     def _suggest_field(self, rank: int, intent: Intent, relevance: int) -> str:
         """Sugerir qué campo optimizar"""
@@ -239,16 +174,35 @@ class ASOExpert:
             return "description (low priority)"
     
     def analyze_comprehensive(self) -> Dict:
-        """Análisis completo de ASO con insights profundos"""
+        """
+        Análisis completo de ASO con insights profundos
+        
+        Solo depende de los dos últimos días: el resultado se guarda en disco
+        por (día anterior, último día, versión de datos) y se sirve sin
+        recalcular (ni releer el CSV si no ha cambiado).
+        """
         
         if not self.ranks_file.exists():
             return {'error': 'No hay datos históricos'}
         
+        version = file_version(self.ranks_file)
+        cached = self.cache.get_by_file(version)
+        if cached is not None:
+            logger.info("📦 Análisis experto desde caché (CSV sin cambios)")
+            return self._analysis_from_cache(cached)
+        
         df = pd.read_csv(self.ranks_file)
         df['date'] = pd.to_datetime(df['date'])
         df['rank'] = pd.to_numeric(df['rank'], errors='coerce')
         df['date_only'] = df['date'].dt.date
         
+        key = self._snapshot_key(df)
+        cached = self.cache.get(key)
+        if cached is not None:
+            logger.info("📦 Análisis experto desde caché (mismos snapshots)")
+            self.cache.put(key, version, cached)
+            return self._analysis_from_cache(cached)
+        
         # Análisis múltiple
         latest_analysis = self._analyze_current_state(df)
         trends_analysis = self._analyze_trends(df)
@@ -257,7 +211,7 @@ class ASOExpert:
         recommendations = self._generate_recommendations(df, latest_analysis, trends_analysis)
         competitive_insights = self._competitive_analysis(df)
         
-        return {
+        analysis = {
             'current_state': latest_analysis,
             'trends': trends_analysis,
             'opportunities': opportunities,
@@ -266,6 +220,25 @@ class ASOExpert:
             'competitive': competitive_insights,
             'timestamp': datetime.now()
         }
+        
+        self.cache.put(key, version, analysis)
+        return analysis
+    
+    @staticmethod
+    def _snapshot_key(df: pd.DataFrame) -> list:
+        """Clave de caché: (día anterior, último día, versión de los datos de esos días)"""
+        unique_dates = sorted(df['date_only'].unique())
+        latest_date = unique_dates[-1] if unique_dates else None
+        previous_date = unique_dates[-2] if len(unique_dates) >= 2 else None
+        
+        latest = df[df['date_only'] == latest_date]
+        previous = df[df['date_only'] == previous_date] if previous_date else pd.DataFrame()
+        return snapshot_key(previous_date, latest_date, latest, previous)
+    
+    @staticmethod
+    def _analysis_from_cache(cached: Dict) -> Dict:
+        """Análisis guardado (JSON) con la fecha de generación como datetime"""
+        return dict(cached, timestamp=datetime.fromisoformat(cached['timestamp']))
     
     def _analyze_current_state(self, df: pd.DataFrame) -> Dict:
         """Análisis del estado actual"""
@@ -17,17 +17,35 @@ Rules:
 - ROI question: "If you change ONE thing this week, what should it be?"
 """
 
+import numpy as np
 import pandas as pd
 import logging
 import re
-from datetime import datetime, timedelta
-from typing import Dict, List, Tuple, Optional
+import sys
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
 from pathlib import Path
 from dataclasses import dataclass, asdict
 from enum import Enum
 
+sys.path.insert(0, str(Path(__file__).parent))
+
+from analysis_cache import (
+    AnalysisCache, analysis_cache_for, file_version, frame_from_payload, frame_to_payload, snapshot_key
+)
+from keyword_classifier import KeywordClassifier
+from keyword_clusters import KeywordClusterer, MIN_CLUSTER_SIZE, cluster_label
+
 logger = logging.getLogger(__name__)
 
+# Rank a partir del cual una keyword no es visible
+VISIBLE_RANK = 250
+
+# Elementos que se materializan como dataclasses para los reportes
+# (por bucket de oportunidad, movers y amenazas)
+REPORT_TOP_N = 5
+THREATS_TOP_N = 10
+
 
 class Intent(Enum):
     """Tipos de intención de búsqueda"""
@@ -114,241 +132,355 @@ class Threat:
 class ASOExpertPro:
     """Analizador experto profesional con scoring y evidencia"""
     
-    # Volúmenes proxy (ajustar según datos reales si tienes)
-    VOLUME_PATTERNS = {
-        'brand': 500,
-        'generic_2w': 300,
-        'generic_3w': 150,
-        'long_tail': 50,
-        'very_long': 20
-    }
-    
-    # Patrones de intención
-    INTENT_PATTERNS = {
-        Intent.INFORMATIONAL: ['stories', 'story', 'tales', 'meaning', 'what'],
-        Intent.HABIT_ROUTINE: ['daily', 'bedtime', 'morning', 'routine', 'plan'],
-        Intent.AUDIO: ['audio', 'listen', 'podcast', 'sound', 'voice', 'hear'],
-        Intent.KIDS_FAMILY: ['kids', 'children', 'family', 'child', 'toddler', 'baby'],
-        Intent.CHAT_AI: ['chat', 'ai', 'ask', 'talk', 'conversation', 'gpt'],
-        Intent.LEARNING: ['learn', 'study', 'education', 'course', 'lesson'],
-        Intent.SLEEP_RELAX: ['sleep', 'calm', 'relax', 'peaceful', 'soothing', 'meditation'],
-        Intent.FREE: ['free', 'gratis', 'no cost', 'without paying']
-    }
-    
-    # Keywords sensibles (religión, niños, salud)
-    SENSITIVE_PATTERNS = ['bible', 'god', 'jesus', 'church', 'prayer', 'kids', 'children', 'baby']
-    
     def __init__(self, config: dict):
         self.config = config
         self.ranks_file = Path(config['storage']['ranks_file'])
         self.app_name = config['app']['name']
-        self.brand_keywords = self._detect_brand_keywords()
-    
-    def _detect_brand_keywords(self) -> List[str]:
-        """Detectar keywords de marca"""
-        app_name_lower = self.app_name.lower()
-        brand_words = app_name_lower.split()
-        return [kw for kw in self.config['keywords'] 
-                if any(brand in kw.lower() for brand in brand_words)]
+        # Intención, marca, sensibilidad, relevancia y volumen (vocabularios 'pro', memo persistente)
+        self.classifier = KeywordClassifier.from_config(config, profile='pro')
+        # Clusters de canibalización (índice invertido por pares de palabras)
+        self.clusterer = KeywordClusterer.from_config(config)
+        # Último análisis en disco (invalidado si cambian vocabularios o clustering)
+        self.cache = AnalysisCache(
+            analysis_cache_for(self.ranks_file), 'aso_expert_pro',
+            fingerprint=f"{self.classifier.fingerprint}:{sorted(vars(self.clusterer).items())}"
+        )
     
     def _estimate_volume(self, keyword: str) -> int:
         """Estimar volumen de búsqueda (proxy)"""
-        kw_lower = keyword.lower()
-        word_count = len(kw_lower.split())
-        
-        if keyword in self.brand_keywords:
-            return self.VOLUME_PATTERNS['brand']
-        
-        if word_count >= 5:
-            return self.VOLUME_PATTERNS['very_long']
-        
-        if word_count >= 3:
-            # Boost si tiene términos populares
-            popular_boost = sum(1 for term in ['bible', 'audio', 'chat', 'stories', 'sleep'] 
-                              if term in kw_lower)
-            base = self.VOLUME_PATTERNS['long_tail']
-            return min(base * (1 + popular_boost * 0.5), 200)
-        
-        return self.VOLUME_PATTERNS['generic_2w'] if word_count == 2 else self.VOLUME_PATTERNS['generic_3w']
+        return self.classifier.classify(keyword)['volume']
     
     def _detect_intent(self, keyword: str) -> Intent:
         """Detectar intención de búsqueda"""
-        kw_lower = keyword.lower()
-        
-        # Prioridad: más específico primero
-        for intent, patterns in sorted(self.INTENT_PATTERNS.items(), 
-                                      key=lambda x: -len(x[1])):
-            if any(pattern in kw_lower for pattern in patterns):
-                return intent
-        
-        return Intent.UNKNOWN
+        return Intent(self.classifier.classify(keyword)['intent'])
     
     def _is_sensitive(self, keyword: str) -> bool:
         """Detectar si es keyword sensible (políticas)"""
-        kw_lower = keyword.lower()
-        return any(pattern in kw_lower for pattern in self.SENSITIVE_PATTERNS)
-    
-    def _calculate_difficulty(self, rank: int, volume: int) -> str:
-        """Calcular dificultad"""
-        if rank < 10 and volume > 200:
-            return "high"  # Top 10 con volumen = muy competido
-        elif rank < 30 and volume > 100:
-            return "medium"
-        elif rank > 100:
-            return "high"  # Muy abajo = difícil de mover
-        else:
-            return "low"
+        return self.classifier.classify(keyword)['sensitive']
     
     def _calculate_relevance(self, keyword: str, intent: Intent) -> int:
         """Relevancia 0-100 según match con producto"""
-        kw_lower = keyword.lower()
-        score = 40  # Base
-        
-        # Core features de tu app (ajustar según tu producto)
-        core_features = {
-            'audio': 25,
-            'bible': 20,
-            'stories': 20,
-            'chat': 15,
-            'sleep': 12,
-            'kids': 10,
-            'bedtime': 10,
-            'daily': 8,
-            'free': 5,
-            'calming': 8,
-            'peaceful': 6
-        }
-        
-        for feature, points in core_features.items():
-            if feature in kw_lower:
-                score += points
-        
-        # Penalizar si no match con intent principal
-        if intent == Intent.UNKNOWN:
-            score -= 10
-        
-        return max(0, min(score, 100))
-    
-    def _suggest_field_and_action(self, kw: str, rank: int, intent: Intent, 
-                                   relevance: int, volume: int) -> Tuple[str, str, str]:
-        """Sugerir campo, acción específica y confidence"""
-        
-        # Top 10: mantener
-        if rank <= 10:
-            field = "title (maintain)"
-            action = f'Maintain "{kw}" in title. Monitor competitors.'
-            confidence = "high"
-            return field, action, confidence
-        
-        # Quick wins (11-30): subtitle
-        if 11 <= rank <= 30 and volume > 50:
-            field = "subtitle"
-            if intent == Intent.AUDIO:
-                action = f'Add "{kw}" to subtitle. Example: "BibleNow - Audio Bible Stories & {kw}"'
-            elif intent == Intent.SLEEP_RELAX:
-                action = f'Add to subtitle: "Bedtime Bible & {kw} for Sleep"'
-            elif intent == Intent.KIDS_FAMILY:
-                action = f'Add to subtitle: "Safe {kw} - Bible Stories for Children"'
-            elif intent == Intent.CHAT_AI:
-                action = f'Add to subtitle: "Bible Chat AI - Ask & Learn with {kw}"'
-            else:
-                action = f'Add "{kw}" to subtitle prominently'
-            confidence = "high"
-            return field, action, confidence
-        
-        # 31-50: keywords + screenshots
-        if 31 <= rank <= 50:
-            field = "keywords + visual"
-            if intent == Intent.AUDIO:
-                action = f'Add "{kw}" to keywords field. Create screenshot showing audio player with "{kw}" label'
-            elif intent == Intent.SLEEP_RELAX:
-                action = f'Add "{kw}" to keywords. Create night mode screenshot with "{kw}" feature'
-            else:
-                action = f'Add "{kw}" to keywords field. Consider screenshot highlighting this feature'
-            confidence = "medium"
-            return field, action, confidence
-        
-        # 51-100: description
-        if 51 <= rank <= 100:
-            field = "description"
-            action = f'Add "{kw}" in first 2 paragraphs of description. Mention specific use case.'
-            confidence = "medium" if volume > 50 else "low"
-            return field, action, confidence
-        
-        # >100: low priority
-        field = "description (low priority)"
-        action = f'Consider if "{kw}" is worth keeping. Low rank + may have low relevance.'
-        confidence = "low"
-        return field, action, confidence
-    
-    def _calculate_opportunity_score(self, evidence: KeywordEvidence, 
-                                     trend: Optional[int] = 0) -> OpportunityScore:
+        return self.classifier.classify(keyword)['relevance']
+    
+    # Campo sugerido, acción (plantilla con {kw}) y confidence por tramo de rank
+    # e intención; el primer tramo que cumple gana (igual que un if/elif)
+    FIELD_RULES = [
+        # (tramo, campo, {intent: plantilla} | plantilla, confidence; None = según volumen)
+        ('top10', "title (maintain)", 'Maintain "{kw}" in title. Monitor competitors.', "high"),
+        ('quick_win', "subtitle", {
+            Intent.AUDIO: 'Add "{kw}" to subtitle. Example: "BibleNow - Audio Bible Stories & {kw}"',
+            Intent.SLEEP_RELAX: 'Add to subtitle: "Bedtime Bible & {kw} for Sleep"',
+            Intent.KIDS_FAMILY: 'Add to subtitle: "Safe {kw} - Bible Stories for Children"',
+            Intent.CHAT_AI: 'Add to subtitle: "Bible Chat AI - Ask & Learn with {kw}"',
+            None: 'Add "{kw}" to subtitle prominently',
+        }, "high"),
+        ('keywords_visual', "keywords + visual", {
+            Intent.AUDIO: 'Add "{kw}" to keywords field. Create screenshot showing audio player with "{kw}" label',
+            Intent.SLEEP_RELAX: 'Add "{kw}" to keywords. Create night mode screenshot with "{kw}" feature',
+            None: 'Add "{kw}" to keywords field. Consider screenshot highlighting this feature',
+        }, "medium"),
+        ('description', "description",
+         'Add "{kw}" in first 2 paragraphs of description. Mention specific use case.', None),
+        (None, "description (low priority)",
+         'Consider if "{kw}" is worth keeping. Low rank + may have low relevance.', "low"),
+    ]
+    
+    # Causa, acción y checks de cada severidad de amenaza
+    THREAT_PLAYBOOK = {
+        Severity.CRITICAL: (
+            "Probable: Competitor update OR ratings drop OR algorithm change",
+            "URGENT: Check top 10 competitors, review recent ratings, verify metadata unchanged",
+            [
+                "Search keyword in App Store - check top 10",
+                "Compare competitor screenshots/titles",
+                "Review ratings last 7 days",
+                "Verify no metadata change on your side"
+            ]
+        ),
+        Severity.HIGH: (
+            "Probable: Competitor optimization OR seasonal drop",
+            "HIGH: Analyze competitor metadata, check for seasonal patterns",
+            [
+                "Check competitors in rank 1-30",
+                "Review seasonality (calendar, trends)",
+                "Verify CVR hasn't dropped"
+            ]
+        ),
+        Severity.MEDIUM: (
+            "Probable: Normal volatility OR minor algorithm shift",
+            "MEDIUM: Monitor for 2-3 more days. If persists, investigate.",
+            [
+                "Wait 3 days and re-check",
+                "Compare with other similar keywords"
+            ]
+        ),
+    }
+    
+    SEVERITY_ORDER = [Severity.CRITICAL, Severity.HIGH, Severity.MEDIUM, Severity.LOW]
+    
+    def _keyword_features(self, keywords: pd.Series) -> pd.DataFrame:
         """
-        Calcular Opportunity Score 0-100
+        Volumen, intención, relevancia y sensibilidad de cada keyword
         
-        Impact (0-40): volumen normalizado
-        Feasibility (0-30): proximidad a top10 + tendencia
-        Relevance (0-20): match con producto
-        Risk (-10 to 0): sensibilidad/políticas
+        Solo dependen del texto: se clasifican una vez por keyword única
+        (KeywordClassifier, memorizado entre runs) y se reparten a todas sus
+        filas (una por país).
+        """
+        unique = pd.unique(keywords)
+        classes = self.classifier.classify_frame(unique)
+        features = pd.DataFrame({
+            'volume_proxy': classes['volume'].to_numpy(dtype=np.int64),
+            'intent': pd.Categorical(classes['intent'], categories=[intent.value for intent in Intent]),
+            'relevance': classes['relevance'].to_numpy(dtype=np.int64),
+            'sensitive': classes['sensitive'].to_numpy(dtype=bool),
+        }, index=unique)
+        return features.reindex(keywords.to_numpy()).reset_index(drop=True)
+    
+    def build_evidence(self, latest: pd.DataFrame, previous: pd.DataFrame,
+                       cached: Optional[pd.DataFrame] = None) -> pd.DataFrame:
         """
+        Tabla de evidencia columnar: una fila por (keyword, país)
+        
+        Un solo merge con el día anterior da rank_prev/delta y todo el scoring
+        (dificultad, campo, oportunidad, amenaza) se calcula por columnas.
         
-        # IMPACT (0-40): volumen
-        volume_norm = min(evidence.volume_proxy / 500, 1.0)  # Normalizar a 500 max
-        impact = int(volume_norm * 40)
-        
-        # FEASIBILITY (0-30): proximidad + tendencia
-        if evidence.rank_now <= 10:
-            proximity = 20  # Ya está top, mantener
-        elif evidence.rank_now <= 30:
-            proximity = 15  # Cerca del top 10
-        elif evidence.rank_now <= 50:
-            proximity = 10
-        elif evidence.rank_now <= 100:
-            proximity = 5
+        Args:
+            latest: Filas del último día (keyword, country, rank)
+            previous: Filas del día anterior (vacío si no hay comparación)
+            cached: Evidencia de un análisis anterior del mismo par de días
+                    (solo se puntúan las filas cambiadas)
+        
+        Returns:
+            DataFrame tipado (ver columnas en _score_evidence)
+        """
+        current = latest[['keyword', 'country', 'rank']].dropna(subset=['rank'])
+        evidence = current.rename(columns={'rank': 'rank_now'}).reset_index(drop=True)
+        evidence['rank_now'] = evidence['rank_now'].astype(np.int64)
+        
+        if len(previous) > 0:
+            prev = previous[['keyword', 'country', 'rank']].dropna(subset=['rank']) \
+                .rename(columns={'rank': 'rank_prev'})
+            evidence = evidence.merge(prev, on=['keyword', 'country'], how='left', validate='one_to_one')
         else:
-            proximity = 0
+            evidence['rank_prev'] = np.nan
         
-        trend_score = min(max(trend or 0, -5), 5)  # -5 a +5
-        trend_points = trend_score  # +5 si sube, -5 si baja
+        evidence['rank_prev'] = evidence['rank_prev'].astype('Int64')
+        evidence['delta'] = evidence['rank_prev'] - evidence['rank_now']  # Positivo = mejoró
         
-        feasibility = min(proximity + trend_points, 30)
+        if cached is not None:
+            return self._update_evidence(evidence, cached)
         
-        # RELEVANCE (0-20): del cálculo anterior
-        relevance_score = int(evidence.relevance / 100 * 20)
+        evidence = pd.concat([evidence, self._keyword_features(evidence['keyword'])], axis=1)
+        return self._score_evidence(evidence)
+    
+    def _update_evidence(self, base: pd.DataFrame, cached: pd.DataFrame) -> pd.DataFrame:
+        """
+        Evidencia reutilizando la de un análisis anterior
         
-        # RISK (-10 to 0): keywords sensibles
-        risk = -10 if self._is_sensitive(evidence.keyword) else 0
+        Las filas con el mismo rank actual y anterior se copian de la tabla
+        guardada; solo las nuevas o cambiadas (p.ej. re-run parcial de hoy)
+        pasan por features y scoring. El orden es el de base, igual que un
+        cálculo completo.
         
-        total = impact + feasibility + relevance_score + risk
-        total = max(0, min(total, 100))  # Clamp 0-100
+        Args:
+            base: keyword, country, rank_now, rank_prev, delta (salida del merge)
+            cached: Evidencia completa del análisis anterior
+        """
+        keys = ['keyword', 'country']
+        position = pd.Series(np.arange(len(cached)), index=pd.MultiIndex.from_frame(cached[keys]))
+        position = position.reindex(pd.MultiIndex.from_frame(base[keys])).to_numpy()
+        found = ~np.isnan(position)
+        old = cached.iloc[np.where(found, position, 0).astype(np.int64)]
+        
+        prev_new = base['rank_prev'].to_numpy(dtype=float, na_value=np.nan)
+        prev_old = old['rank_prev'].to_numpy(dtype=float, na_value=np.nan)
+        unchanged = found \
+            & (base['rank_now'].to_numpy() == old['rank_now'].to_numpy()) \
+            & ((prev_new == prev_old) | (np.isnan(prev_new) & np.isnan(prev_old)))
+        
+        reused = old[unchanged].set_axis(np.flatnonzero(unchanged))
+        changed = base[~unchanged].reset_index(drop=True)
+        logger.info(f"♻️  Evidencia incremental: {len(changed)} filas recalculadas, {len(reused)} reutilizadas")
+        
+        if len(changed) == 0:
+            return reused.reset_index(drop=True)
+        
+        changed = pd.concat([changed, self._keyword_features(changed['keyword'])], axis=1)
+        rescored = self._score_evidence(changed).set_axis(np.flatnonzero(~unchanged))
+        if len(reused) == 0:
+            return rescored.reset_index(drop=True)
+        
+        return pd.concat([reused, rescored]).sort_index().reset_index(drop=True)
+    
+    def _score_evidence(self, evidence: pd.DataFrame) -> pd.DataFrame:
+        """
+        Añadir scoring a la tabla de evidencia
         
-        # BUCKET
-        if total >= 80:
-            bucket = "DO NOW"
-        elif total >= 60:
-            bucket = "NEXT"
-        elif total >= 40:
-            bucket = "WATCH"
-        else:
-            bucket = "IGNORE"
+        Columnas añadidas:
+            difficulty, field_suggestion, action_template, confidence
+            visible, impact (0-40), feasibility (0-30), relevance_score (0-20),
+            risk (-10/0), total_score (0-100), bucket
+            severity (amenaza si cayó; NaN si no es amenaza)
+        """
+        rank = evidence['rank_now'].to_numpy()
+        volume = evidence['volume_proxy'].to_numpy()
+        delta = evidence['delta'].fillna(0).to_numpy(dtype=np.int64)
+        prev = evidence['rank_prev'].fillna(0).to_numpy(dtype=np.int64)
+        has_prev = evidence['rank_prev'].notna().to_numpy()
+        intent = evidence['intent'].to_numpy()
+        
+        def categorical(values, categories):
+            return pd.Categorical(values, categories=list(dict.fromkeys(categories)))
+        
+        # DIFICULTAD: top 10 con volumen = muy competido; muy abajo = difícil de mover
+        difficulty = np.select(
+            [(rank < 10) & (volume > 200), (rank < 30) & (volume > 100), rank > 100],
+            ['high', 'medium', 'high'], 'low'
+        )
+        evidence['difficulty'] = categorical(difficulty, ['low', 'medium', 'high'])
+        
+        # CAMPO + ACCIÓN + CONFIDENCE
+        bands = {
+            'top10': rank <= 10,
+            'quick_win': (rank >= 11) & (rank <= 30) & (volume > 50),
+            'keywords_visual': (rank >= 31) & (rank <= 50),
+            'description': (rank >= 51) & (rank <= 100),
+        }
+        conditions, fields, templates, confidences = [], [], [], []
+        for band, field, template, confidence in self.FIELD_RULES:
+            condition = bands[band] if band else np.ones(len(rank), dtype=bool)
+            if isinstance(template, dict):
+                by_intent = np.full(len(rank), template[None], dtype=object)
+                for rule_intent, rule_template in template.items():
+                    if rule_intent is not None:
+                        by_intent[intent == rule_intent.value] = rule_template
+                template = by_intent
+            if confidence is None:
+                confidence = np.where(volume > 50, "medium", "low")
+            conditions.append(condition)
+            fields.append(field)
+            templates.append(template)
+            confidences.append(confidence)
+        
+        evidence['field_suggestion'] = categorical(np.select(conditions, fields, ''), fields)
+        evidence['action_template'] = np.select(conditions, templates, '')
+        evidence['confidence'] = categorical(np.select(conditions, confidences, ''), ['high', 'medium', 'low'])
+        
+        # OPORTUNIDAD (solo keywords visibles)
+        visible = rank < VISIBLE_RANK
+        evidence['visible'] = visible
+        
+        # IMPACT (0-40): volumen normalizado a 500
+        impact = np.floor(np.minimum(volume / 500, 1.0) * 40).astype(np.int64)
+        
+        # FEASIBILITY (0-30): proximidad a top 10 + tendencia (-5 a +5)
+        proximity = np.select([rank <= 10, rank <= 30, rank <= 50, rank <= 100], [20, 15, 10, 5], 0)
+        feasibility = np.minimum(proximity + np.clip(delta, -5, 5), 30)
+        
+        # RELEVANCE (0-20) y RISK (-10 a 0): keywords sensibles
+        relevance_score = np.floor(evidence['relevance'].to_numpy() / 100 * 20).astype(np.int64)
+        risk = np.where(evidence['sensitive'].to_numpy(), -10, 0)
+        
+        total = np.clip(impact + feasibility + relevance_score + risk, 0, 100)
+        bucket = np.select([total >= 80, total >= 60, total >= 40], ["DO NOW", "NEXT", "WATCH"], "IGNORE")
+        
+        evidence['impact'] = impact
+        evidence['feasibility'] = feasibility
+        evidence['relevance_score'] = relevance_score
+        evidence['risk'] = risk
+        evidence['total_score'] = total
+        evidence['bucket'] = categorical(bucket, ["DO NOW", "NEXT", "WATCH", "IGNORE"])
+        
+        # AMENAZAS (solo si cayó)
+        drop = -delta
+        dropped = delta < 0
+        severity = np.select(
+            [
+                dropped & ((has_prev & (prev <= 10) & (rank > 20)) | ((drop > 15) & (volume > 200))),
+                dropped & ((has_prev & (prev <= 30) & (rank > 60)) | (drop > 20)),
+                dropped & (drop >= 5) & (volume > 50),
+            ],
+            [Severity.CRITICAL.value, Severity.HIGH.value, Severity.MEDIUM.value],
+            None
+        )
+        evidence['severity'] = categorical(severity, [s.value for s in self.SEVERITY_ORDER])
         
+        return evidence
+    
+    # === MATERIALIZACIÓN (solo top-N para reportes) ===
+    
+    @staticmethod
+    def _to_evidence(row) -> KeywordEvidence:
+        """Dataclass de una fila de la tabla de evidencia (itertuples)"""
+        return KeywordEvidence(
+            keyword=row.keyword,
+            rank_now=int(row.rank_now),
+            rank_prev=int(row.rank_prev) if pd.notna(row.rank_prev) else None,
+            delta=int(row.delta) if pd.notna(row.delta) else None,
+            volume_proxy=int(row.volume_proxy),
+            difficulty=row.difficulty,
+            intent=row.intent,
+            relevance=int(row.relevance),
+            country=row.country,
+            field_suggestion=row.field_suggestion,
+            action=row.action_template.format(kw=row.keyword),
+            confidence=row.confidence
+        )
+    
+    def _to_opportunity(self, row) -> OpportunityScore:
         return OpportunityScore(
-            keyword=evidence.keyword,
-            total_score=total,
-            impact=impact,
-            feasibility=feasibility,
-            relevance=relevance_score,
-            risk=risk,
-            bucket=bucket,
-            evidence=evidence
+            keyword=row.keyword,
+            total_score=int(row.total_score),
+            impact=int(row.impact),
+            feasibility=int(row.feasibility),
+            relevance=int(row.relevance_score),
+            risk=int(row.risk),
+            bucket=row.bucket,
+            evidence=self._to_evidence(row)
         )
     
+    def _to_threat(self, row) -> Threat:
+        severity = Severity(row.severity)
+        cause, action, checks = self.THREAT_PLAYBOOK[severity]
+        return Threat(
+            keyword=row.keyword,
+            severity=severity,
+            rank_now=int(row.rank_now),
+            rank_prev=int(row.rank_prev) if pd.notna(row.rank_prev) else 0,
+            delta=int(row.delta),
+            volume=int(row.volume_proxy),
+            cause_probable=cause,
+            action=action,
+            checks=list(checks)
+        )
+    
+    @staticmethod
+    def ranked_opportunities(evidence: pd.DataFrame) -> pd.DataFrame:
+        """Keywords visibles ordenadas por score (estable: empate = orden de la tabla)"""
+        return evidence[evidence['visible']].sort_values('total_score', ascending=False, kind='mergesort')
+    
     def analyze_comprehensive(self) -> Dict:
-        """Análisis completo PRO con evidencia"""
+        """
+        Análisis completo PRO con evidencia
+        
+        La evidencia de todas las keywords va en una tabla columnar
+        ('evidence'); solo se crean dataclasses para lo que muestran los
+        reportes (top oportunidades por bucket, movers y amenazas).
+        
+        El resultado se guarda en disco por (día anterior, último día,
+        versión de datos): si el CSV no cambia ni se relee, y si solo cambian
+        filas del mismo par de días se recalculan solo esas keywords.
+        """
         
         if not self.ranks_file.exists():
             return {'error': 'No hay datos históricos'}
         
+        version = file_version(self.ranks_file)
+        payload = self.cache.get_by_file(version)
+        if payload is not None:
+            logger.info("📦 Análisis PRO desde caché (CSV sin cambios)")
+            return self._analysis_from_payload(payload)
+        
         df = pd.read_csv(self.ranks_file)
         df['date'] = pd.to_datetime(df['date'])
         df['rank'] = pd.to_numeric(df['rank'], errors='coerce')
@@ -363,10 +495,6 @@ class ASOExpertPro:
         latest_date = unique_dates[-1]
         previous_date = unique_dates[-2] if len(unique_dates) >= 2 else None
         
-        # Validar si hay comparación
-        has_valid_comparison = previous_date is not None
-        data_quality = "✅ OK" if has_valid_comparison else "❌ No comparison"
-        
         latest = df[df['date_only'] == latest_date].drop_duplicates(subset=['keyword', 'country'], keep='last')
         
         if previous_date:
@@ -374,96 +502,106 @@ class ASOExpertPro:
         else:
             previous = pd.DataFrame()  # Empty DataFrame
         
-        # Generar evidencia para cada keyword
-        all_evidence = []
-        opportunities = []
-        threats = []
+        # Mismo par de snapshots que el último análisis (cambió otro histórico)
+        key = snapshot_key(previous_date, latest_date, latest, previous)
+        payload = self.cache.get(key)
+        if payload is not None:
+            logger.info("📦 Análisis PRO desde caché (mismos snapshots)")
+            self.cache.put(key, version, payload)
+            return self._analysis_from_payload(payload)
+        
+        # Evidencia + scoring de todas las keywords (columnar); si el último
+        # análisis es del mismo par de días, solo las filas cambiadas
+        base = self.cache.matches_dates(key)
+        cached = frame_from_payload(base['evidence']) if base is not None else None
+        evidence = self.build_evidence(latest, previous, cached=cached)
+        
+        # Los clusters solo dependen del conjunto de keywords
+        if cached is not None and set(evidence['keyword']) == set(cached['keyword']):
+            clusters = base['clusters']
+        else:
+            clusters = self.clusterer.cluster(evidence['keyword'], min_size=2)
         
-        for _, row in latest.iterrows():
-            kw = row['keyword']
-            rank_now = int(row['rank'])
-            country = row['country']
-            
-            # Rank anterior
-            rank_prev = None
-            delta = None
-            
-            if len(previous) > 0:
-                prev_row = previous[previous['keyword'] == kw]
-                if len(prev_row) > 0:
-                    rank_prev = int(prev_row.iloc[0]['rank'])
-                    delta = (rank_prev - rank_now)  # Positivo = mejoró
-            
-            # Calcular métricas
-            volume = self._estimate_volume(kw)
-            intent = self._detect_intent(kw)
-            relevance = self._calculate_relevance(kw, intent)
-            difficulty = self._calculate_difficulty(rank_now, volume)
-            field, action, confidence = self._suggest_field_and_action(kw, rank_now, intent, relevance, volume)
-            
-            evidence = KeywordEvidence(
-                keyword=kw,
-                rank_now=rank_now,
-                rank_prev=rank_prev,
-                delta=delta,
-                volume_proxy=volume,
-                difficulty=difficulty,
-                intent=intent.value,
-                relevance=relevance,
-                country=country,
-                field_suggestion=field,
-                action=action,
-                confidence=confidence
-            )
-            
-            all_evidence.append(evidence)
-            
-            # Calcular opportunity score
-            if rank_now < 250:  # Solo keywords visibles
-                trend = delta if delta else 0
-                opp_score = self._calculate_opportunity_score(evidence, trend)
-                opportunities.append(opp_score)
-            
-            # Detectar amenazas
-            if delta and delta < 0:  # Cayó
-                threat = self._detect_threat(evidence, abs(delta))
-                if threat:
-                    threats.append(threat)
+        # Oportunidades por score: top N de cada bucket
+        ranked = self.ranked_opportunities(evidence)
+        shown = ranked.groupby('bucket', observed=True, sort=False).head(REPORT_TOP_N)
         
-        # Ordenar oportunidades por score
-        opportunities.sort(key=lambda x: x.total_score, reverse=True)
+        # Amenazas por severidad
+        threat_rows = evidence[evidence['severity'].notna()].sort_values(
+            'severity', key=lambda s: s.cat.codes, kind='mergesort'
+        ).head(THREATS_TOP_N)
         
-        # Ordenar amenazas por severidad
-        severity_order = {Severity.CRITICAL: 0, Severity.HIGH: 1, Severity.MEDIUM: 2, Severity.LOW: 3}
-        threats.sort(key=lambda x: severity_order[x.severity])
+        # Top movers
+        delta = evidence['delta']
+        gainers = evidence[delta > 0].sort_values('delta', ascending=False, kind='mergesort')
+        losers = evidence[delta < 0].sort_values('delta', kind='mergesort')
         
-        # Métricas agregadas (con definiciones claras)
-        visible = [e for e in all_evidence if e.rank_now < 250]
+        payload = {
+            'period_dates': [previous_date.isoformat() if previous_date else None, latest_date.isoformat()],
+            'market': f"{latest.iloc[0]['country']} EN" if len(latest) > 0 else "US EN",
+            'metrics': self._evidence_metrics(evidence),
+            # Filas (posición en la tabla) que se materializan para los reportes
+            'opportunities': shown.index.tolist(),
+            'threats': threat_rows.index.tolist(),
+            'top_gainers': gainers.head(REPORT_TOP_N).index.tolist(),
+            'top_losers': losers.head(REPORT_TOP_N).index.tolist(),
+            'clusters': clusters,
+            'cannibalization': self._detect_cannibalization(evidence, clusters),
+        }
+        analysis = self._build_analysis(payload, evidence)
+        
+        payload['evidence'] = frame_to_payload(evidence)
+        self.cache.put(key, version, payload)
+        return analysis
+    
+    @staticmethod
+    def _evidence_metrics(evidence: pd.DataFrame) -> Dict:
+        """Métricas agregadas (con definiciones claras)"""
+        rank = evidence['rank_now']
+        volume = evidence['volume_proxy']
+        visible = evidence['visible']
         
         # Visibility: % keywords en top 250 ponderado por volumen
-        total_volume = sum(e.volume_proxy for e in all_evidence)
-        visible_volume = sum(e.volume_proxy for e in visible)
+        total_volume = volume.sum()
+        visible_volume = volume[visible].sum()
         visibility_weighted = (visible_volume / total_volume * 100) if total_volume > 0 else 0
         
         # Avg rank ponderado por volumen
-        if visible:
-            weighted_ranks = sum(e.rank_now * e.volume_proxy for e in visible)
-            total_weight = sum(e.volume_proxy for e in visible)
-            avg_rank_weighted = weighted_ranks / total_weight
+        if visible.any():
+            avg_rank_weighted = (rank[visible] * volume[visible]).sum() / visible_volume
         else:
             avg_rank_weighted = 0
         
         # Share of voice estimado (% del volumen capturable en top 20)
-        top20 = [e for e in visible if e.rank_now <= 20]
-        sov = (sum(e.volume_proxy for e in top20) / total_volume * 100) if total_volume > 0 else 0
+        sov = (volume[visible & (rank <= 20)].sum() / total_volume * 100) if total_volume > 0 else 0
         
-        # Top movers
-        with_delta = [e for e in all_evidence if e.delta is not None]
-        top_gainers = sorted([e for e in with_delta if e.delta > 0], key=lambda x: x.delta, reverse=True)[:5]
-        top_losers = sorted([e for e in with_delta if e.delta < 0], key=lambda x: x.delta)[:5]
+        return {
+            'visibility_weighted': float(visibility_weighted),
+            'visibility_simple': float(visible.sum() / len(evidence) * 100) if len(evidence) else 0,
+            'avg_rank_weighted': float(avg_rank_weighted),
+            'avg_rank_simple': float(rank[visible].mean()) if visible.any() else 0,
+            'share_of_voice': float(sov),
+            'top10_count': int((visible & (rank <= 10)).sum()),
+            'top20_count': int((visible & (rank <= 20)).sum()),
+            'top50_count': int((visible & (rank <= 50)).sum())
+        }
+    
+    def _analysis_from_payload(self, payload: Dict) -> Dict:
+        """Análisis a partir de un payload de la caché"""
+        return self._build_analysis(payload, frame_from_payload(payload['evidence']))
+    
+    def _build_analysis(self, payload: Dict, evidence: pd.DataFrame) -> Dict:
+        """
+        Resultado de analyze_comprehensive() a partir de la evidencia y las
+        filas seleccionadas (igual si viene de un cálculo o de la caché)
+        """
+        previous_date, latest_date = (
+            date.fromisoformat(value) if value else None for value in payload['period_dates']
+        )
         
-        # Canibalización (keywords similares compitiendo)
-        cannibalization = self._detect_cannibalization(all_evidence)
+        # Validar si hay comparación
+        has_valid_comparison = previous_date is not None
+        data_quality = "✅ OK" if has_valid_comparison else "❌ No comparison"
         
         # Calcular periodo mostrado
         if has_valid_comparison:
@@ -475,115 +613,55 @@ class ASOExpertPro:
         else:
             period_str = f"{latest_date} (single point)"
         
+        def rows(name):
+            return evidence.loc[payload[name]].itertuples(index=False)
+        
         return {
             'period': period_str,
             'period_dates': (previous_date, latest_date),
             'has_valid_comparison': has_valid_comparison,
             'data_quality': data_quality,
-            'market': f"{latest.iloc[0]['country']} EN" if len(latest) > 0 else "US EN",
-            'data_points': len(all_evidence),
-            'metrics': {
-                'visibility_weighted': visibility_weighted,
-                'visibility_simple': len(visible) / len(all_evidence) * 100,
-                'avg_rank_weighted': avg_rank_weighted,
-                'avg_rank_simple': sum(e.rank_now for e in visible) / len(visible) if visible else 0,
-                'share_of_voice': sov,
-                'top10_count': len([e for e in visible if e.rank_now <= 10]),
-                'top20_count': len([e for e in visible if e.rank_now <= 20]),
-                'top50_count': len([e for e in visible if e.rank_now <= 50])
-            },
-            'opportunities': opportunities,
-            'threats': threats,
-            'top_gainers': top_gainers,
-            'top_losers': top_losers,
-            'cannibalization': cannibalization,
-            'all_evidence': all_evidence
+            'market': payload['market'],
+            'data_points': len(evidence),
+            'metrics': payload['metrics'],
+            'opportunities': [self._to_opportunity(row) for row in rows('opportunities')],
+            'threats': [self._to_threat(row) for row in rows('threats')],
+            'top_gainers': [self._to_evidence(row) for row in rows('top_gainers')],
+            'top_losers': [self._to_evidence(row) for row in rows('top_losers')],
+            'cannibalization': payload['cannibalization'],
+            'evidence': evidence
         }
     
-    def _detect_threat(self, evidence: KeywordEvidence, drop: int) -> Optional[Threat]:
-        """Detectar amenaza con severity y contexto"""
-        
-        rank = evidence.rank_now
-        volume = evidence.volume_proxy
-        
-        # CRITICAL: top10 → >20 o caída >15 con volumen alto
-        if ((evidence.rank_prev and evidence.rank_prev <= 10 and rank > 20) or 
-            (drop > 15 and volume > 200)):
-            severity = Severity.CRITICAL
-            cause = "Probable: Competitor update OR ratings drop OR algorithm change"
-            action = "URGENT: Check top 10 competitors, review recent ratings, verify metadata unchanged"
-            checks = [
-                "Search keyword in App Store - check top 10",
-                "Compare competitor screenshots/titles",
-                "Review ratings last 7 days",
-                "Verify no metadata change on your side"
-            ]
-        
-        # HIGH: top30 → >60 o caída sostenida
-        elif ((evidence.rank_prev and evidence.rank_prev <= 30 and rank > 60) or 
-              drop > 20):
-            severity = Severity.HIGH
-            cause = "Probable: Competitor optimization OR seasonal drop"
-            action = "HIGH: Analyze competitor metadata, check for seasonal patterns"
-            checks = [
-                "Check competitors in rank 1-30",
-                "Review seasonality (calendar, trends)",
-                "Verify CVR hasn't dropped"
-            ]
-        
-        # MEDIUM: caída 5-10 con volumen medio
-        elif drop >= 5 and volume > 50:
-            severity = Severity.MEDIUM
-            cause = "Probable: Normal volatility OR minor algorithm shift"
-            action = "MEDIUM: Monitor for 2-3 more days. If persists, investigate."
-            checks = [
-                "Wait 3 days and re-check",
-                "Compare with other similar keywords"
-            ]
-        
-        # LOW: ruido
-        else:
-            return None  # No reportar
+    def _detect_cannibalization(self, evidence: pd.DataFrame,
+                                clusters: Optional[List[List[str]]] = None) -> List[Dict]:
+        """
+        Detectar keywords similares que compiten entre sí - Separar Head vs Tail
         
-        return Threat(
-            keyword=evidence.keyword,
-            severity=severity,
-            rank_now=rank,
-            rank_prev=evidence.rank_prev or 0,
-            delta=-drop,
-            volume=volume,
-            cause_probable=cause,
-            action=action,
-            checks=checks
-        )
-    
-    def _detect_cannibalization(self, all_evidence: List[KeywordEvidence]) -> List[Dict]:
-        """Detectar keywords similares que compiten entre sí - Separar Head vs Tail"""
+        Args:
+            evidence: Tabla de evidencia
+            clusters: Clusters de 2+ keywords ya calculados (None = calcularlos)
+        """
         cannibalization_cases = []
         
-        # Agrupar por stems similares
+        # Agrupar keywords que comparten las mismas 2 palabras (no depende
+        # del orden de las filas); el resto va solo
+        if clusters is None:
+            clusters = self.clusterer.cluster(evidence['keyword'], min_size=2)
+        clusters = list(clusters)
+        cluster_of = {kw: cluster_id for cluster_id, group in enumerate(clusters) for kw in group}
+        
         groups = {}
-        for e in all_evidence:
-            words = set(e.keyword.lower().split())
-            # Buscar coincidencias
-            matched = False
-            for stem, group in groups.items():
-                stem_words = set(stem.split())
-                # Si comparten 2+ palabras
-                if len(words & stem_words) >= 2:
-                    group.append(e)
-                    matched = True
-                    break
-            
-            if not matched:
-                # Crear nuevo grupo
-                groups[e.keyword] = [e]
+        for e in evidence[['keyword', 'rank_now']].itertuples(index=False):
+            if e.keyword not in cluster_of:
+                cluster_of[e.keyword] = len(clusters)
+                clusters.append([e.keyword])
+            groups.setdefault(cluster_of[e.keyword], []).append(e)
         
         # Detectar casos problemáticos y separar Head vs Tail
-        for stem, group in groups.items():
-            if len(group) >= 3:  # 3+ keywords similares
-                # Ordenar por rank (mejores primero)
-                sorted_group = sorted(group, key=lambda x: x.rank_now)
+        for cluster_id, group in groups.items():
+            if len(group) >= MIN_CLUSTER_SIZE:  # 3+ keywords similares
+                # Ordenar por rank (mejores primero; empates por keyword)
+                sorted_group = sorted(group, key=lambda x: (x.rank_now, x.keyword))
                 
                 # HEAD: Top 1-3 keywords del cluster
                 head = sorted_group[:min(3, len(sorted_group))]
@@ -598,16 +676,18 @@ class ASOExpertPro:
                     status = "Head strong / Tail weak" if head_avg < 50 else "All weak"
                     
                     cannibalization_cases.append({
-                        'cluster_name': stem if len(stem) < 30 else ' '.join(stem.split()[:3]) + '...',
+                        'cluster_name': cluster_label(clusters[cluster_id]),
                         'count': len(group),
-                        'head': [{'kw': e.keyword, 'rank': e.rank_now} for e in head],
-                        'tail': [{'kw': e.keyword, 'rank': e.rank_now} for e in tail],
+                        'head': [{'kw': e.keyword, 'rank': int(e.rank_now)} for e in head],
+                        'tail': [{'kw': e.keyword, 'rank': int(e.rank_now)} for e in tail],
                         'head_avg': head_avg,
                         'tail_avg': tail_avg,
                         'status': status,
                         'recommendation': f'Keep {len(head)} head variants in metadata, prune {len(tail)} tail variants'
                     })
         
+        # Clusters más grandes primero (el informe muestra el primero)
+        cannibalization_cases.sort(key=lambda case: (-case['count'], case['cluster_name']))
         return cannibalization_cases
     
     def format_telegram_report(self, analysis: Dict) -> str:
@@ -649,12 +729,12 @@ class ASOExpertPro:
         msg += "*KEY OBSERVATIONS*\n"
         
         opportunities = analysis['opportunities']
-        all_evidence = analysis['all_evidence']
+        evidence = analysis['evidence']
         metrics = analysis['metrics']
         
         # Obs 1: Top performers
-        top10 = [e for e in all_evidence if e.rank_now <= 10]
-        msg += f"• Top 10 keywords: {len(top10)}/{len(all_evidence)}\n"
+        top10 = int((evidence['rank_now'] <= 10).sum())
+        msg += f"• Top 10 keywords: {top10}/{len(evidence)}\n"
         
         # Obs 2: Best keyword
         if opportunities:
@@ -662,8 +742,8 @@ class ASOExpertPro:
             msg += f"• Best opportunity: `{best.keyword}` #{best.evidence.rank_now} (score {best.total_score})\n"
         
         # Obs 3: Visibility
-        visible = [e for e in all_evidence if e.rank_now < 250]
-        msg += f"• Visibility: {len(visible)}/{len(all_evidence)} keywords in top 250\n\n"
+        visible = int(evidence['visible'].sum())
+        msg += f"• Visibility: {visible}/{len(evidence)} keywords in top 250\n\n"
         
         # HIGHEST ROI OPPORTUNITY (ONE) - ROI Question
         msg += "*HIGHEST ROI OPPORTUNITY (ONE)*\n"
@@ -713,10 +793,10 @@ class ASOExpertPro:
                     msg += f"Prune: {tail_count} variants\n\n"
         
         # IGNORE FOR NOW
-        cleanup = [e for e in all_evidence if e.rank_now > 150 or e.volume_proxy < 30]
-        if cleanup:
+        cleanup = evidence[(evidence['rank_now'] > 150) | (evidence['volume_proxy'] < 30)]
+        if len(cleanup) > 0:
             msg += "*IGNORE FOR NOW*\n"
-            for e in cleanup[:3]:
+            for e in cleanup.head(3).itertuples(index=False):
                 msg += f"• `{e.keyword}` (rank >{150 if e.rank_now > 150 else ''} or low volume)\n"
         
         msg += f"\n_Generated: {datetime.now().strftime('%H:%M')}_"
@@ -747,10 +827,11 @@ class ASOExpertPro:
             msg += f"• `{worst.keyword}` dropped #{worst.rank_prev} → #{worst.rank_now} ({worst.delta:+d})\n"
         
         # Top 10 changes
-        all_evidence = analysis['all_evidence']
-        top10_changes = [e for e in all_evidence if e.delta and (e.rank_now <= 10 or e.rank_prev and e.rank_prev <= 10)]
+        evidence = analysis['evidence']
+        in_top10 = (evidence['rank_now'] <= 10) | (evidence['rank_prev'] <= 10).fillna(False)
+        top10_changes = ((evidence['delta'].fillna(0) != 0) & in_top10).any()
         if top10_changes:
-            msg += f"• Top 10 keywords: {len([e for e in all_evidence if e.rank_now <= 10])}\n"
+            msg += f"• Top 10 keywords: {int((evidence['rank_now'] <= 10).sum())}\n"
         
         msg += "\n"
         
@@ -861,32 +942,29 @@ class ASOExpertPro:
         - Clear user intent aligned with app
         """
         
-        opportunities = analysis['opportunities']
-        all_evidence = analysis['all_evidence']
+        evidence = analysis['evidence']
+        ranked = self.ranked_opportunities(evidence)
         
         # Filter candidates: rank 11-20 only
-        candidates = [o for o in opportunities if 11 <= o.evidence.rank_now <= 20]
+        candidates = ranked[(ranked['rank_now'] >= 11) & (ranked['rank_now'] <= 20)]
         
-        if not candidates:
+        if candidates.empty:
             return None
         
+        top100_words = [set(kw.lower().split()) for kw in evidence.loc[evidence['rank_now'] <= 100, 'keyword']]
+        
         # Check each candidate for cluster strength
-        for candidate in candidates:
-            kw = candidate.evidence.keyword
-            
+        for candidate in candidates.itertuples(index=False):
             # Find related keywords (share 2+ words)
-            words = set(kw.lower().split())
-            related = [e for e in all_evidence 
-                      if e.rank_now <= 100 and 
-                      len(set(e.keyword.lower().split()) & words) >= 2]
+            words = set(candidate.keyword.lower().split())
+            related = sum(1 for other in top100_words if len(other & words) >= 2)
             
             # Strong cluster = >=2 related keywords in top 100
-            if len(related) >= 2:
+            if related >= 2:
                 # Check intent alignment
-                intent = candidate.evidence.intent
-                if intent != Intent.UNKNOWN.value:
+                if candidate.intent != Intent.UNKNOWN.value:
                     # This is a valid Focus
-                    return candidate
+                    return self._to_opportunity(candidate)
         
         return None
 
@@ -97,26 +97,27 @@ class AutoNotifier:
     def _check_with_smart_engine(self, df_current: pd.DataFrame, 
                                  df_previous: pd.DataFrame) -> List[Dict]:
         """Detectar alertas usando Smart Alert Engine"""
-        smart_alerts = []
+        # Primera fila de cada keyword en cada día, emparejadas con un join
+        current = df_current.drop_duplicates(subset=['keyword'], keep='first')
+        previous = df_previous.drop_duplicates(subset=['keyword'], keep='first')
         
-        for keyword in df_current['keyword'].unique():
-            current_row = df_current[df_current['keyword'] == keyword]
-            previous_row = df_previous[df_previous['keyword'] == keyword]
-            
-            if len(current_row) == 0 or len(previous_row) == 0:
-                continue
-            
-            country = current_row.iloc[0].get('country', 'US')
-            current_rank = int(current_row.iloc[0]['rank'])
-            previous_rank = int(previous_row.iloc[0]['rank'])
-            
-            # Evaluar con smart engine
-            alert = self.smart_engine.evaluate_change(
-                keyword, country, previous_rank, current_rank
-            )
-            
-            if alert:
-                smart_alerts.append(alert.to_dict())
+        pairs = pd.DataFrame({
+            'keyword': current['keyword'],
+            'country': current['country'] if 'country' in current.columns else 'US',
+            'current_rank': pd.to_numeric(current['rank'], errors='coerce')
+        }).merge(
+            pd.DataFrame({
+                'keyword': previous['keyword'],
+                'prev_rank': pd.to_numeric(previous['rank'], errors='coerce')
+            }),
+            on='keyword', how='inner', sort=False
+        )
+        
+        # Evaluar todo el snapshot con el smart engine
+        alerts = self.smart_engine.evaluate_batch(
+            pairs['keyword'], pairs['country'], pairs['prev_rank'], pairs['current_rank']
+        )
+        smart_alerts = [alert.to_dict() for alert in alerts]
         
         logger.info(f"✅ Smart engine detectó {len(smart_alerts)} alertas")
         return smart_alerts
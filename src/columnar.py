@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Codificación columnar compacta para respuestas de rankings
+Arrays paralelos, keywords/países diccionario-codificados y fechas en epoch-day
+"""
+
+import json
+import logging
+from typing import Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# orjson serializa arrays numpy directamente (opcional)
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    logger.info("ℹ️ orjson no instalado, usando json estándar para respuestas columnares")
+
+COLUMNAR_MEDIA_TYPE = "application/vnd.asorankguard.columnar+json"
+
+# Valor de rank para "no aparece" (los ranks válidos son >= 1)
+NULL_RANK = 0
+
+# Valor de day para filas sin timestamp
+NULL_DAY = -1
+
+
+def wants_columnar(fmt: Optional[str], accept: Optional[str]) -> bool:
+    """
+    Decidir si el cliente quiere la codificación columnar
+
+    Args:
+        fmt: Parámetro ?format= de la query
+        accept: Cabecera Accept
+
+    Returns:
+        True si se pidió format=columnar o el media type columnar
+    """
+    if fmt:
+        return fmt.lower() == "columnar"
+    return bool(accept) and COLUMNAR_MEDIA_TYPE in accept
+
+
+def to_epoch_days(values) -> np.ndarray:
+    """
+    Convertir timestamps (datetime64 o strings ISO) a días desde 1970-01-01
+
+    Args:
+        values: Array/lista de timestamps
+
+    Returns:
+        Array int32 de epoch-days
+    """
+    arr = np.asarray(values)
+
+    if arr.dtype.kind in ("U", "S", "O"):
+        # ISO 8601: la fecha son siempre los 10 primeros caracteres
+        arr = np.array(
+            [str(v)[:10] if v is not None else "NaT" for v in arr],
+            dtype="datetime64[D]"
+        )
+
+    days = arr.astype("datetime64[D]")
+    return np.where(np.isnat(days), NULL_DAY, days.astype(np.int64)).astype(np.int32)
+
+
+def _dictionary_encode(values):
+    """Devolver (diccionario ordenado, códigos int32)"""
+    dictionary, codes = np.unique(np.asarray(values, dtype=object).astype(str), return_inverse=True)
+    return dictionary.tolist(), codes.ravel().astype(np.int32)
+
+
+def encode_rankings(keywords, countries, ranks, timestamps,
+                    extra_columns: Optional[Dict] = None) -> Dict:
+    """
+    Construir el payload columnar de una tabla de rankings
+
+    Cada fila i está formada por columns[c][i]; keyword y country son
+    índices a dictionaries, rank usa NULL_RANK para "fuera del top" y day
+    son epoch-days (NULL_DAY si no hay timestamp).
+
+    Args:
+        keywords: Keyword por fila
+        countries: País por fila
+        ranks: Rank por fila (NaN/None = sin rank)
+        timestamps: Timestamp por fila
+        extra_columns: Columnas numéricas adicionales
+
+    Returns:
+        Dict con arrays numpy listo para serialize()
+    """
+    keyword_dict, keyword_codes = _dictionary_encode(keywords)
+    country_dict, country_codes = _dictionary_encode(countries)
+
+    rank = np.asarray(ranks, dtype=float)
+    rank = np.where(np.isnan(rank), NULL_RANK, rank).astype(np.int32)
+
+    columns = {
+        "keyword": keyword_codes,
+        "country": country_codes,
+        "rank": rank,
+        "day": to_epoch_days(timestamps),
+    }
+    columns.update(extra_columns or {})
+
+    return {
+        "format": "columnar",
+        "total": len(rank),
+        "null_rank": NULL_RANK,
+        "null_day": NULL_DAY,
+        "dictionaries": {
+            "keyword": keyword_dict,
+            "country": country_dict,
+        },
+        "columns": columns,
+    }
+
+
+def _json_safe(obj):
+    """
+    Payload listo para json.dumps: arrays numpy a listas y NaN/inf a None
+
+    orjson escribe null para los floats no finitos; json estándar escribiría
+    NaN, que no es JSON válido y rompe JSON.parse en el navegador.
+    """
+    if isinstance(obj, dict):
+        return {key: _json_safe(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_json_safe(value) for value in obj]
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.kind == "f":
+            values = obj.astype(object)
+            values[~np.isfinite(obj)] = None
+            return values.tolist()
+        if obj.dtype.kind in "biu":
+            return obj.tolist()
+        return _json_safe(obj.tolist())
+    if isinstance(obj, np.generic):
+        obj = obj.item()
+    if isinstance(obj, float) and not np.isfinite(obj):
+        return None
+    return obj
+
+
+def serialize(payload: Dict) -> bytes:
+    """
+    Serializar un payload columnar a JSON (bytes)
+
+    Con orjson los arrays numpy se escriben directamente sin pasar por
+    listas de Python. Los NaN salen como null en los dos casos.
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(_json_safe(payload), separators=(",", ":"), allow_nan=False).encode("utf-8")
@@ -5,11 +5,20 @@ Incluye filtros, comparativas, y datos de nuevas features
 """
 
 import pandas as pd
+import hashlib
 import json
 import logging
+import os
+import re
+import sys
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from kpi_store import KPIStore, kpi_file_for
+from precompress import remove_precompressed, write_precompressed
 
 logger = logging.getLogger(__name__)
 
@@ -17,72 +26,343 @@ logger = logging.getLogger(__name__)
 class InteractiveDashboard:
     """Generador de dashboard interactivo"""
     
+    # Directorio de datos, relativo al HTML
+    DATA_DIR_NAME = 'dashboard-data'
+    
+    # Rangos del selector de tiempo (además de "Hoy")
+    RANGE_DAYS = (7, 14, 30, 90)
+    
+    # Hashes de las entradas del último build (builds incrementales)
+    BUILD_STATE_FILE = 'build-state.json'
+    
     def __init__(self, config: dict):
         self.config = config
         self.ranks_file = Path(config['storage']['ranks_file'])
         self.output_file = Path('web/dashboard-interactive.html')
         self.output_file.parent.mkdir(parents=True, exist_ok=True)
+        self.data_dir = self.output_file.parent / self.DATA_DIR_NAME
+        self.last_rebuilt: List[str] = []
+        self._pending_state: Dict = {}
     
-    def generate_html(self, include_competitors: bool = True,
-                     include_discoveries: bool = True,
-                     include_costs: bool = True) -> str:
-        """
-        Generar HTML completo del dashboard
+    def _read_records(self, csv_file: Path, name: str) -> List[Dict]:
+        """Leer un CSV como lista de registros (vacía si no existe o falla)"""
+        try:
+            if csv_file.exists():
+                return json.loads(pd.read_csv(csv_file).to_json(orient='records'))
+        except Exception as e:
+            logger.warning(f"No se pudieron cargar {name}: {e}")
+        return []
+    
+    def _read_json(self, json_file: Path, name: str) -> Dict:
+        """Leer un JSON de datos (vacío si no existe o falla)"""
+        try:
+            if json_file.exists():
+                with open(json_file, 'r') as f:
+                    return json.load(f)
+        except Exception as e:
+            logger.warning(f"No se pudieron cargar {name}: {e}")
+        return {}
+    
+    @staticmethod
+    def _summarize(rows: pd.DataFrame) -> Dict:
+        """KPIs de un conjunto de filas de rankings (tarjetas y donut)"""
+        rank = rows['rank']
+        total = len(rows)
+        
+        return {
+            'total': total,
+            'keywords': int(rows['keyword'].nunique()),
+            'top_10': int((rank <= 10).sum()),
+            'visibility': round(float((rank <= 100).sum()) / total * 100, 1) if total else 0.0,
+            'avg_rank': round(float(rank.mean()), 1) if rank.notna().any() else None,
+            'distribution': [
+                int((rank <= 10).sum()),
+                int(((rank > 10) & (rank <= 50)).sum()),
+                int(((rank > 50) & (rank <= 100)).sum()),
+                int((rank > 100).sum())
+            ]
+        }
+    
+    @staticmethod
+    def _summary_from_kpis(kpis: Dict) -> Dict:
+        """Resumen del dashboard a partir de un registro de KPIs del run"""
+        return {
+            'total': kpis['checks'],
+            'keywords': kpis['keywords'],
+            'top_10': kpis['top_10'],
+            'visibility': kpis['top100_rate'],
+            'avg_rank': kpis['avg_rank'],
+            'distribution': [
+                kpis['top_10'],
+                kpis['top_50'] - kpis['top_10'],
+                kpis['top_100'] - kpis['top_50'],
+                kpis['ranked'] - kpis['top_100']
+            ]
+        }
+    
+    @staticmethod
+    def _shard_name(keyword: str) -> str:
+        """Nombre de fichero estable y seguro para la serie de una keyword"""
+        slug = re.sub(r'[^a-z0-9]+', '-', str(keyword).lower()).strip('-')[:40] or 'kw'
+        digest = hashlib.sha1(str(keyword).encode('utf-8')).hexdigest()[:8]
+        return f"series/{slug}-{digest}"
+    
+    def _input_files(self) -> Dict[str, Path]:
+        """Ficheros de entrada del dashboard, por grupo de artefactos"""
+        return {
+            'ranks': self.ranks_file,
+            'competitors': Path('data/competitors.csv'),
+            'discoveries': Path('data/keyword_discoveries.csv'),
+            'patterns': Path('data/seasonal_patterns.json'),
+            'experiments': Path('data/ab_experiments.json'),
+            'kpis': kpi_file_for(self.ranks_file),
+        }
+    
+    @staticmethod
+    def _file_hash(path: Path) -> Optional[str]:
+        """SHA-1 del contenido de un fichero (None si no existe)"""
+        if not path.exists():
+            return None
         
-        Args:
-            include_competitors: Incluir sección de competidores
-            include_discoveries: Incluir keywords descubiertas
-            include_costs: Incluir análisis de costos
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def input_hashes(self) -> Dict[str, Optional[str]]:
+        """Hash de contenido de cada entrada + del propio generador"""
+        hashes = {name: self._file_hash(path) for name, path in self._input_files().items()}
+        # Un cambio en el generador (plantilla, agregados) obliga a reconstruir todo
+        hashes['generator'] = self._file_hash(Path(__file__))
+        return hashes
+    
+    def _build_ranks_files(self) -> Tuple[Dict[str, str], Dict[str, object]]:
+        """
+        Artefactos derivados de ranks: latest + una serie por keyword
         
         Returns:
-            HTML string
+            ({keyword: nombre de la serie}, {nombre: payload})
         """
-        
-        # Leer datos CSV y JSON para embebed
-        ranks_data_json = "[]"
-        competitors_data_json = "[]"
-        discoveries_data_json = "[]"
-        patterns_data_json = "{}"
-        experiments_data_json = "{}"
+        files = {}
+        series = {}
+        latest = {'latest': [], 'previous': [], 'summaries': {}, 'last_by_keyword': []}
         
         try:
             if self.ranks_file.exists():
                 ranks_df = pd.read_csv(self.ranks_file)
-                ranks_data_json = ranks_df.to_json(orient='records')
+                ranks_df['rank'] = pd.to_numeric(ranks_df['rank'], errors='coerce')
+                
+                # Mismo criterio de "día" que usaba el dashboard: texto antes del espacio
+                day = ranks_df['date'].astype(str).str.split(' ').str[0]
+                dates = sorted(day.unique())
+                ts = pd.to_datetime(ranks_df['date'], errors='coerce')
+                
+                if dates:
+                    # KPIs calculados al guardar el run (si corresponden al último día)
+                    kpi_store = KPIStore(kpi_file_for(self.ranks_file))
+                    kpis = kpi_store.latest()
+                    if kpis is not None and kpis['run_date'] != dates[-1]:
+                        kpis = None
+                    prev_kpis = kpi_store.previous() if kpis is not None else None
+                    
+                    latest_rows = ranks_df[day == dates[-1]]
+                    latest['latest_date'] = dates[-1]
+                    latest['latest'] = json.loads(latest_rows.to_json(orient='records'))
+                    latest['summaries']['1'] = self._summary_from_kpis(kpis) if kpis \
+                        else self._summarize(latest_rows)
+                    latest['movers'] = kpis['movers'] if kpis else []
+                    
+                    if len(dates) >= 2:
+                        previous_rows = ranks_df[day == dates[-2]]
+                        latest['prev_date'] = dates[-2]
+                        latest['previous'] = json.loads(previous_rows.to_json(orient='records'))
+                        latest['previous_summary'] = self._summary_from_kpis(prev_kpis) \
+                            if prev_kpis and prev_kpis['run_date'] == dates[-2] \
+                            else self._summarize(previous_rows)
+                    
+                    # Rangos relativos al último dato (el dashboard es estático)
+                    end = ts.max()
+                    for days in self.RANGE_DAYS:
+                        since = end - timedelta(days=days)
+                        window = ranks_df[ts >= since]
+                        summary = self._summarize(window)
+                        summary['since'] = since.isoformat()
+                        summary['top_keywords'] = window.groupby('keyword')['rank'].min()\
+                            .nsmallest(5).index.tolist()
+                        latest['summaries'][str(days)] = summary
+                    
+                    order = ts.sort_values(kind='mergesort').index
+                    last = ranks_df.loc[order].drop_duplicates('keyword', keep='last')
+                    latest['last_by_keyword'] = json.loads(
+                        last[['keyword', 'rank', 'date']].to_json(orient='records')
+                    )
+                
+                # Una serie por keyword, ordenada por fecha
+                for keyword, rows in ranks_df.loc[ts.sort_values(kind='mergesort').index].groupby('keyword', sort=True):
+                    name = self._shard_name(keyword)
+                    series[str(keyword)] = name
+                    files[name] = json.loads(rows.to_json(orient='records'))
         except Exception as e:
             logger.warning(f"No se pudieron cargar ranks: {e}")
         
-        try:
-            comp_file = Path('data/competitors.csv')
-            if comp_file.exists():
-                comp_df = pd.read_csv(comp_file)
-                competitors_data_json = comp_df.to_json(orient='records')
-        except Exception as e:
-            logger.warning(f"No se pudieron cargar competitors: {e}")
+        files['latest'] = latest
+        return series, files
+    
+    def _build_group(self, group: str) -> Tuple[Optional[Dict[str, str]], Dict[str, object]]:
+        """
+        Construir los artefactos de un grupo de entrada
         
-        try:
-            disc_file = Path('data/keyword_discoveries.csv')
-            if disc_file.exists():
-                disc_df = pd.read_csv(disc_file)
-                discoveries_data_json = disc_df.to_json(orient='records')
-        except Exception as e:
-            logger.warning(f"No se pudieron cargar discoveries: {e}")
+        Returns:
+            (series si el grupo es ranks, {nombre: payload})
+        """
+        inputs = self._input_files()
+        
+        if group == 'ranks':
+            return self._build_ranks_files()
+        if group in ('competitors', 'discoveries'):
+            return None, {group: self._read_records(inputs[group], group)}
+        if group == 'patterns':
+            return None, {group: self._read_json(inputs[group], group)}
+        
+        # experiments: el dashboard los guarda en localStorage, no hay artefacto
+        # kpis: se leen al construir latest (grupo ranks)
+        return None, {}
+    
+    def _make_manifest(self, hashes: Dict[str, Optional[str]], series: Dict[str, str]) -> Dict:
+        """Manifest del shell: versión de cada grupo = hash de su entrada"""
+        return {
+            'base': f"{self.DATA_DIR_NAME}/",
+            'versions': {
+                name: (value or 'none')[:12] for name, value in hashes.items()
+            },
+            'generated_at': datetime.now().isoformat(),
+            'series': series
+        }
+    
+    def build_data_files(self) -> Tuple[Dict, Dict[str, object]]:
+        """
+        Preagregar los datos del dashboard en ficheros independientes
         
-        try:
-            patt_file = Path('data/seasonal_patterns.json')
-            if patt_file.exists():
-                with open(patt_file, 'r') as f:
-                    patterns_data_json = f.read()
-        except Exception as e:
-            logger.warning(f"No se pudieron cargar patterns: {e}")
+        - latest: filas del último día y del anterior, KPIs por rango y
+          último ranking de cada keyword (todo lo necesario para el primer
+          render, de tamaño independiente del histórico)
+        - series/<keyword>: histórico de una keyword (se carga bajo demanda)
+        - competitors, discoveries, patterns: una por sección
+        
+        Returns:
+            (manifest embebido en el HTML, {nombre: payload})
+        """
+        hashes = self.input_hashes()
+        files = {}
+        series = {}
         
+        for group in self._input_files():
+            group_series, group_files = self._build_group(group)
+            if group_series is not None:
+                series = group_series
+            files.update(group_files)
+        
+        return self._make_manifest(hashes, series), files
+    
+    def _write_files(self, files: Dict[str, object]):
+        """Escribir ficheros de datos (.js) de forma atómica, con sus .gz/.br"""
+        for name, payload in files.items():
+            content = "window.__dashboardData({}, {});\n".format(
+                json.dumps(name), json.dumps(payload, ensure_ascii=False, default=str)
+            ).encode('utf-8')
+            target = self.data_dir / f"{name}.js"
+            tmp = target.with_name(target.name + '.tmp')
+            tmp.write_bytes(content)
+            os.replace(tmp, target)
+            write_precompressed(target, content)
+    
+    def _load_build_state(self) -> Dict:
+        """Estado del último build (hashes de entrada + series)"""
         try:
-            exp_file = Path('data/ab_experiments.json')
-            if exp_file.exists():
-                with open(exp_file, 'r') as f:
-                    experiments_data_json = f.read()
-        except Exception as e:
-            logger.warning(f"No se pudieron cargar experiments: {e}")
+            with open(self.data_dir / self.BUILD_STATE_FILE, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def write_data_files(self, force: bool = False) -> Optional[Dict]:
+        """
+        Escribir en web/dashboard-data/ solo los artefactos cuyas entradas cambiaron
+        
+        Cada fichero es un .js que llama a window.__dashboardData(nombre, datos):
+        se carga con <script>, así que funciona también abriendo el HTML con
+        file:// (fetch() no puede leer ficheros locales).
+        
+        Args:
+            force: Reconstruir todo aunque no haya cambios
+        
+        Returns:
+            Manifest para generate_html(), o None si no cambió nada
+        """
+        # Hashes antes de leer: si una entrada cambia durante el build, el
+        # siguiente run la detecta como cambiada
+        hashes = self.input_hashes()
+        state = self._load_build_state()
+        previous = state.get('inputs', {})
+        
+        if force or previous.get('generator') != hashes['generator'] or not self.output_file.exists():
+            changed = list(self._input_files())
+        else:
+            changed = [name for name in self._input_files() if previous.get(name) != hashes[name]]
+            if 'kpis' in changed and 'ranks' not in changed:
+                changed.append('ranks')
+            if not changed:
+                self.last_rebuilt = []
+                logger.info("⏭️ Dashboard sin cambios en las entradas, no se regenera")
+                return None
+        
+        (self.data_dir / 'series').mkdir(parents=True, exist_ok=True)
+        series = state.get('series', {})
+        
+        for group in changed:
+            group_series, group_files = self._build_group(group)
+            self._write_files(group_files)
+            
+            if group_series is not None:
+                series = group_series
+                # Borrar series de keywords que ya no existen
+                for old in (self.data_dir / 'series').glob('*.js'):
+                    if f"series/{old.stem}" not in group_files:
+                        remove_precompressed(old)
+        
+        self.last_rebuilt = changed
+        logger.info(f"📦 Artefactos regenerados: {', '.join(changed)}")
+        
+        manifest = self._make_manifest(hashes, series)
+        self._pending_state = {'inputs': hashes, 'series': series}
+        return manifest
+    
+    def generate_html(self, include_competitors: bool = True,
+                     include_discoveries: bool = True,
+                     include_costs: bool = True,
+                     manifest: Optional[Dict] = None) -> str:
+        """
+        Generar el HTML (shell estático) del dashboard
+        
+        Los datos no van embebidos: el shell carga los ficheros de
+        write_data_files() bajo demanda, así que su tamaño y el primer
+        render no dependen de la longitud del histórico.
+        
+        Args:
+            include_competitors: Incluir sección de competidores
+            include_discoveries: Incluir keywords descubiertas
+            include_costs: Incluir análisis de costos
+            manifest: Manifest de write_data_files() (se calcula si no se pasa)
+        
+        Returns:
+            HTML string
+        """
+        
+        if manifest is None:
+            manifest = self.build_data_files()[0]
+        
+        # "</" escapado para poder embeberlo en <script>
+        manifest_json = json.dumps(manifest, ensure_ascii=False).replace('</', '<\\/')
         
         html = """<!DOCTYPE html>
 <html lang="es">
@@ -1454,37 +1734,87 @@ class InteractiveDashboard:
 
         let currentLang = 'es';
 
-        // Datos embebidos (generados al crear el dashboard)
-        const EMBEDDED_DATA = """ + ranks_data_json + """;
-        const COMPETITORS_DATA = """ + competitors_data_json + """;
-        const DISCOVERIES_DATA = """ + discoveries_data_json + """;
-        const PATTERNS_DATA = """ + patterns_data_json + """;
-        const EXPERIMENTS_DATA = """ + experiments_data_json + """;
+        // Manifest de los ficheros de datos (generados junto al dashboard)
+        const DATA_MANIFEST = """ + manifest_json + """;
 
-        let currentData = null;
-        let filteredData = null; // Datos filtrados según el rango de tiempo
+        let LATEST = null;          // Último día + KPIs precalculados por rango
+        let COMPETITORS_DATA = [];
+        let DISCOVERIES_DATA = [];
+        let PATTERNS_DATA = {};
         let currentTimeRange = 1;
         let charts = {};
+        const loadedTabs = {};
+
+        // === CARGA BAJO DEMANDA ===
+        // Cada fichero es un <script> que llama a window.__dashboardData(nombre, datos)
+        // (funciona también con file://, donde fetch() no puede leer ficheros locales)
+        const shardCache = {};
+        const shardResolvers = {};
+
+        window.__dashboardData = function(name, payload) {
+            if (shardResolvers[name]) {
+                shardResolvers[name].resolve(payload);
+                delete shardResolvers[name];
+            }
+        };
+
+        // Versión del fichero = hash de la entrada de la que sale (caché del navegador)
+        function shardVersion(name) {
+            const group = (name === 'latest' || name.startsWith('series/')) ? 'ranks' : name;
+            return (DATA_MANIFEST.versions[group] || '') + (DATA_MANIFEST.versions.generator || '').slice(0, 6);
+        }
+
+        function loadShard(name) {
+            if (!shardCache[name]) {
+                shardCache[name] = new Promise((resolve, reject) => {
+                    shardResolvers[name] = { resolve, reject };
+                    const script = document.createElement('script');
+                    script.src = DATA_MANIFEST.base + name + '.js?v=' + shardVersion(name);
+                    script.onload = () => script.remove();
+                    script.onerror = () => {
+                        delete shardCache[name];
+                        delete shardResolvers[name];
+                        script.remove();
+                        reject(new Error('No se pudo cargar ' + name));
+                    };
+                    document.head.appendChild(script);
+                });
+            }
+            return shardCache[name];
+        }
+
+        async function loadKeywordSeries(keywords) {
+            const shards = await Promise.all(keywords
+                .filter(kw => DATA_MANIFEST.series[kw])
+                .map(kw => loadShard(DATA_MANIFEST.series[kw])));
+            const series = {};
+            keywords.filter(kw => DATA_MANIFEST.series[kw]).forEach((kw, i) => {
+                series[kw] = shards[i];
+            });
+            return series;
+        }
+
+        async function loadAllHistory() {
+            const series = await loadKeywordSeries(Object.keys(DATA_MANIFEST.series));
+            return Object.values(series).flat();
+        }
 
         // Load data on page load
         document.addEventListener('DOMContentLoaded', () => {
             loadData();
         });
 
-        function loadData() {
+        async function loadData() {
             try {
-                // Usar datos embebidos directamente
-                currentData = EMBEDDED_DATA;
+                // Solo el resumen del último día: el resto se carga al abrir cada sección
+                LATEST = await loadShard('latest');
                 
-                if (!currentData || currentData.length === 0) {
+                if (!LATEST || LATEST.latest.length === 0) {
                     throw new Error('No hay datos disponibles');
                 }
                 
                 updateDashboard();
-                loadCompetitorsData();
-                loadDiscoveriesData();
                 loadCostsData();
-                loadPatternsData();
                 loadExperimentsData();
                 
                 document.getElementById('loading').style.display = 'none';
@@ -1783,15 +2113,11 @@ class InteractiveDashboard:
         function loadCostsData() {
             try {
                 const container = document.getElementById('costs-content');
-                if (container && currentData && currentData.length > 0) {
-                    // Calcular métricas básicas
+                if (container && LATEST && LATEST.last_by_keyword.length > 0) {
+                    // Último ranking de cada keyword (precalculado)
                     const latestRanks = {};
-                    currentData.forEach(row => {
-                        const keyword = row.keyword;
-                        const rank = parseInt(row.rank);
-                        if (!latestRanks[keyword] || new Date(row.date) > new Date(latestRanks[keyword].date)) {
-                            latestRanks[keyword] = { rank, keyword };
-                        }
+                    LATEST.last_by_keyword.forEach(row => {
+                        latestRanks[row.keyword] = { rank: parseInt(row.rank), keyword: row.keyword };
                     });
                     
                     const top10Count = Object.values(latestRanks).filter(r => r.rank <= 10).length;
@@ -1951,54 +2277,23 @@ class InteractiveDashboard:
         }
 
         function updateDashboard() {
-            if (!EMBEDDED_DATA || EMBEDDED_DATA.length === 0) return;
-            
-            // Extraer solo la parte de la fecha (sin timestamps)
-            const allDates = [...new Set(EMBEDDED_DATA.map(d => d.date.split(' ')[0]))].sort();
+            if (!LATEST || LATEST.latest.length === 0) return;
             
-            console.log('Total datos embebidos:', EMBEDDED_DATA.length);
-            console.log('Fechas disponibles:', allDates);
-            console.log('currentTimeRange:', currentTimeRange);
+            // KPIs precalculados al generar el dashboard
+            const summary = LATEST.summaries[String(currentTimeRange)];
+            if (!summary) return;
             
-            if (allDates.length === 0) return;
+            // HOY vs AYER (última ejecución vs anterior); el resto de rangos sin comparación
+            const prev = currentTimeRange === 1 ? LATEST.previous_summary : null;
+            const hasComparison = !!prev && prev.total > 0;
             
-            let latestRanks, prevRanks, hasComparison = false;
-            
-            if (currentTimeRange === 1) {
-                // HOY vs AYER (última ejecución vs anterior)
-                const latestDate = allDates[allDates.length - 1];
-                const prevDate = allDates.length >= 2 ? allDates[allDates.length - 2] : null;
-                
-                latestRanks = EMBEDDED_DATA.filter(d => d.date.startsWith(latestDate));
-                prevRanks = prevDate ? EMBEDDED_DATA.filter(d => d.date.startsWith(prevDate)) : [];
-                hasComparison = prevRanks.length > 0;
-                
-                // Actualizar filteredData para los gráficos
-                filteredData = latestRanks;
-                
-                console.log('HOY - latestDate:', latestDate, 'registros:', latestRanks.length);
-                console.log('AYER - prevDate:', prevDate, 'registros:', prevRanks.length);
-            } else {
-                // 7, 14, 30, 90 días: tomar todas las fechas disponibles (tenemos pocas fechas)
-                // Por ahora, usar todas las fechas disponibles para cualquier rango > 1
-                latestRanks = EMBEDDED_DATA;
-                prevRanks = [];
-                hasComparison = false;
-                
-                // Actualizar filteredData para los gráficos
-                filteredData = EMBEDDED_DATA;
-                
-                console.log('Período ' + currentTimeRange + ' días - usando todos los datos:', latestRanks.length);
-            }
+            console.log('currentTimeRange:', currentTimeRange, 'registros:', summary.total);
             
             // 1. Total Keywords (keywords ÚNICAS del período)
-            const latestKeywords = [...new Set(latestRanks.map(d => d.keyword))];
-            console.log('Keywords únicas:', latestKeywords.length);
-            document.getElementById('total-keywords').textContent = latestKeywords.length;
+            document.getElementById('total-keywords').textContent = summary.keywords;
             
             if (hasComparison) {
-                const prevKeywords = [...new Set(prevRanks.map(d => d.keyword))];
-                const keywordChange = latestKeywords.length - prevKeywords.length;
+                const keywordChange = summary.keywords - prev.keywords;
                 const changeEl = document.getElementById('keyword-change');
                 if (keywordChange > 0) {
                     changeEl.innerHTML = '<span style="color: #34C759">↑ +' + keywordChange + ' nuevas</span>';
@@ -2009,13 +2304,11 @@ class InteractiveDashboard:
                 }
             }
             
-            // 2. Top 10 count (usar SOLO última fecha)
-            const latestTop10 = latestRanks.filter(d => parseInt(d.rank) <= 10).length;
-            document.getElementById('top-10').textContent = latestTop10;
+            // 2. Top 10 count
+            document.getElementById('top-10').textContent = summary.top_10;
             
             if (hasComparison) {
-                const prevTop10 = prevRanks.filter(d => parseInt(d.rank) <= 10).length;
-                const top10Change = latestTop10 - prevTop10;
+                const top10Change = summary.top_10 - prev.top_10;
                 const changeEl = document.getElementById('top10-change');
                 if (top10Change > 0) {
                     changeEl.innerHTML = '<span style="color: #34C759">↑ +' + top10Change + ' vs anterior</span>';
@@ -2026,15 +2319,11 @@ class InteractiveDashboard:
                 }
             }
             
-            // 3. Visibility (usar SOLO última fecha)
-            const latestInTop100 = latestRanks.filter(d => parseInt(d.rank) <= 100).length;
-            const latestVisibility = (latestInTop100 / latestRanks.length * 100).toFixed(1);
-            document.getElementById('visibility').textContent = latestVisibility + '%';
+            // 3. Visibility
+            document.getElementById('visibility').textContent = summary.visibility.toFixed(1) + '%';
             
             if (hasComparison) {
-                const prevInTop100 = prevRanks.filter(d => parseInt(d.rank) <= 100).length;
-                const prevVisibility = (prevInTop100 / prevRanks.length * 100);
-                const visibilityChange = (latestVisibility - prevVisibility).toFixed(1);
+                const visibilityChange = (summary.visibility - prev.visibility).toFixed(1);
                 const changeEl = document.getElementById('visibility-change');
                 if (visibilityChange > 0) {
                     changeEl.innerHTML = '<span style="color: #34C759">↑ +' + visibilityChange + '%</span>';
@@ -2045,13 +2334,11 @@ class InteractiveDashboard:
                 }
             }
             
-            // 4. Average Ranking (usar SOLO última fecha)
-            const latestAvg = (latestRanks.reduce((sum, d) => sum + parseInt(d.rank), 0) / latestRanks.length).toFixed(1);
-            document.getElementById('avg-ranking').textContent = '#' + latestAvg;
+            // 4. Average Ranking
+            document.getElementById('avg-ranking').textContent = '#' + (summary.avg_rank !== null ? summary.avg_rank.toFixed(1) : '-');
             
-            if (hasComparison) {
-                const prevAvg = prevRanks.reduce((sum, d) => sum + parseInt(d.rank), 0) / prevRanks.length;
-                const change = prevAvg - latestAvg; // Positive = mejora (bajó ranking)
+            if (hasComparison && summary.avg_rank !== null && prev.avg_rank !== null) {
+                const change = prev.avg_rank - summary.avg_rank; // Positive = mejora (bajó ranking)
                 const changeEl = document.getElementById('avg-change');
                 if (change > 0) {
                     changeEl.innerHTML = '<span style="color: #34C759">↑ Mejora de ' + change.toFixed(1) + ' posiciones</span>';
@@ -2063,17 +2350,28 @@ class InteractiveDashboard:
             }
             
             // Create charts
-            createRankingsChart();
-            createDistributionChart();
+            createDistributionChart(summary.distribution);
             createMoversChart();
+            
+            if (currentTimeRange === 1) {
+                createRankingsChart(LATEST.latest);
+            } else {
+                // Solo las series de las 5 mejores keywords del rango
+                const range = currentTimeRange;
+                loadKeywordSeries(summary.top_keywords).then(series => {
+                    if (range !== currentTimeRange) return;
+                    const since = new Date(summary.since);
+                    const rows = Object.values(series).flat().filter(d => new Date(d.date) >= since);
+                    createRankingsChart(rows);
+                }).catch(error => console.error('Error loading series:', error));
+            }
         }
 
-        function createRankingsChart() {
+        function createRankingsChart(dataToUse) {
             const ctx = document.getElementById('rankingsChart');
             if (!ctx) return;
             
-            // Group by keyword - USAR DATOS FILTRADOS
-            const dataToUse = filteredData || currentData;
+            // Group by keyword
             const keywordData = {};
             dataToUse.forEach(row => {
                 if (!keywordData[row.keyword]) {
@@ -2173,15 +2471,12 @@ class InteractiveDashboard:
             });
         }
 
-        function createDistributionChart() {
+        function createDistributionChart(distribution) {
             const ctx = document.getElementById('distributionChart');
             if (!ctx) return;
             
-            const dataToUse = filteredData || currentData;
-            const top10 = dataToUse.filter(d => parseInt(d.rank) <= 10).length;
-            const top50 = dataToUse.filter(d => parseInt(d.rank) > 10 && parseInt(d.rank) <= 50).length;
-            const top100 = dataToUse.filter(d => parseInt(d.rank) > 50 && parseInt(d.rank) <= 100).length;
-            const other = dataToUse.filter(d => parseInt(d.rank) > 100).length;
+            // [Top 10, 11-50, 51-100, >100] precalculado por rango
+            const [top10, top50, top100, other] = distribution;
             
             if (charts.distribution) charts.distribution.destroy();
             
@@ -2214,14 +2509,11 @@ class InteractiveDashboard:
             const ctx = document.getElementById('moversChart');
             if (!ctx) return;
             
-            // Calculate changes (simplified)
-            const changes = [
-                { keyword: 'bible sleep', change: 5 },
-                { keyword: 'audio bible', change: -3 },
-                { keyword: 'bedtime stories', change: 8 },
-                { keyword: 'bible chat', change: -2 },
-                { keyword: 'kids bible', change: 4 }
-            ];
+            // Top movers del último run (calculados al guardar los resultados)
+            const changes = (LATEST.movers || []).map(m => ({
+                keyword: m.keyword + ' (' + m.country + ')',
+                change: m.change
+            }));
             
             if (charts.movers) charts.movers.destroy();
             
@@ -2279,6 +2571,20 @@ class InteractiveDashboard:
             document.getElementById(`tab-${tabName}`).classList.add('active');
             event.target.classList.add('active');
             
+            // Datos de cada sección: se cargan la primera vez que se abre
+            const tabLoaders = {
+                competitors: () => loadShard('competitors').then(d => { COMPETITORS_DATA = d; loadCompetitorsData(); }),
+                discoveries: () => loadShard('discoveries').then(d => { DISCOVERIES_DATA = d; loadDiscoveriesData(); }),
+                patterns: () => loadShard('patterns').then(d => { PATTERNS_DATA = d; loadPatternsData(); })
+            };
+            if (tabLoaders[tabName] && !loadedTabs[tabName]) {
+                loadedTabs[tabName] = true;
+                tabLoaders[tabName]().then(() => lucide.createIcons()).catch(error => {
+                    loadedTabs[tabName] = false;
+                    console.error('Error loading ' + tabName + ':', error);
+                });
+            }
+            
             // Si es la pestaña de alertas, cargar valores guardados
             if (tabName === 'alerts') {
                 const savedToken = localStorage.getItem('telegram_token');
@@ -2315,14 +2621,13 @@ class InteractiveDashboard:
                 return;
             }
             
-            // Buscar en los datos filtrados actuales
-            const dataToSearch = filteredData || currentData;
-            const matches = dataToSearch.filter(d => 
+            // Buscar en el último ranking de cada keyword
+            const matches = LATEST.last_by_keyword.filter(d => 
                 d.keyword.toLowerCase().includes(query)
             );
             
             if (matches.length > 0) {
-                // Mostrar la primera coincidencia (la más reciente)
+                // Mostrar la primera coincidencia
                 const match = matches[0];
                 document.getElementById('search-keyword').textContent = match.keyword;
                 document.getElementById('search-rank').textContent = '#' + match.rank;
@@ -2334,9 +2639,10 @@ class InteractiveDashboard:
             }
         }
 
-        function exportData(format) {
+        async function exportData(format) {
             if (format === 'csv') {
-                // Export to CSV
+                // Export to CSV (histórico completo: carga todas las series)
+                const currentData = await loadAllHistory();
                 const csv = currentData.map(row => Object.values(row).join(',')).join('\\n');
                 const blob = new Blob([csv], { type: 'text/csv' });
                 const url = URL.createObjectURL(blob);
@@ -2392,7 +2698,7 @@ class InteractiveDashboard:
             alert('✅ Experimento creado! El análisis se hará automáticamente 7 días después de la fecha de inicio.');
         }
         
-        function analyzeExperiment(experimentId) {
+        async function analyzeExperiment(experimentId) {
             const experiments = JSON.parse(localStorage.getItem('experiments') || '[]');
             const exp = experiments.find(e => e.id === experimentId);
             if (!exp) return;
@@ -2413,12 +2719,13 @@ class InteractiveDashboard:
             afterEnd.setDate(afterEnd.getDate() + 7);
             
             // Filtrar datos
-            const beforeData = EMBEDDED_DATA.filter(d => {
+            const history = await loadAllHistory();
+            const beforeData = history.filter(d => {
                 const date = new Date(d.date);
                 return date >= beforeStart && date < startDate;
             });
             
-            const afterData = EMBEDDED_DATA.filter(d => {
+            const afterData = history.filter(d => {
                 const date = new Date(d.date);
                 return date >= startDate && date <= afterEnd;
             });
@@ -2488,7 +2795,7 @@ Keywords Top 10:
         
         function loadKeywordsList() {
             // Obtener keywords únicas de los datos actuales
-            const keywords = [...new Set(EMBEDDED_DATA.map(d => d.keyword))].sort();
+            const keywords = Object.keys(DATA_MANIFEST.series).sort();
             
             // Cargar keywords añadidas localmente
             const localKeywords = JSON.parse(localStorage.getItem('local_keywords') || '[]');
@@ -2538,7 +2845,7 @@ Keywords Top 10:
             }
             
             // Verificar si ya existe
-            const allKeywords = [...new Set(EMBEDDED_DATA.map(d => d.keyword))];
+            const allKeywords = Object.keys(DATA_MANIFEST.series);
             const localKeywords = JSON.parse(localStorage.getItem('local_keywords') || '[]');
             
             if (allKeywords.includes(keyword) || localKeywords.includes(keyword)) {
@@ -2611,7 +2918,7 @@ Keywords Top 10:
         
         function downloadKeywordsConfig() {
             // Obtener todas las keywords
-            const keywords = [...new Set(EMBEDDED_DATA.map(d => d.keyword))];
+            const keywords = Object.keys(DATA_MANIFEST.series);
             const localKeywords = JSON.parse(localStorage.getItem('local_keywords') || '[]');
             const allKeywords = [...new Set([...keywords, ...localKeywords])].sort();
             
@@ -2741,12 +3048,31 @@ ${allKeywords.map(kw => `  - "${kw}"`).join('\\n')}
         
         return html
     
-    def save_dashboard(self):
-        """Guardar dashboard a archivo HTML"""
+    def save_dashboard(self, force: bool = False):
+        """
+        Guardar dashboard: ficheros de datos + shell HTML
+        
+        Incremental: solo se regeneran los artefactos cuyas entradas
+        cambiaron desde el último build, y nada si no cambió ninguna.
+        
+        Args:
+            force: Reconstruir todo aunque no haya cambios
+        """
         try:
-            html = self.generate_html()
-            with open(self.output_file, 'w') as f:
-                f.write(html)
+            manifest = self.write_data_files(force=force)
+            if manifest is None:
+                return str(self.output_file)
+            
+            html = self.generate_html(manifest=manifest).encode('utf-8')
+            tmp = self.output_file.with_name(self.output_file.name + '.tmp')
+            tmp.write_bytes(html)
+            os.replace(tmp, self.output_file)
+            write_precompressed(self.output_file, html)
+            
+            # El estado se guarda al final: si algo falla, el siguiente run reconstruye
+            state_file = self.data_dir / self.BUILD_STATE_FILE
+            with open(state_file, 'w') as f:
+                json.dump(self._pending_state, f, ensure_ascii=False)
             logger.info(f"✅ Dashboard generado: {self.output_file}")
             return str(self.output_file)
         except Exception as e:
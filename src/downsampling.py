@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Downsampling de series de rankings para gráficas
+Min/max bucketing vectorizado: conserva picos, valles y extremos de cada serie
+"""
+
+import numpy as np
+
+
+def downsample_indices(series, order, values, max_points: int) -> np.ndarray:
+    """
+    Elegir qué filas conservar para que cada serie tenga como mucho max_points
+
+    Cada serie (p.ej. keyword+país) se parte en (max_points - 2) // 2 buckets
+    consecutivos; de cada bucket se conserva el mínimo y el máximo, y de
+    cada serie el primer y último punto. Todo se calcula a la vez para
+    todas las series con operaciones numpy (sin bucles por serie).
+
+    Con max_points < 4 no caben min+max+extremos: se conservan el primer y
+    último punto y, si max_points es 3, el mínimo (mejor rank) de la serie.
+
+    Los NaN (keyword fuera del top) se tratan como el peor valor posible,
+    así los huecos de visibilidad siguen apareciendo en la gráfica.
+
+    Args:
+        series: Identificador de serie por fila
+        order: Clave de orden temporal por fila (timestamps, epoch, posición)
+        values: Valor a preservar (rank) por fila
+        max_points: Máximo de puntos por serie (>= 2)
+
+    Returns:
+        Posiciones (en el orden original) de las filas a conservar
+    """
+    n = len(values)
+    if n == 0:
+        return np.arange(0)
+
+    max_points = max(int(max_points), 2)
+
+    _, codes = np.unique(np.asarray(series), return_inverse=True)
+    codes = codes.ravel()
+    sort_idx = np.lexsort((np.asarray(order), codes))
+    codes = codes[sort_idx]
+
+    # Inicio, longitud y posición dentro de cada serie
+    starts = np.r_[0, np.flatnonzero(np.diff(codes)) + 1]
+    lengths = np.diff(np.r_[starts, n])
+    length = np.repeat(lengths, lengths)
+    pos = np.arange(n) - np.repeat(starts, lengths)
+
+    # Series cortas: se conservan enteras
+    short = length <= max_points
+    if short.all():
+        return np.arange(n)
+
+    y = np.asarray(values, dtype=float)[sort_idx]
+    y = np.where(np.isnan(y), np.inf, y)
+
+    if max_points < 4:
+        keep = short.copy()
+        keep[starts] = True
+        keep[starts + lengths - 1] = True
+        if max_points == 3:
+            # Mínimo de cada serie: primero por (serie, valor)
+            keep[np.lexsort((y, codes))[starts]] = True
+        return np.sort(sort_idx[keep])
+
+    # min+max por bucket más los dos extremos de la serie
+    n_buckets = (max_points - 2) // 2
+    bucket = np.where(short, pos, pos * n_buckets // length)
+    group = codes.astype(np.int64) * (max_points + 1) + bucket
+
+    # Orden por (grupo, valor): el primero de cada grupo es el mínimo
+    # y el último el máximo
+    by_value = np.lexsort((y, group))
+    grouped = group[by_value]
+    boundaries = np.flatnonzero(np.diff(grouped)) + 1
+    firsts = by_value[np.r_[0, boundaries]]
+    lasts = by_value[np.r_[boundaries - 1, n - 1]]
+
+    keep = np.zeros(n, dtype=bool)
+    keep[firsts] = True
+    keep[lasts] = True
+    keep[starts] = True
+    keep[starts + lengths - 1] = True
+
+    return np.sort(sort_idx[keep])
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Utilidades de exportación del histórico de rankings
+Cursores opacos para paginación keyset y formateo NDJSON/CSV en streaming
+"""
+
+import base64
+import csv
+import io
+import json
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# Formatos de exportación en streaming y su media type
+STREAM_MEDIA_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+# Límite por página en modo paginado
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+
+
+def encode_cursor(*parts) -> str:
+    """
+    Codificar la clave keyset de la última fila como cursor opaco
+
+    Args:
+        *parts: Valores de la clave de orden (p.ej. tracked_at, keyword_id)
+
+    Returns:
+        Cursor base64 url-safe
+    """
+    raw = json.dumps(list(parts), separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: Optional[str], n_parts: int) -> Optional[List]:
+    """
+    Decodificar un cursor generado por encode_cursor()
+
+    Args:
+        cursor: Cursor recibido (None = primera página)
+        n_parts: Número de componentes esperados
+
+    Returns:
+        Lista de componentes o None
+
+    Raises:
+        ValueError: Si el cursor no es válido
+    """
+    if not cursor:
+        return None
+
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        parts = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+    if not isinstance(parts, list) or len(parts) != n_parts:
+        raise ValueError("Invalid cursor")
+
+    return parts
+
+
+def iter_ndjson(rows: Iterable[Dict]) -> Iterator[str]:
+    """Una línea JSON por fila"""
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False, default=str) + '\n'
+
+
+def iter_csv(rows: Iterable[Dict], fields: List[str], header: bool = True) -> Iterator[str]:
+    """
+    Filas CSV (con cabecera opcional) para un iterable de dicts
+
+    Args:
+        rows: Filas a escribir
+        fields: Columnas, en orden
+        header: Si se emite la cabecera antes de la primera fila
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore')
+
+    if header:
+        writer.writeheader()
+
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Validadores HTTP (ETag / Last-Modified) para las APIs de ASO Rank Guard
+Permite contestar 304 Not Modified a los polls del dashboard sin cargar datos
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Mapping, Optional
+
+
+# Sufijo del ETag por Content-Encoding (ver encoding_etag())
+ENCODING_SUFFIXES = {'gzip': '-gz', 'br': '-br'}
+
+
+def window_start(granularity: Optional[str] = None) -> Optional[datetime]:
+    """
+    Inicio del bucket temporal actual para endpoints con ventana relativa
+
+    Las ventanas "últimos N días/horas" se desplazan aunque no cambien los
+    datos; el bucket forma parte de la clave de caché y del ETag.
+
+    Args:
+        granularity: 'day', 'hour' o None (sin ventana)
+
+    Returns:
+        Inicio del día/hora actual (hora local) o None
+    """
+    if granularity is None:
+        return None
+
+    now = datetime.now()
+    if granularity == 'hour':
+        return now.replace(minute=0, second=0, microsecond=0)
+    return now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def build_validators(data_version, last_modified: Optional[datetime],
+                     *parts) -> Dict[str, str]:
+    """
+    Construir cabeceras ETag / Last-Modified para una respuesta
+
+    La respuesta es función determinista de (versión de datos, endpoint,
+    parámetros), así que el ETag es fuerte. Si se sirve comprimida, cada
+    codificación lleva su propio ETag (encoding_etag()).
+
+    Args:
+        data_version: Versión de los datos (mtime/size, completed_at...)
+        last_modified: Momento del último cambio de los datos
+        *parts: Endpoint, parámetros y bucket de ventana
+
+    Returns:
+        Dict de cabeceras HTTP
+    """
+    digest = hashlib.sha1(repr((data_version,) + parts).encode('utf-8')).hexdigest()
+
+    headers = {
+        'ETag': f'"{digest[:24]}"',
+        # Cachear pero revalidar siempre (el 304 es prácticamente gratis)
+        'Cache-Control': 'no-cache',
+    }
+
+    if last_modified is not None:
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.astimezone()
+        headers['Last-Modified'] = format_datetime(
+            last_modified.astimezone(timezone.utc), usegmt=True
+        )
+
+    return headers
+
+
+def encoding_etag(etag: str, encoding: Optional[str]) -> str:
+    """
+    ETag de la variante de una respuesta en una codificación
+
+    Cada codificación (identity, gzip, br) son bytes distintos: con un ETag
+    fuerte común una caché podría revalidar una variante y recibir otra.
+
+    Args:
+        etag: ETag de la respuesta (build_validators())
+        encoding: 'gzip', 'br' o None (sin comprimir)
+
+    Returns:
+        ETag con sufijo de codificación dentro de las comillas ("...-gz")
+    """
+    suffix = ENCODING_SUFFIXES.get(encoding)
+    return f'{etag[:-1]}{suffix}"' if suffix else etag
+
+
+def is_not_modified(request_headers: Mapping[str, str],
+                    validators: Dict[str, str]) -> bool:
+    """
+    Evaluar If-None-Match / If-Modified-Since contra los validadores
+
+    Si viene If-None-Match se ignora If-Modified-Since (RFC 9110 §13.1.3).
+
+    Args:
+        request_headers: Cabeceras de la petición
+        validators: Resultado de build_validators()
+
+    Returns:
+        True si se puede contestar 304
+    """
+    if_none_match = request_headers.get('if-none-match')
+
+    if if_none_match is not None:
+        if if_none_match.strip() == '*':
+            return True
+
+        etag = validators['ETag']
+        tags = {tag.strip() for tag in if_none_match.split(',')}
+        return etag in tags or f'W/{etag}' in tags
+
+    if_modified_since = request_headers.get('if-modified-since')
+    last_modified = validators.get('Last-Modified')
+
+    if if_modified_since and last_modified:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+
+    return False
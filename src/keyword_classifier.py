@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Clasificación de keywords compartida (intención, marca, sensibilidad, relevancia, volumen)
+Todos los vocabularios en un único autómata Aho-Corasick + memo persistente por keyword
+"""
+
+import hashlib
+import json
+import logging
+import os
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE_NAME = "keyword_classes.json"
+
+# Volumen proxy basado en tipo de keyword (sin API)
+VOLUME_PATTERNS = {
+    'brand': 500,        # "biblenow"
+    'generic_2w': 300,   # "bible chat"
+    'generic_3w': 150,   # "audio bible stories"
+    'long_tail': 50,     # "kids calming audio bible"
+    'very_long': 20      # >5 palabras
+}
+
+UNKNOWN_INTENT = "unknown"
+
+# Vocabularios por analizador. intents va en orden de prioridad (gana la
+# primera intención con algún término); todos los términos son subcadenas
+# de la keyword en minúsculas.
+PROFILES = {
+    # ASOExpertPro: intenciones más específicas (más patrones) primero
+    'pro': {
+        'intents': [
+            ("audio", ['audio', 'listen', 'podcast', 'sound', 'voice', 'hear']),
+            ("kids_family", ['kids', 'children', 'family', 'child', 'toddler', 'baby']),
+            ("chat_ai", ['chat', 'ai', 'ask', 'talk', 'conversation', 'gpt']),
+            ("sleep_relax", ['sleep', 'calm', 'relax', 'peaceful', 'soothing', 'meditation']),
+            ("informational", ['stories', 'story', 'tales', 'meaning', 'what']),
+            ("habit_routine", ['daily', 'bedtime', 'morning', 'routine', 'plan']),
+            ("learning", ['learn', 'study', 'education', 'course', 'lesson']),
+            ("free", ['free', 'gratis', 'no cost', 'without paying']),
+        ],
+        # Keywords sensibles (religión, niños, salud)
+        'sensitive': ['bible', 'god', 'jesus', 'church', 'prayer', 'kids', 'children', 'baby'],
+        # Core features de la app (ajustar según tu producto)
+        'relevance': {
+            'base': 40,
+            'weights': {
+                'audio': 25, 'bible': 20, 'stories': 20, 'chat': 15, 'sleep': 12,
+                'kids': 10, 'bedtime': 10, 'daily': 8, 'free': 5, 'calming': 8, 'peaceful': 6,
+            },
+            'unknown_penalty': 10,
+        },
+        # 3-4 palabras: long tail con +50% por término popular (máx. 200)
+        'volume': {
+            'rule': 'long_tail_boost',
+            'popular': ['bible', 'audio', 'chat', 'stories', 'sleep'],
+        },
+    },
+    # ASOExpert y ReportFormatter
+    'basic': {
+        'intents': [
+            ("informational", ['stories', 'story', 'tales', 'meaning', 'what is']),
+            ("habit_routine", ['daily', 'bedtime', 'morning', 'routine', 'plan']),
+            ("audio", ['audio', 'listen', 'podcast', 'sound', 'voice']),
+            ("kids_family", ['kids', 'children', 'family', 'child', 'toddler']),
+            ("chat_ai", ['chat', 'ai', 'ask', 'talk', 'conversation']),
+            ("learning", ['learn', 'study', 'education', 'course', 'lesson']),
+            ("sleep_relax", ['sleep', 'calm', 'relax', 'peaceful', 'soothing']),
+            ("free", ['free', 'gratis', 'no cost']),
+        ],
+        'sensitive': [],
+        'relevance': {
+            'base': 50,
+            'weights': {
+                'audio': 30, 'bible': 20, 'stories': 20, 'chat': 15, 'sleep': 10,
+                'kids': 10, 'bedtime': 10, 'daily': 5, 'free': 5,
+            },
+            'unknown_penalty': 0,
+        },
+        # 1-2 palabras: genérica, o 3w si contiene un término popular
+        'volume': {
+            'rule': 'generic_boost',
+            'popular': ['bible', 'audio', 'chat', 'stories', 'sleep', 'kids'],
+        },
+    },
+}
+
+
+def classifier_cache_for(ranks_file: Path) -> Path:
+    """Fichero de la caché de clasificaciones junto al histórico de rankings"""
+    return Path(ranks_file).parent / CACHE_FILE_NAME
+
+
+def normalize_keyword(keyword: str) -> str:
+    """Forma normalizada de una keyword (minúsculas, espacios simples)"""
+    return ' '.join(str(keyword).lower().split())
+
+
+class TermMatcher:
+    """
+    Autómata Aho-Corasick sobre un conjunto de términos
+
+    Encuentra todos los términos contenidos en un texto en una sola pasada
+    por sus caracteres, sea cual sea el número de términos.
+    """
+
+    def __init__(self, terms: Iterable[str]):
+        self.terms = list(dict.fromkeys(terms))
+
+        goto: List[Dict[str, int]] = [{}]
+        output: List[List[int]] = [[]]
+
+        # Trie de todos los términos
+        for index, term in enumerate(self.terms):
+            node = 0
+            for char in term:
+                child = goto[node].get(char)
+                if child is None:
+                    child = len(goto)
+                    goto.append({})
+                    output.append([])
+                    goto[node][char] = child
+                node = child
+            output[node].append(index)
+
+        # Enlaces de fallo por anchura (el sufijo propio más largo que es prefijo)
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                queue.append(child)
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                target = goto[state].get(char, 0)
+                fail[child] = target if target != child else 0
+                output[child] = output[child] + output[fail[child]]
+
+        self._goto = goto
+        self._fail = fail
+        self._output = output
+
+    def find(self, text: str) -> set:
+        """Índices (en self.terms) de los términos que aparecen en el texto"""
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        found = set()
+
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                found.update(output[node])
+
+        return found
+
+
+class KeywordClassifier:
+    """
+    Clasificador de keywords de un perfil de vocabularios (ver PROFILES)
+
+    Intenciones, términos sensibles, pesos de relevancia, términos populares
+    y palabras de marca se compilan en un único TermMatcher: cada keyword se
+    recorre una vez. El resultado se memoriza por keyword normalizada en una
+    caché en disco, invalidada si cambian los vocabularios o la marca, así que
+    cada keyword se clasifica una sola vez.
+    """
+
+    def __init__(self, profile: str = 'pro', brand_words: Iterable[str] = (),
+                 tracked_keywords: Iterable[str] = (), cache_file: Optional[Path] = None):
+        """
+        Args:
+            profile: Nombre del perfil en PROFILES
+            brand_words: Palabras del nombre de la app
+            tracked_keywords: Keywords configuradas (las de marca cuentan como 'brand')
+            cache_file: Caché persistente (None = solo en memoria)
+        """
+        self.profile = profile
+        self.vocabulary = PROFILES[profile]
+        self.brand_words = [w for w in dict.fromkeys(w.lower() for w in brand_words) if w]
+        self.tracked_keywords = set(tracked_keywords)
+        self.cache_file = Path(cache_file) if cache_file else None
+
+        # Un solo autómata para todos los vocabularios: término -> etiquetas
+        labels: Dict[str, List[tuple]] = {}
+        for priority, (intent, terms) in enumerate(self.vocabulary['intents']):
+            for term in terms:
+                labels.setdefault(term, []).append(('intent', priority))
+        for term in self.vocabulary['sensitive']:
+            labels.setdefault(term, []).append(('sensitive', None))
+        for term, points in self.vocabulary['relevance']['weights'].items():
+            labels.setdefault(term, []).append(('weight', points))
+        for term in self.vocabulary['volume']['popular']:
+            labels.setdefault(term, []).append(('popular', None))
+        for term in self.brand_words:
+            labels.setdefault(term, []).append(('brand', None))
+
+        self._matcher = TermMatcher(labels)
+        self._labels = [labels[term] for term in self._matcher.terms]
+
+        # Caché de clasificación: depende de vocabularios y marca (la marca de
+        # cada keyword se decide al leerla, con tracked_keywords)
+        self._memo_fingerprint = hashlib.sha1(
+            json.dumps([self.vocabulary, self.brand_words], sort_keys=True).encode()
+        ).hexdigest()[:16]
+        # Resultado de classify(): además cambia con las keywords configuradas
+        # (brand y volumen); lo usan las cachés de análisis
+        self.fingerprint = hashlib.sha1(
+            json.dumps([self._memo_fingerprint, sorted(self.tracked_keywords)]).encode()
+        ).hexdigest()[:16]
+        self._memo: Dict[str, Dict] = self._load_cache()
+        # Keywords clasificadas aún no guardadas en disco
+        self._pending = 0
+
+    @classmethod
+    def from_config(cls, config: dict, profile: str = 'pro') -> 'KeywordClassifier':
+        """Clasificador con la marca y keywords de config.yaml (caché junto a los rankings)"""
+        config = config or {}
+        ranks_file = config.get('storage', {}).get('ranks_file')
+        return cls(
+            profile=profile,
+            brand_words=config.get('app', {}).get('name', '').split(),
+            tracked_keywords=config.get('keywords') or [],
+            cache_file=classifier_cache_for(ranks_file) if ranks_file else None
+        )
+
+    # === CACHÉ ===
+
+    def _load_cache(self) -> Dict[str, Dict]:
+        if self.cache_file is None or not self.cache_file.exists():
+            return {}
+
+        try:
+            with open(self.cache_file, 'r') as f:
+                entry = json.load(f).get(self.profile, {})
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️  Caché de clasificación ilegible, se ignora: {e}")
+            return {}
+
+        # Vocabularios o marca cambiados: reclasificar todo
+        if entry.get('fingerprint') != self._memo_fingerprint:
+            return {}
+        return entry.get('keywords', {})
+
+    def _save_cache(self):
+        if self.cache_file is None:
+            return
+
+        # Conservar los demás perfiles del fichero
+        try:
+            with open(self.cache_file, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+
+        data[self.profile] = {'fingerprint': self._memo_fingerprint, 'keywords': self._memo}
+
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.cache_file.with_name(self.cache_file.name + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, self.cache_file)
+
+    # === CLASIFICACIÓN ===
+
+    def _scan(self, text: str) -> Dict:
+        """Clasificar una keyword normalizada (una pasada del autómata)"""
+        intent_priority = None
+        sensitive = False
+        brand = False
+        popular = 0
+        relevance = self.vocabulary['relevance']['base']
+
+        for term_index in self._matcher.find(text):
+            for kind, value in self._labels[term_index]:
+                if kind == 'intent':
+                    if intent_priority is None or value < intent_priority:
+                        intent_priority = value
+                elif kind == 'weight':
+                    relevance += value
+                elif kind == 'popular':
+                    popular += 1
+                elif kind == 'sensitive':
+                    sensitive = True
+                elif kind == 'brand':
+                    brand = True
+
+        if intent_priority is None:
+            intent = UNKNOWN_INTENT
+            relevance -= self.vocabulary['relevance']['unknown_penalty']
+        else:
+            intent = self.vocabulary['intents'][intent_priority][0]
+
+        return {
+            'intent': intent,
+            'relevance': max(0, min(relevance, 100)),
+            'sensitive': sensitive,
+            'brand_term': brand,
+            'words': len(text.split()),
+            'popular': popular,
+        }
+
+    def _volume(self, record: Dict, brand: bool) -> int:
+        """Volumen proxy según nº de palabras, términos populares y marca"""
+        if brand:
+            return VOLUME_PATTERNS['brand']
+
+        words = record['words']
+        if words >= 5:
+            return VOLUME_PATTERNS['very_long']
+
+        if self.vocabulary['volume']['rule'] == 'long_tail_boost':
+            if words >= 3:
+                return int(min(VOLUME_PATTERNS['long_tail'] * (1 + record['popular'] * 0.5), 200))
+            return VOLUME_PATTERNS['generic_2w'] if words == 2 else VOLUME_PATTERNS['generic_3w']
+
+        if words >= 3:
+            return VOLUME_PATTERNS['long_tail']
+        return VOLUME_PATTERNS['generic_3w'] if record['popular'] else VOLUME_PATTERNS['generic_2w']
+
+    def _records(self, keywords: List[str], persist: bool = True) -> List[Dict]:
+        """
+        Registros memorizados de las keywords (clasifica las nuevas)
+
+        Args:
+            keywords: Keywords originales
+            persist: Guardar la caché si hay keywords nuevas (sin guardar
+                     quedan pendientes para la siguiente llamada que guarde)
+        """
+        normalized = [normalize_keyword(kw) for kw in keywords]
+
+        missing = [text for text in dict.fromkeys(normalized) if text not in self._memo]
+        for text in missing:
+            self._memo[text] = self._scan(text)
+        if missing:
+            self._pending += len(missing)
+            logger.debug(f"🏷️ {len(missing)} keywords clasificadas ({self.profile})")
+
+        if persist and self._pending:
+            self._save_cache()
+            self._pending = 0
+
+        return [self._memo[text] for text in normalized]
+
+    def classify(self, keyword: str) -> Dict:
+        """
+        Clasificar una keyword (solo en memoria; classify_many() persiste)
+
+        Returns:
+            {'intent', 'relevance', 'sensitive', 'brand', 'volume'}
+        """
+        return self._classified([keyword], persist=False)[0]
+
+    def classify_many(self, keywords: Iterable[str]) -> List[Dict]:
+        """Clasificar una lista de keywords (mismo orden; una sola escritura de caché)"""
+        return self._classified(list(keywords), persist=True)
+
+    def _classified(self, keywords: List[str], persist: bool) -> List[Dict]:
+        results = []
+
+        for keyword, record in zip(keywords, self._records(keywords, persist)):
+            # Marca: keyword configurada que contiene una palabra del nombre de la app
+            brand = record['brand_term'] and keyword in self.tracked_keywords
+            results.append({
+                'intent': record['intent'],
+                'relevance': record['relevance'],
+                'sensitive': record['sensitive'],
+                'brand': brand,
+                'volume': self._volume(record, brand),
+            })
+
+        return results
+
+    def classify_frame(self, keywords: Iterable[str]) -> pd.DataFrame:
+        """classify_many() como DataFrame (una fila por keyword, en orden)"""
+        return pd.DataFrame(
+            self.classify_many(keywords),
+            columns=['intent', 'relevance', 'sensitive', 'brand', 'volume']
+        )
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Clustering de keywords por palabras compartidas (canibalización)
+Índice invertido por combinación de palabras: grupos deterministas sin comparar cada keyword con cada grupo
+"""
+
+import heapq
+import logging
+from itertools import combinations
+from typing import Dict, Iterable, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Palabras en común para que dos keywords sean variantes de la misma
+MIN_SHARED_WORDS = 2
+
+# Tamaño mínimo de un cluster reportable
+MIN_CLUSTER_SIZE = 3
+
+
+def tokenize(keyword: str) -> frozenset:
+    """Palabras de una keyword (minúsculas, sin repetir)"""
+    return frozenset(str(keyword).lower().split())
+
+
+class KeywordClusterer:
+    """
+    Agrupa keywords que comparten las mismas min_shared palabras
+
+    Cada keyword se indexa por sus combinaciones de min_shared palabras
+    (índice invertido: combinación -> keywords). Un cluster es una entrada
+    del índice: todas sus keywords comparten esas palabras entre sí, así que
+    no hay cadenas (A~B~C) que junten un nicho entero en un solo grupo.
+
+    Cada keyword va a un solo cluster: se toma primero la combinación con
+    más keywords sin asignar (empates por orden alfabético), como una
+    cobertura voraz. Coste lineal en nº de keywords x combinaciones por
+    keyword (más el heap); no se comparan parejas.
+    """
+
+    def __init__(self, min_shared: int = MIN_SHARED_WORDS):
+        """
+        Args:
+            min_shared: Palabras en común que definen un cluster
+        """
+        self.min_shared = min_shared
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'KeywordClusterer':
+        """Crear el clusterer con la sección cannibalization de config.yaml (opcional)"""
+        cluster_config = (config or {}).get('cannibalization', {})
+        return cls(min_shared=cluster_config.get('min_shared_words', MIN_SHARED_WORDS))
+
+    def cluster(self, keywords: Iterable[str], min_size: int = 1) -> List[List[str]]:
+        """
+        Agrupar keywords
+
+        Args:
+            keywords: Keywords (se deduplican; el orden de entrada no importa)
+            min_size: Tamaño mínimo de los clusters devueltos
+
+        Returns:
+            Clusters como listas ordenadas de keywords, ordenados por su
+            primera keyword
+        """
+        unique = sorted(set(keywords))
+        tokens = [tokenize(kw) for kw in unique]
+
+        clusters = [[unique[i] for i in group] for group in self._group(tokens)]
+        clusters = [group for group in clusters if len(group) >= min_size]
+        logger.debug(f"🧩 {len(unique)} keywords → {len(clusters)} clusters")
+        return clusters
+
+    def _group(self, tokens: Sequence[frozenset]) -> List[List[int]]:
+        """Índices agrupados por combinación compartida (el resto, solos)"""
+        postings: Dict[tuple, List[int]] = {}
+        for index, words in enumerate(tokens):
+            for key in combinations(sorted(words), self.min_shared):
+                postings.setdefault(key, []).append(index)
+
+        # Heap perezoso: al sacar una entrada se recuentan sus keywords libres
+        heap = [(-len(members), key) for key, members in postings.items() if len(members) > 1]
+        heapq.heapify(heap)
+
+        assigned = [False] * len(tokens)
+        groups = []
+        while heap:
+            size, key = heapq.heappop(heap)
+            members = [i for i in postings[key] if not assigned[i]]
+            if len(members) < 2:
+                continue
+            if len(members) < -size:
+                postings[key] = members
+                heapq.heappush(heap, (-len(members), key))
+                continue
+
+            for i in members:
+                assigned[i] = True
+            groups.append(members)
+
+        groups.extend([i] for i, done in enumerate(assigned) if not done)
+        return sorted(groups)
+
+
+def cluster_label(keywords: Sequence[str], max_length: int = 30) -> str:
+    """Nombre de un cluster: su keyword más corta (en palabras), recortada si es larga"""
+    label = min(keywords, key=lambda kw: (len(kw.split()), kw))
+    return label if len(label) < max_length else ' '.join(label.split()[:3]) + '...'
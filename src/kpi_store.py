@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+KPIs precalculados por run (ingesta) para dashboard, API y bots
+Un registro por run y ámbito (global, por país, por app) con histórico
+"""
+
+import fcntl
+import json
+import logging
+import os
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+KPI_FILE_NAME = "kpis.csv"
+
+# Ámbitos de agregación: (scope, columna del DataFrame de rankings)
+SCOPES = (
+    ("overall", None),
+    ("country", "country"),
+    ("app", "app_id"),
+)
+
+# Rank a partir del cual una keyword se considera invisible (iTunes devuelve 250)
+VISIBLE_RANK = 250
+
+# Movers y mejores keywords guardados por registro
+TOP_MOVERS = 5
+TOP_KEYWORDS = 10
+
+COLUMNS = [
+    "run_date", "run_at", "scope", "scope_value",
+    "checks", "keywords", "ranked",
+    "top_10", "top_30", "top_50", "top_100", "visible",
+    "top100_rate", "avg_rank", "avg_rank_visible",
+    "best_keyword", "best_rank", "top_keywords", "movers",
+]
+
+# Columnas guardadas como JSON
+JSON_COLUMNS = ("top_keywords", "movers")
+
+INT_COLUMNS = (
+    "checks", "keywords", "ranked", "top_10", "top_30", "top_50", "top_100",
+    "visible", "best_rank",
+)
+
+
+def kpi_file_for(ranks_file: Path) -> Path:
+    """Fichero de KPIs junto al histórico de rankings"""
+    return Path(ranks_file).parent / KPI_FILE_NAME
+
+
+def _round(value, digits: int = 1):
+    return round(float(value), digits) if pd.notna(value) else None
+
+
+def _movers(current: pd.DataFrame, previous: Optional[pd.DataFrame]) -> List[Dict]:
+    """Mayores cambios de posición respecto al run anterior (positivo = mejora)"""
+    if previous is None or previous.empty:
+        return []
+
+    keys = ["keyword", "country"]
+    merged = current[keys + ["rank"]].merge(
+        previous[keys + ["rank"]], on=keys, suffixes=("", "_prev")
+    ).dropna(subset=["rank", "rank_prev"])
+
+    merged["change"] = merged["rank_prev"] - merged["rank"]
+    merged = merged[merged["change"] != 0]
+    top = merged.reindex(merged["change"].abs().sort_values(ascending=False).index).head(TOP_MOVERS)
+
+    return [
+        {
+            "keyword": row.keyword,
+            "country": row.country,
+            "from": int(row.rank_prev),
+            "to": int(row.rank),
+            "change": int(row.change),
+        }
+        for row in top.itertuples(index=False)
+    ]
+
+
+def _summarize(rows: pd.DataFrame, previous: Optional[pd.DataFrame]) -> Dict:
+    """KPIs de las filas de un run dentro de un ámbito"""
+    rank = rows["rank"]
+    checks = len(rows)
+    visible = rank < VISIBLE_RANK
+
+    best = rows.loc[rank.idxmin()] if rank.notna().any() else None
+    top = rows[visible].nsmallest(TOP_KEYWORDS, "rank")
+
+    return {
+        "checks": checks,
+        "keywords": int(rows["keyword"].nunique()),
+        "ranked": int(rank.notna().sum()),
+        "top_10": int((rank <= 10).sum()),
+        "top_30": int((rank <= 30).sum()),
+        "top_50": int((rank <= 50).sum()),
+        "top_100": int((rank <= 100).sum()),
+        "visible": int(visible.sum()),
+        "top100_rate": round((rank <= 100).sum() / checks * 100, 1) if checks else 0.0,
+        "avg_rank": _round(rank.mean()),
+        "avg_rank_visible": _round(rank[visible].mean()),
+        "best_keyword": best["keyword"] if best is not None else None,
+        "best_rank": int(best["rank"]) if best is not None else None,
+        "top_keywords": [
+            {"keyword": row.keyword, "country": row.country, "rank": int(row.rank)}
+            for row in top.itertuples(index=False)
+        ],
+        "movers": _movers(rows, previous),
+    }
+
+
+def compute_run_kpis(run_df: pd.DataFrame,
+                     previous_df: Optional[pd.DataFrame] = None) -> List[Dict]:
+    """
+    Calcular los registros KPI de un run
+
+    Args:
+        run_df: Filas del run (date, keyword, country, rank[, app_id])
+        previous_df: Filas del run anterior (para los movers)
+
+    Returns:
+        Lista de registros (uno global + uno por país + uno por app)
+    """
+    if run_df.empty:
+        return []
+
+    run_df = run_df.copy()
+    run_df["rank"] = pd.to_numeric(run_df["rank"], errors="coerce")
+    dates = pd.to_datetime(run_df["date"])
+
+    if previous_df is not None:
+        previous_df = previous_df.copy()
+        previous_df["rank"] = pd.to_numeric(previous_df["rank"], errors="coerce")
+
+    base = {
+        "run_date": dates.max().date().isoformat(),
+        "run_at": dates.max().isoformat(),
+    }
+
+    records = []
+    for scope, column in SCOPES:
+        if column is None:
+            records.append({**base, "scope": scope, "scope_value": "",
+                            **_summarize(run_df, previous_df)})
+            continue
+
+        if column not in run_df.columns:
+            continue
+
+        for value, rows in run_df.groupby(column, sort=True):
+            prev_rows = None
+            if previous_df is not None and column in previous_df.columns:
+                prev_rows = previous_df[previous_df[column] == value]
+            records.append({**base, "scope": scope, "scope_value": str(value),
+                            **_summarize(rows, prev_rows)})
+
+    return records
+
+
+class KPIStore:
+    """
+    Tabla de KPIs por run (CSV, un registro por run_date + ámbito)
+
+    La escribe el tracker al guardar resultados (o `python src/kpi_store.py`
+    para reconstruirla desde el histórico); los lectores (API, bots) solo la
+    consultan, con un índice en memoria que se recarga si cambia el fichero,
+    así que el último KPI o su histórico son búsquedas directas.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Args:
+            path: Fichero CSV de KPIs (ver kpi_file_for())
+        """
+        self.path = Path(path)
+        self._mtime = None
+        self._frame = pd.DataFrame(columns=COLUMNS)
+        self._index: Dict[tuple, List[Dict]] = {}
+
+    # === LECTURA ===
+
+    def _refresh(self):
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+
+        if mtime == self._mtime:
+            return
+
+        if mtime is None:
+            frame = pd.DataFrame(columns=COLUMNS)
+        else:
+            frame = pd.read_csv(self.path, keep_default_na=False, na_values=[""],
+                                dtype={"scope_value": str})
+
+        index = {}
+        for record in frame.sort_values("run_date", kind="mergesort").to_dict("records"):
+            record = self._decode(record)
+            index.setdefault((record["scope"], record["scope_value"]), []).append(record)
+
+        self._mtime, self._frame, self._index = mtime, frame, index
+
+    @staticmethod
+    def _decode(record: Dict) -> Dict:
+        """Tipos de un registro leído del CSV (NaN -> None, movers JSON)"""
+        decoded = {}
+        for key, value in record.items():
+            if isinstance(value, float) and pd.isna(value):
+                value = None
+            elif hasattr(value, "item"):
+                value = value.item()
+            decoded[key] = value
+
+        for key in INT_COLUMNS:
+            if decoded.get(key) is not None:
+                decoded[key] = int(decoded[key])
+
+        decoded["scope_value"] = str(decoded["scope_value"] or "")
+        for key in JSON_COLUMNS:
+            decoded[key] = json.loads(decoded[key]) if decoded.get(key) else []
+        return decoded
+
+    def is_empty(self) -> bool:
+        self._refresh()
+        return not self._index
+
+    def latest(self, scope: str = "overall", value: str = "") -> Optional[Dict]:
+        """Último registro de un ámbito (None si no hay)"""
+        self._refresh()
+        records = self._index.get((scope, value))
+        return records[-1] if records else None
+
+    def previous(self, scope: str = "overall", value: str = "") -> Optional[Dict]:
+        """Registro del run anterior al último"""
+        self._refresh()
+        records = self._index.get((scope, value)) or []
+        return records[-2] if len(records) >= 2 else None
+
+    def history(self, scope: str = "overall", value: str = "",
+                days: Optional[int] = None) -> List[Dict]:
+        """
+        Histórico de un ámbito ordenado por fecha (para líneas de tendencia)
+
+        Args:
+            scope: 'overall', 'country' o 'app'
+            value: País / app_id ('' para overall)
+            days: Limitar a los últimos N días desde el último run
+        """
+        self._refresh()
+        records = self._index.get((scope, value)) or []
+
+        if days is not None and records:
+            since = (pd.Timestamp(records[-1]["run_date"]) - pd.Timedelta(days=days)).date().isoformat()
+            records = [r for r in records if r["run_date"] >= since]
+
+        return list(records)
+
+    def scopes(self) -> Dict[str, List[str]]:
+        """Valores disponibles por ámbito"""
+        self._refresh()
+        result = {}
+        for scope, value in self._index:
+            result.setdefault(scope, []).append(value)
+        return {scope: sorted(values) for scope, values in result.items()}
+
+    # === ESCRITURA ===
+
+    @contextmanager
+    def _locked(self):
+        """Lock exclusivo entre procesos para leer-modificar-escribir la tabla"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_name(self.path.name + ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write(self, frame: pd.DataFrame):
+        # tmp por proceso: dos escritores nunca comparten el fichero temporal
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        try:
+            frame.to_csv(tmp, index=False)
+            os.replace(tmp, self.path)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    @staticmethod
+    def _to_frame(records: List[Dict]) -> pd.DataFrame:
+        frame = pd.DataFrame(records, columns=COLUMNS)
+        for key in JSON_COLUMNS:
+            frame[key] = [json.dumps(v, ensure_ascii=False) for v in frame[key]]
+        return frame
+
+    def record_run(self, run_df: pd.DataFrame,
+                   previous_df: Optional[pd.DataFrame] = None) -> List[Dict]:
+        """
+        Calcular y guardar los KPIs de un run (sustituye los del mismo día)
+
+        Args:
+            run_df: Filas guardadas en este run
+            previous_df: Filas del run anterior
+
+        Returns:
+            Registros escritos
+        """
+        records = compute_run_kpis(run_df, previous_df)
+        if not records:
+            return []
+
+        with self._locked():
+            self._refresh()
+            existing = self._frame[self._frame["run_date"].astype(str) != records[0]["run_date"]]
+            frame = pd.concat([existing, self._to_frame(records)], ignore_index=True) \
+                if not existing.empty else self._to_frame(records)
+            self._write(frame.sort_values(["run_date", "scope", "scope_value"], kind="mergesort"))
+
+        overall = records[0]
+        logger.info(
+            f"📈 KPIs del run {overall['run_date']}: top 10 {overall['top_10']}, "
+            f"top 100 {overall['top100_rate']}%, media #{overall['avg_rank']}"
+        )
+        return records
+
+    def backfill(self, history_df: pd.DataFrame) -> int:
+        """
+        Reconstruir la tabla completa a partir del histórico de rankings
+
+        Un run por día (el tracker guarda un run por día).
+
+        Returns:
+            Número de runs calculados
+        """
+        with self._locked():
+            return self._backfill(history_df)
+
+    def _backfill(self, history_df: pd.DataFrame) -> int:
+        if history_df.empty:
+            return 0
+
+        day = pd.to_datetime(history_df["date"]).dt.date
+        records = []
+        previous = None
+
+        for _, rows in history_df.groupby(day, sort=True):
+            records.extend(compute_run_kpis(rows, previous))
+            previous = rows
+
+        self._write(self._to_frame(records))
+        runs = day.nunique()
+        logger.info(f"📈 KPIs reconstruidos desde el histórico: {runs} runs")
+        return runs
+
+    def ensure(self, history_loader) -> "KPIStore":
+        """
+        Rellenar la tabla desde el histórico si aún no existe
+
+        Solo para escritores (tracker): los lectores usan la tabla tal cual.
+
+        Args:
+            history_loader: Función que devuelve el DataFrame de rankings
+        """
+        if self.is_empty():
+            with self._locked():
+                # Otro proceso puede haberla rellenado mientras se esperaba el lock
+                if not self.is_empty():
+                    return self
+                history = history_loader()
+                if history is not None and not history.empty:
+                    self._backfill(history)
+        return self
+
+
+if __name__ == "__main__":
+    # Reconstruir la tabla desde el histórico (migración / primera instalación)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    ranks_file = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(__file__).parent.parent / "data" / "ranks.csv"
+    KPIStore(kpi_file_for(ranks_file)).backfill(pd.read_csv(ranks_file))
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Feed en vivo (Server-Sent Events) para las APIs de ASO Rank Guard
+Difunde los deltas de cada tracking nuevo a los clientes suscritos
+"""
+
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+SSE_MEDIA_TYPE = "text/event-stream"
+
+# Sin caché y sin buffering en el proxy (nginx), o los eventos llegan tarde
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+# Milisegundos que espera el navegador antes de reconectar
+RETRY_MS = 5000
+
+
+def format_sse(event: str, data, event_id: Optional[int] = None) -> str:
+    """
+    Formatear un evento SSE
+
+    Args:
+        event: Nombre del evento
+        data: Payload (se serializa a JSON en una línea)
+        event_id: Id del evento (Last-Event-ID al reconectar)
+
+    Returns:
+        Frame SSE terminado en línea en blanco
+    """
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append("data: " + json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str))
+    return "\n".join(lines) + "\n\n"
+
+
+class LiveFeed:
+    """Difusión de eventos a todas las conexiones SSE abiertas"""
+
+    def __init__(self, queue_size: int = 16):
+        """
+        Args:
+            queue_size: Eventos pendientes por cliente antes de descartar los más antiguos
+        """
+        self.queue_size = queue_size
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._sequence = 0
+        self._last_frame: Optional[str] = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> asyncio.Queue:
+        """
+        Registrar un cliente
+
+        Si reconecta con un Last-Event-ID anterior al último evento se le
+        reenvía ese evento (el run que se perdió mientras estaba desconectado).
+        """
+        queue = asyncio.Queue(maxsize=self.queue_size)
+
+        if last_event_id is not None and self._last_frame is not None:
+            try:
+                missed = int(last_event_id) < self._sequence
+            except ValueError:
+                missed = True
+            if missed:
+                queue.put_nowait(self._last_frame)
+
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def publish(self, event: str, data) -> int:
+        """
+        Enviar un evento a todos los suscriptores
+
+        Nunca bloquea: si un cliente lento tiene la cola llena se descarta
+        su evento más antiguo.
+
+        Returns:
+            Id asignado al evento
+        """
+        self._sequence += 1
+        frame = format_sse(event, data, self._sequence)
+        self._last_frame = frame
+
+        for queue in list(self._subscribers):
+            self._put(queue, frame)
+
+        logger.info(f"📡 Evento '{event}' #{self._sequence} enviado a {len(self._subscribers)} clientes")
+        return self._sequence
+
+    def close(self):
+        """Cerrar todas las conexiones (al apagar el servidor)"""
+        for queue in list(self._subscribers):
+            self._put(queue, None)
+
+    @staticmethod
+    def _put(queue: asyncio.Queue, frame: Optional[str]):
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(frame)
+
+    async def stream(self, last_event_id: Optional[str] = None,
+                     heartbeat: float = 15.0) -> AsyncIterator[str]:
+        """
+        Generador de frames SSE para un StreamingResponse
+
+        Args:
+            last_event_id: Cabecera Last-Event-ID del cliente
+            heartbeat: Segundos entre comentarios keepalive (mantienen viva
+                la conexión a través de proxies)
+        """
+        queue = self.subscribe(last_event_id)
+
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+
+            while True:
+                try:
+                    frame = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                if frame is None:
+                    break
+                yield frame
+        finally:
+            self.unsubscribe(queue)
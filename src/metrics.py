@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Métricas Prometheus de ASO Rank Guard
+Latencias de la API, caché, cargas de datos, tracking (iTunes) y envíos a Telegram
+
+Importar el módulo no tiene efectos: las métricas se crean en su primer
+uso. init_metrics() activa el modo multiproceso de prometheus_client: cada
+proceso (workers de uvicorn, tracker lanzado por cron/scheduler) escribe sus
+valores en PROMETHEUS_MULTIPROC_DIR (por defecto data/metrics/) y el
+/metrics de la API agrega todos. Así las métricas del tracking son visibles
+aunque se ejecute en otro proceso. Sin init_metrics() (scripts sueltos,
+alertas) las métricas quedan en memoria del proceso.
+
+Ciclo de vida del directorio (prometheus_client crea un fichero por pid):
+
+- la API lo vacía al arrancar, antes de lanzar los workers
+  (clear_multiprocess_dir(), o `python src/metrics.py` como ExecStartPre
+  si se arranca con `uvicorn --workers N`)
+- cada worker marca su pid como muerto al salir (mark_process_dead())
+- los trackings escriben con un nombre fijo en vez del pid
+  (use_tracking_process()): los runs de cron acumulan en los mismos
+  ficheros en lugar de dejar unos nuevos por ejecución
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+        generate_latest, multiprocess, values
+    )
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+    logger.info("ℹ️ prometheus_client no instalado, métricas desactivadas")
+
+# Lock entre procesos para el nombre fijo de los trackings (POSIX)
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+# Directorio multiproceso si no se fija PROMETHEUS_MULTIPROC_DIR
+DEFAULT_MULTIPROC_DIR = Path(__file__).parent.parent / "data" / "metrics"
+
+# Identificador de proceso con el que se escriben los ficheros .db: el pid,
+# salvo en un proceso de tracking (use_tracking_process())
+_process_state = {"name": None, "multiprocess": False}
+
+
+def _process_identifier():
+    return _process_state["name"] or os.getpid()
+
+
+def multiprocess_dir() -> Path:
+    """Directorio donde escriben los procesos (PROMETHEUS_MULTIPROC_DIR)"""
+    return Path(os.environ.get("PROMETHEUS_MULTIPROC_DIR", DEFAULT_MULTIPROC_DIR))
+
+
+def init_metrics() -> bool:
+    """
+    Activar el modo multiproceso en este proceso
+
+    Llamar al arrancar, antes de usar ninguna métrica: la API al importarse
+    y los trackings en use_tracking_process(). Las métricas que ya se hayan
+    usado antes se quedan en memoria del proceso.
+
+    Returns:
+        True si las métricas se escriben en el directorio compartido
+    """
+    if not PROMETHEUS_AVAILABLE:
+        return False
+
+    if not _process_state["multiprocess"]:
+        path = multiprocess_dir()
+        path.mkdir(parents=True, exist_ok=True)
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = str(path)
+        values.ValueClass = values.MultiProcessValue(_process_identifier)
+        _process_state["multiprocess"] = True
+
+    return True
+
+
+class _NoopMetric:
+    """Sustituto sin efecto cuando prometheus_client no está instalado"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    @contextmanager
+    def time(self):
+        yield
+
+
+class _LazyMetric:
+    """
+    Métrica que se registra en prometheus_client en su primer uso
+
+    Así el tipo de valor (en memoria o multiproceso) se decide después de
+    init_metrics(), no al importar este módulo.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, metric_class, *args, **kwargs):
+        self._metric_class = metric_class
+        self._args = args
+        self._kwargs = kwargs
+        self._metric = None
+
+    def __getattr__(self, attr):
+        if self._metric is None:
+            with self._lock:
+                if self._metric is None:
+                    self._metric = self._metric_class(*self._args, **self._kwargs)
+        return getattr(self._metric, attr)
+
+
+def _metric(kind: str, name: str, documentation: str, labelnames=(), **kwargs):
+    """Crear una métrica ('counter', 'gauge', 'histogram') o un no-op"""
+    if not PROMETHEUS_AVAILABLE:
+        return _NoopMetric()
+
+    metric_class = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}[kind]
+    return _LazyMetric(metric_class, name, documentation, labelnames, **kwargs)
+
+
+# Buckets en segundos
+FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+NETWORK_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+RUN_BUCKETS = (10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200)
+
+# === API ===
+
+HTTP_REQUEST_DURATION = _metric(
+    "histogram", "aso_http_request_duration_seconds",
+    "Latencia de las peticiones HTTP por endpoint",
+    ("endpoint", "method", "status"), buckets=FAST_BUCKETS
+)
+
+CACHE_REQUESTS = _metric(
+    "counter", "aso_cache_requests_total",
+    "Aciertos/fallos de caché (layer: conditional, response, shared, encoded, rankings)",
+    ("layer", "result")
+)
+
+DATA_LOAD_DURATION = _metric(
+    "histogram", "aso_data_load_duration_seconds",
+    "Duración de las cargas de datos (stage: parse = lectura del CSV, load = carga completa)",
+    ("stage",), buckets=FAST_BUCKETS
+)
+
+DATA_RECORDS_LOADED = _metric(
+    "gauge", "aso_data_records_loaded",
+    "Filas de rankings en la última carga",
+    multiprocess_mode="mostrecent"
+)
+
+# === TRACKING ===
+
+TRACKING_RUN_DURATION = _metric(
+    "histogram", "aso_tracking_run_duration_seconds",
+    "Duración de un tracking completo",
+    ("tracker",), buckets=RUN_BUCKETS
+)
+
+ITUNES_REQUEST_DURATION = _metric(
+    "histogram", "aso_itunes_request_duration_seconds",
+    "Latencia de iTunes Search API por país (cada intento)",
+    ("country",), buckets=NETWORK_BUCKETS
+)
+
+ITUNES_REQUEST_ERRORS = _metric(
+    "counter", "aso_itunes_request_errors_total",
+    "Errores de iTunes Search API por país y motivo (cada intento)",
+    ("country", "reason")
+)
+
+# === ALERTAS ===
+
+TELEGRAM_SEND_DURATION = _metric(
+    "histogram", "aso_telegram_send_duration_seconds",
+    "Latencia de envío de mensajes a Telegram",
+    ("sender", "result"), buckets=NETWORK_BUCKETS
+)
+
+
+def request_error_reason(error: Exception) -> str:
+    """
+    Motivo corto (baja cardinalidad) de un error de requests
+
+    Returns:
+        'timeout', 'connection', 'http_<status>' u 'other'
+    """
+    name = type(error).__name__
+
+    if "Timeout" in name:
+        return "timeout"
+    if "Connection" in name:
+        return "connection"
+
+    response = getattr(error, "response", None)
+    if response is not None and getattr(response, "status_code", None):
+        return f"http_{response.status_code}"
+
+    return "other"
+
+
+@contextmanager
+def observe_telegram_send(sender: str):
+    """
+    Medir un envío a Telegram, etiquetado ok/error según si lanza excepción
+
+    Args:
+        sender: Origen del envío ('alert_manager', 'supabase_alerts')
+    """
+    start = time.perf_counter()
+    result = "error"
+    try:
+        yield
+        result = "ok"
+    finally:
+        TELEGRAM_SEND_DURATION.labels(sender, result).observe(time.perf_counter() - start)
+
+
+def render_latest() -> Tuple[bytes, str]:
+    """
+    Exposición en formato texto de Prometheus (todos los procesos)
+
+    Returns:
+        (cuerpo, content type)
+    """
+    init_metrics()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def clear_multiprocess_dir():
+    """
+    Vaciar PROMETHEUS_MULTIPROC_DIR
+
+    Solo al arrancar la API, antes de que haya workers escribiendo: borra
+    los ficheros de procesos de arranques anteriores (los contadores
+    empiezan de cero, como en cualquier reinicio).
+    """
+    directory = multiprocess_dir()
+    removed = 0
+    for path in directory.glob("*.db"):
+        path.unlink(missing_ok=True)
+        removed += 1
+    if removed:
+        logger.info(f"🧹 {removed} ficheros de métricas antiguos eliminados de {directory}")
+
+
+def mark_process_dead(pid: int = None):
+    """
+    Marcar un proceso como terminado (gauges 'live*' dejan de contarlo)
+
+    Args:
+        pid: Proceso (por defecto el actual); llamar al salir de cada worker
+    """
+    if _process_state["multiprocess"]:
+        multiprocess.mark_process_dead(pid or os.getpid(), str(multiprocess_dir()))
+
+
+def use_tracking_process(name: str):
+    """
+    Escribir las métricas de este proceso con un nombre fijo en vez del pid
+
+    Los trackings de cron son procesos cortos: con el pid cada ejecución
+    dejaría ficheros nuevos en el directorio. Con un nombre fijo todas las
+    ejecuciones acumulan en los mismos (histogram_tracker_<name>.db...).
+
+    Se llama al empezar un tracking (activa init_metrics()) y vale hasta que
+    el proceso termina. Un lock (que se suelta al salir el proceso)
+    garantiza que dos procesos no escriben los mismos ficheros: si ya hay
+    otro tracking en marcha, o no hay flock, este sigue con su pid.
+
+    Args:
+        name: Tracker ('csv', 'supabase')
+    """
+    if not init_metrics() or not FCNTL_AVAILABLE or _process_state["name"] is not None:
+        return
+
+    lock_file = open(multiprocess_dir() / f"tracker_{name}.lock", "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        logger.warning(f"⚠️  Otro tracking '{name}' en marcha, métricas con el pid")
+        return
+
+    _process_state.update(name=f"tracker_{name}", lock=lock_file)
+
+
+if __name__ == "__main__":
+    # ExecStartPre de la API cuando se arranca con `uvicorn --workers N`
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    clear_multiprocess_dir()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Variantes precomprimidas (.gz / .br) de artefactos estáticos y respuestas
+Se comprime una vez al generar; al servir solo se elige la variante
+"""
+
+import gzip
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Brotli comprime ~15-20% mejor que gzip en JSON/HTML (opcional)
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+    logger.info("ℹ️ brotli no instalado, solo se generan variantes .gz")
+
+# Por debajo de este tamaño no compensa comprimir (mismo umbral que GZipMiddleware)
+MIN_SIZE = 1000
+
+# Content-Encoding -> extensión del fichero hermano, por orden de preferencia
+SUFFIXES = {
+    'br': '.br',
+    'gzip': '.gz',
+}
+
+# Niveles por tipo de cuerpo: los artefactos estáticos (dashboard, CLI) se
+# comprimen una vez al generarlos y pueden usar el máximo; las respuestas de
+# la API se comprimen en la primera petición de cada versión de datos, donde
+# brotli 11 tarda segundos en payloads grandes (brotli 5 / gzip 6: ~50x más
+# rápido, salida algo mayor)
+STATIC_LEVELS = {'gzip': 9, 'br': 11}
+DYNAMIC_LEVELS = {'gzip': 6, 'br': 5}
+
+# Extensiones que se precomprimen al recorrer un directorio
+COMPRESSIBLE_EXTENSIONS = ('.html', '.js', '.css', '.json', '.svg', '.csv')
+
+
+def compress_variants(data: bytes, levels: Dict[str, int] = STATIC_LEVELS) -> Dict[str, bytes]:
+    """
+    Comprimir un cuerpo con todas las codificaciones disponibles
+
+    Args:
+        data: Cuerpo sin comprimir
+        levels: Nivel por codificación (STATIC_LEVELS para artefactos
+                generados, DYNAMIC_LEVELS en el camino de una petición)
+
+    Returns:
+        {'gzip': ..., 'br': ...} (vacío si data es menor que MIN_SIZE)
+    """
+    if len(data) < MIN_SIZE:
+        return {}
+
+    # mtime=0: salida determinista (mismo contenido -> mismos bytes)
+    variants = {'gzip': gzip.compress(data, compresslevel=levels['gzip'], mtime=0)}
+    if BROTLI_AVAILABLE:
+        variants['br'] = brotli.compress(data, quality=levels['br'])
+    return variants
+
+
+def negotiate_encoding(accept_encoding: Optional[str], available: Iterable[str]) -> Optional[str]:
+    """
+    Elegir la mejor codificación disponible según Accept-Encoding
+
+    Args:
+        accept_encoding: Cabecera Accept-Encoding del cliente
+        available: Codificaciones que existen para el recurso
+
+    Returns:
+        'br', 'gzip' o None (sin comprimir)
+    """
+    if not accept_encoding:
+        return None
+
+    accepted = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    available = set(available)
+    for encoding in SUFFIXES:
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if encoding in available and quality > 0:
+            return encoding
+
+    return None
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def write_precompressed(path: Path, data: Optional[bytes] = None) -> Dict[str, Path]:
+    """
+    Escribir los ficheros hermanos .gz/.br de un artefacto
+
+    Si el artefacto es demasiado pequeño se borran hermanos antiguos para
+    que el servidor no sirva una variante obsoleta.
+
+    Args:
+        path: Fichero ya escrito
+        data: Su contenido (se lee de disco si no se pasa)
+
+    Returns:
+        {encoding: ruta} de las variantes escritas
+    """
+    path = Path(path)
+    if data is None:
+        data = path.read_bytes()
+
+    variants = compress_variants(data)
+    written = {}
+
+    for encoding, suffix in SUFFIXES.items():
+        sibling = path.with_name(path.name + suffix)
+        if encoding in variants:
+            _write_atomic(sibling, variants[encoding])
+            written[encoding] = sibling
+        else:
+            sibling.unlink(missing_ok=True)
+
+    return written
+
+
+def remove_precompressed(path: Path):
+    """Borrar un artefacto junto con sus variantes precomprimidas"""
+    path = Path(path)
+    path.unlink(missing_ok=True)
+    for suffix in SUFFIXES.values():
+        path.with_name(path.name + suffix).unlink(missing_ok=True)
+
+
+def precompress_tree(root: Path) -> int:
+    """
+    Precomprimir todos los ficheros estáticos de un directorio (recursivo)
+
+    Solo regenera las variantes más antiguas que el original.
+
+    Returns:
+        Número de ficheros procesados
+    """
+    count = 0
+    for path in Path(root).rglob('*'):
+        if not path.is_file() or path.suffix not in COMPRESSIBLE_EXTENSIONS:
+            continue
+
+        stat = path.stat()
+        expected = ['gzip', 'br'] if BROTLI_AVAILABLE else ['gzip']
+        siblings = [path.with_name(path.name + SUFFIXES[e]) for e in expected]
+        if stat.st_size < MIN_SIZE or all(
+            s.exists() and s.stat().st_mtime >= stat.st_mtime for s in siblings
+        ):
+            continue
+
+        write_precompressed(path)
+        count += 1
+
+    logger.info(f"🗜️ {count} ficheros precomprimidos en {root}")
+    return count
+
+
+def precompressed_file(path: Path, accept_encoding: Optional[str]) -> Tuple[Path, Optional[str]]:
+    """
+    Elegir el fichero a servir: variante precomprimida si existe y está al día
+
+    Args:
+        path: Fichero original
+        accept_encoding: Cabecera Accept-Encoding del cliente
+
+    Returns:
+        (ruta a servir, Content-Encoding o None)
+    """
+    path = Path(path)
+    mtime = path.stat().st_mtime
+
+    available = {}
+    for encoding, suffix in SUFFIXES.items():
+        sibling = path.with_name(path.name + suffix)
+        if sibling.exists() and sibling.stat().st_mtime >= mtime:
+            available[encoding] = sibling
+
+    encoding = negotiate_encoding(accept_encoding, available)
+    if encoding is None:
+        return path, None
+    return available[encoding], encoding
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    for directory in sys.argv[1:] or ['web']:
+        precompress_tree(Path(directory))
@@ -5,17 +5,27 @@ Herramienta personal para monitorizar keywords de Audio Bible Stories & Chat
 """
 
 import requests
+import numpy as np
 import pandas as pd
 import time
 import random
 import logging
 import shutil
+import os
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 import yaml
 import sys
 
+sys.path.insert(0, str(Path(__file__).parent))
+
+from kpi_store import KPIStore, kpi_file_for
+from metrics import (
+    ITUNES_REQUEST_DURATION, ITUNES_REQUEST_ERRORS, TRACKING_RUN_DURATION,
+    request_error_reason, use_tracking_process
+)
+
 # Configurar logging
 logging.basicConfig(
     level=logging.INFO,
@@ -27,6 +37,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Cambios que se escriben uno a uno en el log (el resto se resume)
+MAX_LOGGED_CHANGES = 50
+
 
 class RankTracker:
     """Rastreador principal de rankings del App Store"""
@@ -45,6 +58,9 @@ class RankTracker:
         # Inicializar histórico
         self.history_df = self._load_history()
         
+        # KPIs por run (se actualizan al guardar resultados)
+        self.kpi_store = KPIStore(kpi_file_for(self.ranks_file))
+        
         logger.info(f"✅ RankTracker inicializado para app {self.app_id}")
         logger.info(f"📊 Monitorizando {len(self.keywords)} keywords en {len(self.countries)} países")
     
@@ -111,10 +127,12 @@ class RankTracker:
             max_retries = 3
             for attempt in range(max_retries):
                 try:
-                    response = requests.get(base_url, params=params, timeout=timeout)
+                    with ITUNES_REQUEST_DURATION.labels(country).time():
+                        response = requests.get(base_url, params=params, timeout=timeout)
                     response.raise_for_status()
                     break
                 except requests.exceptions.RequestException as e:
+                    ITUNES_REQUEST_ERRORS.labels(country, request_error_reason(e)).inc()
                     if attempt < max_retries - 1:
                         logger.warning(f"⚠️ Intento {attempt + 1} falló para '{keyword}', reintentando...")
                         time.sleep(2 * (attempt + 1))  # Backoff exponencial
@@ -152,7 +170,9 @@ class RankTracker:
             DataFrame con resultados actuales
         """
         logger.info("🚀 Iniciando rastreo de keywords...")
+        use_tracking_process("csv")
         
+        run_start = time.perf_counter()
         results = []
         total = len(self.keywords) * len(self.countries)
         current = 0
@@ -173,6 +193,7 @@ class RankTracker:
                 })
         
         results_df = pd.DataFrame(results)
+        TRACKING_RUN_DURATION.labels("csv").observe(time.perf_counter() - run_start)
         logger.info(f"✅ Rastreo completado: {len(results)} checks realizados")
         
         # Enviar alertas automáticas si está habilitado
@@ -224,15 +245,30 @@ class RankTracker:
                 # Eliminar columna temporal
                 self.history_df = self.history_df.drop(columns=['date_only'], errors='ignore')
             
+            # Run anterior (último día guardado) para los movers de los KPIs
+            previous_df = None
+            if len(self.history_df) > 0:
+                days = pd.to_datetime(self.history_df['date']).dt.date
+                previous_df = self.history_df[days == days.max()]
+            history_before = self.history_df
+            
             # Concatenar con nuevos resultados
             self.history_df = pd.concat([self.history_df, results_df], ignore_index=True)
             
+            # Limpiar datos antiguos antes de escribir: el CSV (y su versión)
+            # cambia una sola vez por run y los KPIs se registran después
+            self._cleanup_old_data()
+            
             # Guardar a CSV
-            self.history_df.to_csv(self.ranks_file, index=False)
+            self._write_history()
             logger.info(f"💾 Resultados guardados en {self.ranks_file} ({len(results_df)} nuevos registros)")
             
-            # Limpiar datos antiguos si es necesario
-            self._cleanup_old_data()
+            # Agregación en ingesta: KPIs del run para dashboard, API y bots
+            try:
+                self.kpi_store.ensure(lambda: history_before)
+                self.kpi_store.record_run(results_df, previous_df)
+            except Exception as e:
+                logger.warning(f"⚠️  Error calculando KPIs del run: {e}")
             
             # Limpiar backups antiguos
             self._cleanup_old_backups()
@@ -281,7 +317,7 @@ class RankTracker:
             logger.warning(f"⚠️ Error limpiando backups: {e}")
     
     def _cleanup_old_data(self):
-        """Eliminar datos más antiguos que retention_days"""
+        """Eliminar del histórico en memoria los datos más antiguos que retention_days"""
         retention_days = self.config['storage']['retention_days']
         cutoff_date = datetime.now() - timedelta(days=retention_days)
         
@@ -291,7 +327,18 @@ class RankTracker:
         
         if before_count > after_count:
             logger.info(f"🧹 Limpieza: {before_count - after_count} registros antiguos eliminados")
-            self.history_df.to_csv(self.ranks_file, index=False)
+    
+    def _write_history(self):
+        """
+        Escribir el histórico al CSV de forma atómica
+        
+        Se escribe a un archivo temporal y se reemplaza el CSV de golpe, así
+        los lectores (API, dashboard) nunca ven un archivo a medio escribir y
+        su versión (mtime/size) cambia una sola vez por run.
+        """
+        tmp_file = self.ranks_file.with_name(self.ranks_file.name + '.tmp')
+        self.history_df.to_csv(tmp_file, index=False)
+        os.replace(tmp_file, self.ranks_file)
     
     def detect_changes(self, current_df: pd.DataFrame) -> List[Dict]:
         """
@@ -314,53 +361,76 @@ class RankTracker:
             logger.info("⚠️  No hay datos recientes para comparar")
             return changes
         
-        # Asegurar que rank sea numérico
-        recent_history = recent_history.copy()
-        recent_history['rank'] = pd.to_numeric(recent_history['rank'], errors='coerce')
-        
-        # Comparar cada keyword/country
-        for _, current_row in current_df.iterrows():
-            keyword = current_row['keyword']
-            country = current_row['country']
-            current_rank = current_row['rank']
+        # Última observación de cada keyword/country (un solo sort + dedup)
+        previous = recent_history.sort_values('date', kind='mergesort')\
+            .drop_duplicates(subset=['keyword', 'country'], keep='last')
+        previous = pd.DataFrame({
+            'keyword': previous['keyword'],
+            'country': previous['country'],
+            'prev_rank': pd.to_numeric(previous['rank'], errors='coerce')
+        })
+        
+        # Join con el run actual (left join: conserva el orden de current_df)
+        merged = current_df[['keyword', 'country', 'rank']].merge(
+            previous, on=['keyword', 'country'], how='left', sort=False
+        )
+        current_rank = pd.to_numeric(merged['rank'], errors='coerce').to_numpy(dtype=float)
+        prev_rank = merged['prev_rank'].to_numpy(dtype=float)
+        diff = prev_rank - current_rank  # Positivo = subió, negativo = bajó
+        
+        # Detectar cambios significativos (NaN = sin dato previo, nunca cumple)
+        drop_threshold = self.config['alerts']['drop_threshold']
+        rise_threshold = self.config['alerts'].get('rise_threshold', 10)
+        
+        is_drop = diff < -drop_threshold
+        is_rise = ~is_drop & (diff > rise_threshold)
+        selected = np.flatnonzero(is_drop | is_rise)
+        
+        # Solo se pasa a objetos Python lo seleccionado
+        rows = zip(
+            is_drop[selected].tolist(),
+            merged['keyword'].to_numpy()[selected].tolist(),
+            merged['country'].to_numpy()[selected].tolist(),
+            prev_rank[selected].astype(int).tolist(),
+            current_rank[selected].astype(int).tolist(),
+            diff[selected].astype(int).tolist()
+        )
+        
+        for n, (dropped, keyword, country, prev, current, change) in enumerate(rows):
+            log_change = n < MAX_LOGGED_CHANGES
             
-            # Buscar última entrada para este keyword/country
-            prev_data = recent_history[
-                (recent_history['keyword'] == keyword) &
-                (recent_history['country'] == country)
-            ].sort_values('date', ascending=False)
+            if dropped:  # Bajó
+                changes.append({
+                    'type': 'drop',
+                    'keyword': keyword,
+                    'country': country,
+                    'prev_rank': prev,
+                    'current_rank': current,
+                    'diff': change,
+                    'severity': 'high' if abs(change) > 10 else 'medium'
+                })
+                if log_change:
+                    logger.warning(f"⬇️  CAÍDA: '{keyword}' ({country}) bajó {abs(change)} posiciones")
             
-            if len(prev_data) > 0:
-                prev_rank = prev_data.iloc[0]['rank']
-                diff = prev_rank - current_rank  # Positivo = subió, negativo = bajó
-                
-                # Detectar cambios significativos
-                drop_threshold = self.config['alerts']['drop_threshold']
-                rise_threshold = self.config['alerts'].get('rise_threshold', 10)
-                
-                if diff < -drop_threshold:  # Bajó
-                    changes.append({
-                        'type': 'drop',
-                        'keyword': keyword,
-                        'country': country,
-                        'prev_rank': int(prev_rank),
-                        'current_rank': int(current_rank),
-                        'diff': int(diff),
-                        'severity': 'high' if abs(diff) > 10 else 'medium'
-                    })
-                    logger.warning(f"⬇️  CAÍDA: '{keyword}' ({country}) bajó {abs(diff)} posiciones")
-                
-                elif diff > rise_threshold:  # Subió
-                    changes.append({
-                        'type': 'rise',
-                        'keyword': keyword,
-                        'country': country,
-                        'prev_rank': int(prev_rank),
-                        'current_rank': int(current_rank),
-                        'diff': int(diff),
-                        'severity': 'positive'
-                    })
-                    logger.info(f"⬆️  SUBIDA: '{keyword}' ({country}) subió {diff} posiciones")
+            else:  # Subió
+                changes.append({
+                    'type': 'rise',
+                    'keyword': keyword,
+                    'country': country,
+                    'prev_rank': prev,
+                    'current_rank': current,
+                    'diff': change,
+                    'severity': 'positive'
+                })
+                if log_change:
+                    logger.info(f"⬆️  SUBIDA: '{keyword}' ({country}) subió {change} posiciones")
+        
+        if len(changes) > MAX_LOGGED_CHANGES:
+            drops = int(is_drop.sum())
+            logger.info(
+                f"📊 {len(changes)} cambios detectados ({drops} caídas, {len(changes) - drops} subidas), "
+                f"solo se muestran los {MAX_LOGGED_CHANGES} primeros"
+            )
         
         return changes
     
@@ -369,6 +439,18 @@ class RankTracker:
         if len(self.history_df) == 0:
             return {}
         
+        # KPIs precalculados al guardar el run
+        kpis = self.kpi_store.ensure(lambda: self.history_df).latest()
+        if kpis is not None:
+            return {
+                'last_update': kpis['run_at'],
+                'total_tracked': kpis['checks'],
+                'visible_in_top250': kpis['visible'],
+                'visibility_rate': f"{(kpis['visible'] / kpis['checks'] * 100):.1f}%",
+                'avg_rank': f"{kpis['avg_rank_visible']:.1f}" if kpis['avg_rank_visible'] is not None else "N/A",
+                'top_keywords': kpis['top_keywords'][:5]
+            }
+        
         # Últimos datos
         latest = self.history_df.sort_values('date', ascending=False).iloc[0]['date']
         latest_data = self.history_df[self.history_df['date'] == latest].copy()
@@ -12,7 +12,14 @@ from datetime import datetime
 from typing import Dict, List, Optional
 import os
 
+import pandas as pd
+
+from kpi_store import compute_run_kpis
 from supabase_client import get_supabase_client
+from metrics import (
+    ITUNES_REQUEST_DURATION, ITUNES_REQUEST_ERRORS, TRACKING_RUN_DURATION,
+    request_error_reason, use_tracking_process
+)
 
 # Configurar logging
 logging.basicConfig(
@@ -94,14 +101,16 @@ class RankTrackerSupabase:
             # Request con retry logic
             for attempt in range(self.max_retries):
                 try:
-                    response = requests.get(
-                        self.itunes_api_url, 
-                        params=params, 
-                        timeout=self.api_timeout
-                    )
+                    with ITUNES_REQUEST_DURATION.labels(country).time():
+                        response = requests.get(
+                            self.itunes_api_url, 
+                            params=params, 
+                            timeout=self.api_timeout
+                        )
                     response.raise_for_status()
                     break
                 except requests.exceptions.RequestException as e:
+                    ITUNES_REQUEST_ERRORS.labels(country, request_error_reason(e)).inc()
                     if attempt < self.max_retries - 1:
                         logger.warning(
                             f"⚠️ Intento {attempt + 1} falló para '{keyword}', "
@@ -148,9 +157,11 @@ class RankTrackerSupabase:
             raise ValueError("app_id is required")
         
         logger.info(f"🚀 Iniciando tracking para app {target_app_id}...")
+        use_tracking_process("supabase")
         
         # Crear tracking job
         job_id = self.supabase.create_tracking_job(target_app_id, 'manual')
+        run_start = time.perf_counter()
         
         try:
             # 1. Obtener app y keywords desde Supabase
@@ -194,12 +205,19 @@ class RankTrackerSupabase:
                     'tracked_at': datetime.utcnow().isoformat()
                 })
             
+            # Ranks del run anterior (antes de insertar) para los movers de los KPIs
+            previous_ranks = self.supabase.get_latest_ranks([kw['id'] for kw in keywords])
+            
             # 3. Guardar rankings en Supabase
             success = self.supabase.bulk_save_rankings(rankings)
             
             if success:
+                TRACKING_RUN_DURATION.labels("supabase").observe(time.perf_counter() - run_start)
                 logger.info(f"✅ {len(rankings)} rankings guardados en Supabase")
                 
+                # Agregación en ingesta: KPIs del run (global y por país)
+                self._save_run_kpis(target_app_id, job_id, keywords, rankings, previous_ranks)
+                
                 # Actualizar tracking job
                 self.supabase.update_tracking_job(
                     job_id, 
@@ -234,6 +252,50 @@ class RankTrackerSupabase:
                 'job_id': job_id
             }
     
+    def _save_run_kpis(self, app_id: str, job_id: Optional[str], keywords: List[Dict],
+                       rankings: List[Dict], previous_ranks: Dict[str, int]):
+        """
+        Calcular y guardar los KPIs del run en kpi_snapshots
+        
+        Args:
+            app_id: UUID de la app
+            job_id: Tracking job del run
+            keywords: Keywords trackeadas (id, keyword, country)
+            rankings: Rankings del run (keyword_id, rank, tracked_at)
+            previous_ranks: {keyword_id: rank} del run anterior
+        """
+        try:
+            by_id = {kw['id']: kw for kw in keywords}
+            
+            def frame(rows):
+                df = pd.DataFrame([
+                    {
+                        'date': row['tracked_at'],
+                        'keyword': by_id[row['keyword_id']]['keyword'],
+                        'country': by_id[row['keyword_id']]['country'],
+                        'rank': row['rank']
+                    }
+                    for row in rows
+                ])
+                # 999 = "no encontrada" en la tabla rankings
+                df['rank'] = pd.to_numeric(df['rank'], errors='coerce')
+                df.loc[df['rank'] >= 999, 'rank'] = None
+                return df
+            
+            run_df = frame(rankings)
+            previous_df = frame([
+                {'keyword_id': kw_id, 'rank': rank, 'tracked_at': None}
+                for kw_id, rank in previous_ranks.items() if kw_id in by_id
+            ]) if previous_ranks else None
+            
+            records = [
+                r for r in compute_run_kpis(run_df, previous_df)
+                if r['scope'] in ('overall', 'country')
+            ]
+            self.supabase.save_kpi_snapshots(app_id, records, job_id)
+        except Exception as e:
+            logger.warning(f"⚠️ Error calculando KPIs del run: {e}")
+    
     def track_all_user_apps(self, user_id: Optional[str] = None) -> List[Dict]:
         """
         Trackear todas las apps de un usuario
@@ -260,20 +322,28 @@ class RankTrackerSupabase:
         
         logger.info(f"📱 {len(apps)} apps encontradas")
         
-        # Trackear cada app
+        # Trackear cada app (alertas se evalúan al final, en batch)
         results = []
+        tracked_app_ids = []
         for app in apps:
             logger.info(f"\n{'='*60}")
             logger.info(f"Tracking: {app['name']}")
             logger.info(f"{'='*60}\n")
             
-            result = self.track_app(app['id'], send_alerts=True)
+            result = self.track_app(app['id'], send_alerts=False)
             results.append(result)
             
+            if result['success']:
+                tracked_app_ids.append(app['id'])
+            
             # Pausa entre apps para evitar rate limiting
             if len(apps) > 1:
                 time.sleep(5)
         
+        # Evaluar alertas de todas las apps en una sola pasada
+        if tracked_app_ids:
+            self._check_and_send_alerts_batch(tracked_app_ids)
+        
         # Resumen final
         successful = sum(1 for r in results if r['success'])
         logger.info(f"\n{'='*60}")
@@ -309,6 +379,31 @@ class RankTrackerSupabase:
             
         except Exception as e:
             logger.error(f"⚠️ Error verificando alertas: {e}")
+    
+    def _check_and_send_alerts_batch(self, app_ids: List[str]):
+        """
+        Verificar cambios y enviar alertas de varias apps en una sola pasada
+        
+        Args:
+            app_ids: UUIDs de las apps trackeadas con éxito
+        """
+        try:
+            logger.info(f"🔍 Verificando alertas automáticas de {len(app_ids)} apps...")
+            
+            try:
+                from supabase_alerts import SupabaseAlertManager
+                
+                alert_manager = SupabaseAlertManager()
+                alert_manager.check_and_send_alerts_batch(app_ids)
+                
+            except ImportError:
+                logger.warning(
+                    "⚠️ Módulo supabase_alerts no disponible. "
+                    "Crea src/supabase_alerts.py para habilitar alertas."
+                )
+            
+        except Exception as e:
+            logger.error(f"⚠️ Error verificando alertas: {e}")
 
 
 def main():
@@ -8,24 +8,20 @@ import pandas as pd
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 import logging
+import sys
 import yaml
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).parent))
+
+from keyword_classifier import KeywordClassifier
+
 logger = logging.getLogger(__name__)
 
 
 class ReportFormatter:
     """Formateador de reportes para tracking de keywords"""
     
-    # Volumen proxy basado en tipo de keyword (sin API)
-    VOLUME_PATTERNS = {
-        'brand': 500,        # "biblenow"
-        'generic_2w': 300,   # "bible chat"
-        'generic_3w': 150,   # "audio bible stories"
-        'long_tail': 50,     # "kids calming audio bible"
-        'very_long': 20      # >5 palabras
-    }
-    
     def __init__(self, max_kw_length: int = 30, config_path: str = 'config/config.yaml'):
         """
         Inicializar formateador
@@ -41,46 +37,17 @@ class ReportFormatter:
             with open(config_path, 'r', encoding='utf-8') as f:
                 self.config = yaml.safe_load(f)
             self.app_name = self.config['app']['name']
-            self.brand_keywords = self._detect_brand_keywords()
         except Exception as e:
             logger.warning(f"No se pudo cargar config: {e}")
             self.config = {}
             self.app_name = ""
-            self.brand_keywords = []
-    
-    def _detect_brand_keywords(self) -> List[str]:
-        """Detectar keywords de marca"""
-        if not self.app_name:
-            return []
-        app_name_lower = self.app_name.lower()
-        brand_words = app_name_lower.split()
-        return [kw for kw in self.config.get('keywords', []) 
-                if any(brand in kw.lower() for brand in brand_words)]
+        
+        # Marca y volumen proxy (vocabularios 'basic', memo persistente)
+        self.classifier = KeywordClassifier.from_config(self.config, profile='basic')
     
     def _estimate_volume(self, keyword: str) -> int:
         """Estimar volumen de búsqueda (proxy sin API)"""
-        kw_lower = keyword.lower()
-        word_count = len(kw_lower.split())
-        
-        # Brand keywords
-        if keyword in self.brand_keywords:
-            return self.VOLUME_PATTERNS['brand']
-        
-        # Long tail (5+ palabras)
-        if word_count >= 5:
-            return self.VOLUME_PATTERNS['very_long']
-        
-        # 3-4 palabras
-        if word_count >= 3:
-            return self.VOLUME_PATTERNS['long_tail']
-        
-        # Generic 2-3 palabras
-        # Boost si contiene términos populares
-        popular_terms = ['bible', 'audio', 'chat', 'stories', 'sleep', 'kids']
-        if any(term in kw_lower for term in popular_terms):
-            return self.VOLUME_PATTERNS['generic_3w']
-        
-        return self.VOLUME_PATTERNS['generic_2w']
+        return self.classifier.classify(keyword)['volume']
     
     def _calculate_difficulty(self, rank: int, volume: int) -> str:
         """Calcular dificultad estimada"""
@@ -185,6 +152,12 @@ class ReportFormatter:
         else:
             df_previous = pd.DataFrame()
         
+        # Volumen de todas las keywords en una pasada (una sola escritura de caché)
+        volumes = {
+            kw: record['volume']
+            for kw, record in zip(df_latest['keyword'], self.classifier.classify_many(df_latest['keyword']))
+        }
+        
         # Calcular cambios
         changes = []
         for _, row in df_latest.iterrows():
@@ -209,7 +182,7 @@ class ReportFormatter:
                         change = "="
             
             # Calcular volume y difficulty
-            volume = self._estimate_volume(keyword)
+            volume = volumes[keyword]
             difficulty = self._calculate_difficulty(current_rank, volume)
             
             changes.append({
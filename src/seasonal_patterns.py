@@ -15,26 +15,55 @@ import json
 
 logger = logging.getLogger(__name__)
 
+DAY_NAMES = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+MONTH_NAMES = ['', 'Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
+               'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre']
+
+# Umbrales de detección (filas mínimas por serie y diferencia mínima en posiciones)
+WEEKLY_MIN_ROWS = 14      # al menos 2 semanas
+WEEKLY_MIN_DIFF = 10
+MONTHLY_MIN_ROWS = 30     # al menos un mes
+MONTHLY_MIN_DIFF = 15
+TREND_MIN_POINTS = 5
+TREND_MIN_DIFF = 5
+
+# Estacionalidad espectral (periodograma sobre el cubo series × días)
+SPECTRAL_MAX_DAYS = 365        # ventana analizada (últimos N días)
+SPECTRAL_MIN_DAYS = 28         # días mínimos de ventana (2 ciclos de 14 días)
+SPECTRAL_MIN_COVERAGE = 0.6    # fracción mínima de días con dato por serie
+SPECTRAL_MIN_SIGNIFICANCE = 0.95
+SPECTRAL_MIN_AMPLITUDE = 2.0   # posiciones
+SUBHARMONIC_RATIO = 0.3        # potencia mínima de la fundamental frente al pico armónico
+
 
 class SeasonalPattern:
     """Representa un patrón estacional detectado"""
     
     def __init__(self, keyword: str, pattern_type: str, 
-                 description: str, confidence: float):
+                 description: str, confidence: float,
+                 country: Optional[str] = None):
         self.keyword = keyword
+        self.country = country
         self.pattern_type = pattern_type  # daily, weekly, monthly, yearly
         self.description = description
         self.confidence = confidence  # 0-1
         self.predictions = []
+        # Componente estacional ajustado (solo patrones espectrales):
+        # period_days, amplitude, significance, profile (desviación por fase) y anchor (fecha de fase 0)
+        self.seasonal = None
     
     def to_dict(self) -> Dict:
-        return {
+        data = {
             'keyword': self.keyword,
+            'country': self.country,
             'pattern_type': self.pattern_type,
             'description': self.description,
             'confidence': self.confidence,
             'predictions': self.predictions
         }
+        if self.seasonal is not None:
+            data['seasonal'] = self.seasonal
+        return data
 
 
 class SeasonalPatternsDetector:
@@ -57,14 +86,17 @@ class SeasonalPatternsDetector:
             try:
                 with open(self.patterns_file, 'r') as f:
                     data = json.load(f)
-                patterns = [
-                    SeasonalPattern(
+                patterns = []
+                for p in data:
+                    pattern = SeasonalPattern(
                         keyword=p['keyword'],
                         pattern_type=p['pattern_type'],
                         description=p['description'],
-                        confidence=p['confidence']
-                    ) for p in data
-                ]
+                        confidence=p['confidence'],
+                        country=p.get('country')
+                    )
+                    pattern.seasonal = p.get('seasonal')
+                    patterns.append(pattern)
                 logger.info(f"📂 Cargados {len(patterns)} patrones")
                 return patterns
             except Exception as e:
@@ -82,105 +114,381 @@ class SeasonalPatternsDetector:
         except Exception as e:
             logger.error(f"❌ Error guardando patrones: {e}")
     
-    def detect_weekly_patterns(self, df: pd.DataFrame, keyword: str) -> Optional[SeasonalPattern]:
+    # === ANÁLISIS VECTORIZADO (todas las series a la vez) ===
+    
+    @staticmethod
+    def _prepare(df: pd.DataFrame) -> pd.DataFrame:
+        """Parsear fechas y rankings una sola vez"""
+        df = df.copy()
+        df['date'] = pd.to_datetime(df['date'])
+        df['rank'] = pd.to_numeric(df['rank'], errors='coerce')
+        return df
+    
+    @staticmethod
+    def _series_keys(df: pd.DataFrame, by_country: bool) -> List[str]:
+        """Columnas que identifican una serie: (keyword, country) o solo keyword"""
+        if by_country and 'country' in df.columns:
+            return ['keyword', 'country']
+        return ['keyword']
+    
+    @staticmethod
+    def _series_labels(index: pd.Index, keys: List[str]) -> List[Tuple[str, Optional[str]]]:
+        """(keyword, country) de cada entrada de un índice agrupado por keys"""
+        if len(keys) == 2:
+            return [(keyword, country) for keyword, country in index]
+        return [(keyword, None) for keyword in index]
+    
+    def _period_extremes(self, df: pd.DataFrame, keys: List[str], period: pd.Series,
+                         min_rows: int, min_periods: int) -> pd.DataFrame:
         """
-        Detectar patrones semanales (ej: mejor en domingos)
+        Mejor y peor periodo (día de la semana, mes) de cada serie
+        
+        Un único groupby (serie, periodo) para todas las series.
         
         Args:
-            df: DataFrame con histórico de rankings
-            keyword: Keyword a analizar
+            df: Histórico preparado
+            keys: Columnas de serie
+            period: Periodo de cada fila (alineado con df)
+            min_rows: Filas mínimas de la serie
+            min_periods: Periodos distintos mínimos de la serie
         
         Returns:
-            SeasonalPattern si se detecta algo significativo
+            DataFrame por serie con best, best_mean, worst, worst_mean, diff
+        """
+        grouped = df.groupby(keys, sort=True)
+        sizes = grouped.size()
+        
+        means = df['rank'].groupby([df[k] for k in keys] + [period.rename('period')], sort=True) \
+            .mean().unstack('period')
+        periods_seen = period.groupby([df[k] for k in keys], sort=True).nunique()
+        
+        eligible = (sizes >= min_rows) & (periods_seen >= min_periods)
+        means = means[eligible.reindex(means.index, fill_value=False).to_numpy()]
+        
+        values = means.to_numpy(dtype=float)
+        has_data = ~np.isnan(values).all(axis=1)
+        means, values = means[has_data], values[has_data]
+        
+        if len(values) == 0:
+            return pd.DataFrame(columns=['best', 'best_mean', 'worst', 'worst_mean', 'diff'])
+        
+        columns = means.columns.to_numpy()
+        rows = np.arange(len(values))
+        best = np.nanargmin(values, axis=1)
+        worst = np.nanargmax(values, axis=1)
+        
+        return pd.DataFrame({
+            'best': columns[best].astype(int),
+            'best_mean': values[rows, best],
+            'worst': columns[worst].astype(int),
+            'worst_mean': values[rows, worst],
+            'diff': values[rows, worst] - values[rows, best],
+        }, index=means.index)
+    
+    def _weekly_patterns(self, df: pd.DataFrame, keys: List[str]) -> List[SeasonalPattern]:
+        """Patrones semanales de todas las series (mejor/peor día de la semana)"""
+        extremes = self._period_extremes(df, keys, df['date'].dt.dayofweek,
+                                         WEEKLY_MIN_ROWS, 7)
+        extremes = extremes[extremes['diff'] > WEEKLY_MIN_DIFF]
+        
+        return [
+            SeasonalPattern(
+                keyword=keyword,
+                pattern_type='weekly',
+                description=f"Mejor en {DAY_NAMES[row.best]} (avg #{row.best_mean:.1f}), "
+                           f"peor en {DAY_NAMES[row.worst]} (avg #{row.worst_mean:.1f})",
+                confidence=min(row.diff / 20, 1.0),  # Más diferencia = más confianza
+                country=country
+            )
+            for (keyword, country), row in zip(
+                self._series_labels(extremes.index, keys), extremes.itertuples()
+            )
+        ]
+    
+    def _monthly_patterns(self, df: pd.DataFrame, keys: List[str]) -> List[SeasonalPattern]:
+        """Patrones mensuales de todas las series (mejor/peor mes)"""
+        extremes = self._period_extremes(df, keys, df['date'].dt.month,
+                                         MONTHLY_MIN_ROWS, 2)
+        extremes = extremes[extremes['diff'] > MONTHLY_MIN_DIFF]
+        
+        return [
+            SeasonalPattern(
+                keyword=keyword,
+                pattern_type='monthly',
+                description=f"Mejor en {MONTH_NAMES[row.best]} (#{row.best_mean:.1f}), "
+                           f"peor en {MONTH_NAMES[row.worst]} (#{row.worst_mean:.1f})",
+                confidence=min(row.diff / 30, 1.0),
+                country=country
+            )
+            for (keyword, country), row in zip(
+                self._series_labels(extremes.index, keys), extremes.itertuples()
+            )
+        ]
+    
+    def _trends(self, df: pd.DataFrame, keys: List[str], days: int) -> List[Dict]:
         """
-        kw_data = df[df['keyword'] == keyword].copy()
+        Tendencia de todas las series: media de la primera mitad de los
+        últimos N días frente a la segunda mitad
+        """
+        sizes = df.groupby(keys, sort=True).size()
         
-        if len(kw_data) < 14:  # Necesitamos al menos 2 semanas
-            return None
+        cutoff = datetime.now() - timedelta(days=days)
+        recent = df[df['date'] >= cutoff].sort_values(keys + ['date'], kind='mergesort')
         
-        # Añadir día de la semana (0=Monday, 6=Sunday)
-        kw_data['day_of_week'] = pd.to_datetime(kw_data['date']).dt.dayofweek
-        kw_data['rank'] = pd.to_numeric(kw_data['rank'], errors='coerce')
+        grouped = recent.groupby(keys, sort=True)
+        position = grouped.cumcount().to_numpy()
+        count = grouped['date'].transform('size').to_numpy()
+        second_half = position >= count // 2
         
-        # Agrupar por día de la semana
-        weekly_avg = kw_data.groupby('day_of_week')['rank'].agg(['mean', 'count']).reset_index()
+        halves = recent['rank'].groupby(
+            [recent[k] for k in keys] + [pd.Series(second_half, index=recent.index, name='half')],
+            sort=True
+        ).mean().unstack('half')
         
-        if len(weekly_avg) < 7:  # No hay datos de todos los días
-            return None
+        points = grouped.size()
+        eligible = (points >= TREND_MIN_POINTS) & (sizes.reindex(points.index) >= days)
+        halves = halves[eligible.reindex(halves.index, fill_value=False).to_numpy()]
         
-        # Encontrar mejor y peor día
-        best_day = weekly_avg.loc[weekly_avg['mean'].idxmin()]
-        worst_day = weekly_avg.loc[weekly_avg['mean'].idxmax()]
+        if halves.empty or True not in halves.columns or False not in halves.columns:
+            return []
         
-        diff = worst_day['mean'] - best_day['mean']
+        diff = (halves[False] - halves[True]).dropna()  # Positivo = mejoró
+        diff = diff[diff.abs() > TREND_MIN_DIFF]
         
-        # Solo reportar si la diferencia es significativa (>10 posiciones)
-        if diff > 10:
-            day_names = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
-            
-            pattern = SeasonalPattern(
-                keyword=keyword,
-                pattern_type='weekly',
-                description=f"Mejor en {day_names[int(best_day['day_of_week'])]} (avg #{best_day['mean']:.1f}), "
-                           f"peor en {day_names[int(worst_day['day_of_week'])]} (avg #{worst_day['mean']:.1f})",
-                confidence=min(diff / 20, 1.0)  # Más diferencia = más confianza
-            )
+        trends = []
+        for (keyword, country), change in zip(self._series_labels(diff.index, keys), diff.tolist()):
+            if change > 0:
+                trend, emoji = 'improving', '📈'
+                desc = f"Tendencia alcista últimos {days}d (+{change:.1f} posiciones)"
+            else:
+                trend, emoji = 'declining', '📉'
+                desc = f"Tendencia bajista últimos {days}d ({change:.1f} posiciones)"
             
-            return pattern
+            trends.append({
+                'keyword': keyword,
+                'country': country,
+                'trend': trend,
+                'change': change,
+                'emoji': emoji,
+                'description': desc,
+                'confidence': min(abs(change) / 20, 1.0)
+            })
         
-        return None
+        return trends
     
-    def detect_monthly_patterns(self, df: pd.DataFrame, keyword: str) -> Optional[SeasonalPattern]:
+    def _rank_cube(self, df: pd.DataFrame, keys: List[str],
+                   max_days: int = SPECTRAL_MAX_DAYS):
         """
-        Detectar patrones mensuales (ej: mejor en diciembre)
+        Cubo de rankings diarios (series × días) con los huecos rellenados
         
-        Args:
-            df: DataFrame con histórico
-            keyword: Keyword a analizar
+        Media diaria por serie en los últimos max_days días; los días sin
+        dato se interpolan linealmente (bordes: valor más cercano). Se
+        descartan las series con menos de SPECTRAL_MIN_COVERAGE de días reales.
         
         Returns:
-            SeasonalPattern si se detecta
+            (índice de series, días, cubo float) o None si la ventana es corta
         """
-        kw_data = df[df['keyword'] == keyword].copy()
-        
-        if len(kw_data) < 30:  # Necesitamos al menos un mes
+        daily = df.dropna(subset=['rank'])
+        if daily.empty:
             return None
         
-        # Añadir mes
-        kw_data['month'] = pd.to_datetime(kw_data['date']).dt.month
-        kw_data['rank'] = pd.to_numeric(kw_data['rank'], errors='coerce')
+        day = daily['date'].dt.normalize()
+        days = pd.date_range(max(day.min(), day.max() - pd.Timedelta(days=max_days - 1)),
+                             day.max(), freq='D')
+        if len(days) < SPECTRAL_MIN_DAYS:
+            return None
         
-        # Agrupar por mes
-        monthly_avg = kw_data.groupby('month')['rank'].agg(['mean', 'count']).reset_index()
+        in_window = (day >= days[0]).to_numpy()
+        daily = daily[in_window]
+        cube = daily['rank'].groupby([daily[k] for k in keys] + [day[in_window].rename('day')]) \
+            .mean().unstack('day').reindex(columns=days)
         
-        if len(monthly_avg) < 2:  # Necesitamos al menos 2 meses
+        coverage = cube.notna().to_numpy().mean(axis=1)
+        cube = cube[coverage >= SPECTRAL_MIN_COVERAGE]
+        if cube.empty:
             return None
         
-        # Encontrar mejor y peor mes
-        best_month = monthly_avg.loc[monthly_avg['mean'].idxmin()]
-        worst_month = monthly_avg.loc[monthly_avg['mean'].idxmax()]
+        filled = cube.interpolate(axis=1, limit_direction='both')
+        return cube.index, days, filled.to_numpy(dtype=float)
+    
+    @staticmethod
+    def _periodogram(cube: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Periodo dominante de cada serie del cubo (FFT de todas a la vez)
+        
+        Cada serie se detrenda (recta por mínimos cuadrados) y se buscan
+        periodos entre 2 días y la mitad de la ventana. La significancia es
+        1 - p del test g de Fisher (potencia del pico / potencia total).
         
-        diff = worst_month['mean'] - best_month['mean']
+        Returns:
+            period, amplitude (posiciones), significance y detrended por serie
+        """
+        n = cube.shape[1]
+        t = np.arange(n) - (n - 1) / 2
+        centered = cube - cube.mean(axis=1, keepdims=True)
+        slope = centered @ t / (t @ t)
+        detrended = centered - slope[:, None] * t
+        
+        spectrum = np.fft.rfft(detrended, axis=1)
+        full_power = np.abs(spectrum) ** 2
+        
+        # Frecuencias k = 2..n/2 (periodos de n/2 a 2 días; k=1 es la propia ventana)
+        band = np.arange(2, n // 2 + 1)
+        power = full_power[:, band]
+        
+        total = full_power[:, 1:n // 2 + 1].sum(axis=1)
+        peak = power.argmax(axis=1)
+        rows = np.arange(len(cube))
+        
+        # Un ciclo no sinusoidal (p.ej. fines de semana) tiene armónicos: si
+        # el pico es un armónico (7/2 días) y la fundamental (7 días) tiene
+        # potencia comparable, se usa la fundamental
+        for divisor in (3, 2):
+            k = np.rint(band[peak] / divisor).astype(int)
+            candidate = np.clip(k - band[0], 0, len(band) - 1)
+            # La fundamental puede caer entre dos bins (ventana no múltiplo del periodo)
+            for shift in (-1, 1):
+                neighbour = np.clip(candidate + shift, 0, len(band) - 1)
+                better = power[rows, neighbour] > power[rows, candidate]
+                candidate = np.where(better, neighbour, candidate)
+            is_fundamental = (k >= band[0]) & \
+                (power[rows, candidate] >= SUBHARMONIC_RATIO * power[rows, peak])
+            peak = np.where(is_fundamental, candidate, peak)
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            g = power[rows, peak] / total
+            m = len(band)
+            p_value = np.minimum(1.0, m * (1 - g) ** (m - 1))
         
-        # Solo si diferencia significativa (>15 posiciones)
-        if diff > 15:
-            month_names = ['', 'Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
-                          'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre']
+        return {
+            'period': n / band[peak],
+            'amplitude': 2 * np.abs(spectrum[rows, band[peak]]) / n,
+            'significance': np.nan_to_num(1 - p_value, nan=0.0),
+            'detrended': detrended,
+        }
+    
+    @staticmethod
+    def _seasonal_profiles(detrended: np.ndarray, periods: np.ndarray) -> List[np.ndarray]:
+        """
+        Componente estacional de cada serie: media por fase del periodo
+        (entero) sobre la serie detrendada, centrada en 0
+        
+        Las series con el mismo periodo se calculan juntas (producto matricial
+        por la matriz de fases one-hot).
+        """
+        n = detrended.shape[1]
+        profiles = [None] * len(periods)
+        
+        for period in np.unique(periods):
+            rows = np.flatnonzero(periods == period)
+            phases = np.arange(n) % period
+            onehot = np.eye(period)[phases]
+            means = detrended[rows] @ onehot / onehot.sum(axis=0)
+            means -= means.mean(axis=1, keepdims=True)
+            for row, profile in zip(rows, means):
+                profiles[row] = profile
+        
+        return profiles
+    
+    def _spectral_patterns(self, df: pd.DataFrame, keys: List[str]) -> List[SeasonalPattern]:
+        """
+        Estacionalidad espectral de todas las series: periodo dominante,
+        amplitud, significancia y componente estacional ajustado
+        """
+        cube = self._rank_cube(df, keys)
+        if cube is None:
+            return []
+        
+        index, days, values = cube
+        spectral = self._periodogram(values)
+        
+        significant = (spectral['significance'] >= SPECTRAL_MIN_SIGNIFICANCE) & \
+                      (spectral['amplitude'] >= SPECTRAL_MIN_AMPLITUDE)
+        rows = np.flatnonzero(significant)
+        if len(rows) == 0:
+            return []
+        
+        periods = np.maximum(2, np.rint(spectral['period'][rows]).astype(int))
+        profiles = self._seasonal_profiles(spectral['detrended'][rows], periods)
+        labels = self._series_labels(index[rows], keys)
+        
+        patterns = []
+        for (keyword, country), row, period, profile in zip(labels, rows, periods, profiles):
+            amplitude = float(spectral['amplitude'][row])
+            significance = float(spectral['significance'][row])
             
             pattern = SeasonalPattern(
                 keyword=keyword,
-                pattern_type='monthly',
-                description=f"Mejor en {month_names[int(best_month['month'])]} (#{best_month['mean']:.1f}), "
-                           f"peor en {month_names[int(worst_month['month'])]} (#{worst_month['mean']:.1f})",
-                confidence=min(diff / 30, 1.0)
+                pattern_type='spectral',
+                description=f"Ciclo de ~{spectral['period'][row]:.1f} días "
+                           f"(±{amplitude:.1f} posiciones)",
+                confidence=round(significance, 3),
+                country=country
             )
-            
-            return pattern
+            pattern.seasonal = {
+                'period_days': round(float(spectral['period'][row]), 2),
+                'amplitude': round(amplitude, 2),
+                'significance': round(significance, 4),
+                'profile': [round(float(v), 2) for v in profile],
+                'anchor': days[0].date().isoformat(),
+            }
+            patterns.append(pattern)
         
+        patterns.sort(key=lambda p: p.seasonal['significance'], reverse=True)
+        return patterns
+    
+    # === ANÁLISIS DE UNA KEYWORD ===
+    
+    def _keyword_data(self, df: pd.DataFrame, keyword: str,
+                      country: Optional[str]) -> Tuple[pd.DataFrame, List[str]]:
+        """Filas de una keyword (y país si se indica) ya preparadas"""
+        mask = df['keyword'] == keyword
+        if country is not None:
+            mask &= df['country'] == country
+        return self._prepare(df[mask]), ['keyword']
+    
+    def detect_weekly_patterns(self, df: pd.DataFrame, keyword: str,
+                               country: Optional[str] = None) -> Optional[SeasonalPattern]:
+        """
+        Detectar patrones semanales (ej: mejor en domingos)
+        
+        Args:
+            df: DataFrame con histórico de rankings
+            keyword: Keyword a analizar
+            country: Limitar a un país (None = todos juntos)
+        
+        Returns:
+            SeasonalPattern si se detecta algo significativo
+        """
+        kw_data, keys = self._keyword_data(df, keyword, country)
+        patterns = self._weekly_patterns(kw_data, keys)
+        if patterns:
+            patterns[0].country = country
+            return patterns[0]
+        return None
+    
+    def detect_monthly_patterns(self, df: pd.DataFrame, keyword: str,
+                                country: Optional[str] = None) -> Optional[SeasonalPattern]:
+        """
+        Detectar patrones mensuales (ej: mejor en diciembre)
+        
+        Args:
+            df: DataFrame con histórico
+            keyword: Keyword a analizar
+            country: Limitar a un país (None = todos juntos)
+        
+        Returns:
+            SeasonalPattern si se detecta
+        """
+        kw_data, keys = self._keyword_data(df, keyword, country)
+        patterns = self._monthly_patterns(kw_data, keys)
+        if patterns:
+            patterns[0].country = country
+            return patterns[0]
         return None
     
     def detect_trend_direction(self, df: pd.DataFrame, keyword: str, 
-                             days: int = 14) -> Optional[Dict]:
+                             days: int = 14, country: Optional[str] = None) -> Optional[Dict]:
         """
         Detectar tendencia direccional (subiendo/bajando)
         
@@ -188,101 +496,91 @@ class SeasonalPatternsDetector:
             df: DataFrame con histórico
             keyword: Keyword a analizar
             days: Número de días a analizar
+            country: Limitar a un país (None = todos juntos)
         
         Returns:
             Dict con tendencia detectada
         """
-        kw_data = df[df['keyword'] == keyword].copy()
-        
-        if len(kw_data) < days:
-            return None
-        
-        # Últimos N días
-        cutoff = datetime.now() - timedelta(days=days)
-        recent = kw_data[pd.to_datetime(kw_data['date']) >= cutoff].sort_values('date')
-        
-        if len(recent) < 5:
-            return None
-        
-        recent['rank'] = pd.to_numeric(recent['rank'], errors='coerce')
-        
-        # Calcular tendencia simple (comparar primera mitad vs segunda mitad)
-        mid = len(recent) // 2
-        first_half_avg = recent.iloc[:mid]['rank'].mean()
-        second_half_avg = recent.iloc[mid:]['rank'].mean()
-        
-        diff = first_half_avg - second_half_avg  # Positivo = mejoró
-        
-        if abs(diff) > 5:  # Cambio significativo
-            if diff > 0:
-                trend = 'improving'
-                emoji = '📈'
-                desc = f"Tendencia alcista últimos {days}d (+{diff:.1f} posiciones)"
-            else:
-                trend = 'declining'
-                emoji = '📉'
-                desc = f"Tendencia bajista últimos {days}d ({diff:.1f} posiciones)"
-            
-            return {
-                'keyword': keyword,
-                'trend': trend,
-                'change': diff,
-                'emoji': emoji,
-                'description': desc,
-                'confidence': min(abs(diff) / 20, 1.0)
-            }
-        
+        kw_data, keys = self._keyword_data(df, keyword, country)
+        trends = self._trends(kw_data, keys, days)
+        if trends:
+            trends[0]['country'] = country
+            return trends[0]
         return None
     
-    def predict_next_movement(self, df: pd.DataFrame, keyword: str) -> Optional[Dict]:
+    def predict_next_movement(self, df: pd.DataFrame, keyword: str,
+                              country: Optional[str] = None) -> Optional[Dict]:
         """
         Predecir próximo movimiento basado en patrones históricos
         
         Args:
             df: DataFrame con histórico
             keyword: Keyword a predecir
+            country: País de la serie (None = cualquiera)
         
         Returns:
             Dict con predicción
         """
-        # Buscar patrón conocido
+        # Buscar componente estacional ajustado (los patrones antiguos no tienen país)
         known_pattern = next((p for p in self.known_patterns 
-                            if p.keyword == keyword), None)
+                            if p.keyword == keyword and p.seasonal
+                            and (country is None or p.country in (None, country))), None)
         
         if not known_pattern:
             return None
         
-        now = datetime.now()
-        
-        # Predicción basada en tipo de patrón
-        if known_pattern.pattern_type == 'weekly':
-            # Predecir basado en día de la semana
-            current_day = now.weekday()
-            
-            # Simplificado: si conocemos que es mejor en domingo (6)
-            # TODO: Mejorar con datos reales del patrón
-            if current_day < 6:
-                days_to_sunday = 6 - current_day
-                return {
-                    'keyword': keyword,
-                    'prediction': f"Posible mejora en {days_to_sunday} días (domingo)",
-                    'confidence': known_pattern.confidence,
-                    'type': 'weekly_pattern'
-                }
-        
-        elif known_pattern.pattern_type == 'monthly':
-            # Predecir basado en mes
-            # TODO: Implementar predicción mensual
-            pass
+        return self._predict_from_pattern(known_pattern, country)
+    
+    def _predict_from_pattern(self, pattern: SeasonalPattern,
+                              country: Optional[str] = None) -> Optional[Dict]:
+        """Próximo máximo/mínimo del componente estacional de un patrón"""
+        seasonal = pattern.seasonal
+        profile = np.asarray(seasonal['profile'])
+        period = len(profile)
+        
+        # Fase de hoy dentro del ciclo y valor del componente los próximos días
+        today = pd.Timestamp(datetime.now().date())
+        phase = (today - pd.Timestamp(seasonal['anchor'])).days % period
+        ahead = profile[(phase + np.arange(1, period + 1)) % period]
+        
+        # Rank menor = mejor: el mínimo del componente es el mejor momento
+        days_to_best = int(ahead.argmin()) + 1
+        days_to_worst = int(ahead.argmax()) + 1
+        
+        if days_to_best <= days_to_worst:
+            change = profile[phase] - ahead[days_to_best - 1]
+            target = today + timedelta(days=days_to_best)
+            prediction = f"Posible mejora de ~{change:.0f} posiciones en {days_to_best} días ({DAY_NAMES[target.weekday()]})"
+        else:
+            change = profile[phase] - ahead[days_to_worst - 1]
+            target = today + timedelta(days=days_to_worst)
+            prediction = f"Posible caída de ~{abs(change):.0f} posiciones en {days_to_worst} días ({DAY_NAMES[target.weekday()]})"
+        
+        if abs(change) < 1:
+            return None
         
-        return None
+        return {
+            'keyword': pattern.keyword,
+            'country': country or pattern.country,
+            'prediction': prediction,
+            'expected_change': round(float(change), 1),  # Positivo = mejora
+            'days_ahead': (target - today).days,
+            'period_days': seasonal['period_days'],
+            'confidence': pattern.confidence,
+            'type': 'seasonal_component'
+        }
     
-    def analyze_all_keywords(self, min_history_days: int = 14) -> Dict:
+    def analyze_all_keywords(self, min_history_days: int = 14,
+                             by_country: bool = True) -> Dict:
         """
         Analizar todos los keywords buscando patrones
         
+        El CSV se lee y se parsea una vez; patrones y tendencias se calculan
+        para todas las series con groupby (sin filtrar el histórico por keyword).
+        
         Args:
             min_history_days: Días mínimos de histórico necesarios
+            by_country: Analizar cada (keyword, país) por separado
         
         Returns:
             Resumen de patrones detectados
@@ -292,61 +590,54 @@ class SeasonalPatternsDetector:
         
         logger.info("🔍 Analizando patrones estacionales...")
         
-        df = pd.read_csv(self.ranks_file)
-        df['date'] = pd.to_datetime(df['date'])
+        df = self._prepare(pd.read_csv(self.ranks_file))
+        keys = self._series_keys(df, by_country)
         
-        # Filtrar keywords con suficiente histórico
+        # Series con datos recientes (el resto no se analiza)
         cutoff = datetime.now() - timedelta(days=min_history_days)
-        recent = df[df['date'] >= cutoff]
+        recent_series = pd.MultiIndex.from_frame(df.loc[df['date'] >= cutoff, keys]).unique()
+        df = df[pd.MultiIndex.from_frame(df[keys]).isin(recent_series)]
         
-        keywords = recent['keyword'].unique()
-        
-        weekly_patterns = []
-        monthly_patterns = []
-        trends = []
-        predictions = []
-        
-        for keyword in keywords:
-            # Patrones semanales
-            weekly = self.detect_weekly_patterns(df, keyword)
-            if weekly:
-                weekly_patterns.append(weekly)
-            
-            # Patrones mensuales (solo si hay suficiente data)
-            if len(df[df['keyword'] == keyword]) >= 30:
-                monthly = self.detect_monthly_patterns(df, keyword)
-                if monthly:
-                    monthly_patterns.append(monthly)
-            
-            # Tendencias
-            trend = self.detect_trend_direction(df, keyword, days=14)
-            if trend:
-                trends.append(trend)
-            
-            # Predicciones (basadas en patrones conocidos)
-            prediction = self.predict_next_movement(df, keyword)
-            if prediction:
-                predictions.append(prediction)
+        weekly_patterns = self._weekly_patterns(df, keys)
+        monthly_patterns = self._monthly_patterns(df, keys)
+        spectral_patterns = self._spectral_patterns(df, keys)
+        trends = self._trends(df, keys, days=14)
         
         # Guardar nuevos patrones
-        new_patterns = weekly_patterns + monthly_patterns
+        new_patterns = weekly_patterns + monthly_patterns + spectral_patterns
         if new_patterns:
             self.known_patterns = new_patterns
             self._save_patterns()
         
+        # Predicciones (componente estacional ajustado de cada ciclo)
+        predictions = []
+        for pattern in spectral_patterns:
+            prediction = self._predict_from_pattern(pattern)
+            if prediction:
+                predictions.append(prediction)
+        
         summary = {
-            'analyzed_keywords': len(keywords),
+            'analyzed_keywords': df['keyword'].nunique(),
+            'analyzed_series': len(recent_series),
+            'by_country': len(keys) == 2,
             'weekly_patterns': [p.to_dict() for p in weekly_patterns],
             'monthly_patterns': [p.to_dict() for p in monthly_patterns],
+            'seasonality': [p.to_dict() for p in spectral_patterns],
             'trends': trends,
             'predictions': predictions
         }
         
         logger.info(f"✅ Análisis completado: {len(weekly_patterns)} patrones semanales, "
-                   f"{len(monthly_patterns)} mensuales, {len(trends)} tendencias")
+                   f"{len(monthly_patterns)} mensuales, {len(spectral_patterns)} ciclos, "
+                   f"{len(trends)} tendencias "
+                   f"({len(recent_series)} series)")
         
         return summary
     
+    @staticmethod
+    def _country_label(item: Dict) -> str:
+        return f" ({item['country']})" if item.get('country') else ""
+    
     def format_patterns_report(self, analysis: Dict) -> str:
         """Formatear reporte de patrones para Telegram"""
         msg = "📅 *SEASONAL PATTERNS REPORT*\n\n"
@@ -362,12 +653,12 @@ class SeasonalPatternsDetector:
             if improving:
                 msg += f"\n🟢 Mejorando ({len(improving)}):\n"
                 for t in improving[:5]:
-                    msg += f"  • `{t['keyword']}`: {t['description']}\n"
+                    msg += f"  • `{t['keyword']}`{self._country_label(t)}: {t['description']}\n"
             
             if declining:
                 msg += f"\n🔴 Declinando ({len(declining)}):\n"
                 for t in declining[:5]:
-                    msg += f"  • `{t['keyword']}`: {t['description']}\n"
+                    msg += f"  • `{t['keyword']}`{self._country_label(t)}: {t['description']}\n"
             
             msg += "\n"
         
@@ -376,7 +667,7 @@ class SeasonalPatternsDetector:
         if weekly:
             msg += f"📆 *PATRONES SEMANALES:* ({len(weekly)} detectados)\n"
             for p in weekly[:3]:
-                msg += f"  • `{p['keyword']}`\n"
+                msg += f"  • `{p['keyword']}`{self._country_label(p)}\n"
                 msg += f"    {p['description']}\n"
             msg += "\n"
         
@@ -385,10 +676,19 @@ class SeasonalPatternsDetector:
         if monthly:
             msg += f"📅 *PATRONES MENSUALES:* ({len(monthly)} detectados)\n"
             for p in monthly[:3]:
-                msg += f"  • `{p['keyword']}`\n"
+                msg += f"  • `{p['keyword']}`{self._country_label(p)}\n"
                 msg += f"    {p['description']}\n"
             msg += "\n"
         
+        # Ciclos (estacionalidad espectral)
+        seasonality = analysis.get('seasonality', [])
+        if seasonality:
+            msg += f"🌊 *CICLOS DETECTADOS:* ({len(seasonality)})\n"
+            for p in seasonality[:3]:
+                msg += f"  • `{p['keyword']}`{self._country_label(p)}\n"
+                msg += f"    {p['description']}, confianza {p['confidence']:.0%}\n"
+            msg += "\n"
+        
         # Predicciones
         predictions = analysis.get('predictions', [])
         if predictions:
@@ -397,7 +697,7 @@ class SeasonalPatternsDetector:
                 msg += f"  • {pred['prediction']}\n"
             msg += "\n"
         
-        if not trends and not weekly and not monthly:
+        if not trends and not weekly and not monthly and not seasonality:
             msg += "ℹ️ No hay patrones significativos detectados aún.\n"
             msg += "Necesitas más histórico (recomendado: 30+ días)\n"
         
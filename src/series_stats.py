@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Estadísticas por serie (keyword, país) del histórico de rankings
+Media, desviación, mínimo, máximo y pendiente móviles + EWMA en una pasada agrupada
+"""
+
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Ventanas móviles por defecto (días) y span de la media exponencial
+DEFAULT_WINDOWS = (7, 30)
+DEFAULT_EWMA_SPAN = 7
+
+SERIES_KEYS = ['keyword', 'country']
+
+# Versiones calculadas que se conservan en memoria
+KEEP_VERSIONS = 2
+
+
+def _plain(value):
+    """Valor serializable (NaN -> None, fechas ISO, floats redondeados)"""
+    if pd.isna(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        value = value.item()
+    return round(value, 2) if isinstance(value, float) else value
+
+
+def _window_stats(values: np.ndarray, x: np.ndarray, start: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Estadísticas de ventanas variables [start[i], i] de todos los puntos a la vez
+
+    Se recorre por desfase (0, 1, ... tamaño máximo de ventana) en vez de por
+    punto, así cada paso es una operación numpy sobre todo el histórico. Dos
+    pasadas (medias, luego sumas centradas) para que la desviación y la
+    pendiente no pierdan precisión.
+
+    Args:
+        values: Ranks (NaN = sin dato)
+        x: Tiempo en días de cada punto
+        start: Índice del primer punto de la ventana de cada punto
+
+    Returns:
+        {'mean', 'std', 'min', 'max', 'slope'} con un valor por punto
+    """
+    index = np.arange(len(values))
+    span = int((index - start).max(initial=-1)) + 1
+
+    def lagged(lag):
+        source = index - lag
+        valid = source >= start
+        source = np.where(valid, source, 0)
+        y = np.where(valid, values[source], np.nan)
+        return y, x[source], ~np.isnan(y)
+
+    count = np.zeros(len(values))
+    sum_y = np.zeros(len(values))
+    sum_x = np.zeros(len(values))
+    low = np.full(len(values), np.nan)
+    high = np.full(len(values), np.nan)
+
+    for lag in range(span):
+        y, lag_x, present = lagged(lag)
+        count += present
+        sum_y += np.where(present, y, 0)
+        sum_x += np.where(present, lag_x, 0)
+        low = np.fmin(low, y)
+        high = np.fmax(high, y)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_y = sum_y / count
+        mean_x = sum_x / count
+
+        sum_yy = np.zeros(len(values))
+        sum_xy = np.zeros(len(values))
+        sum_xx = np.zeros(len(values))
+        for lag in range(span):
+            y, lag_x, present = lagged(lag)
+            dy = np.where(present, y - mean_y, 0)
+            dx = np.where(present, lag_x - mean_x, 0)
+            sum_yy += dy * dy
+            sum_xy += dx * dy
+            sum_xx += dx * dx
+
+        std = np.sqrt(sum_yy / (count - 1))
+        # Posiciones por día (negativo = mejorando); hacen falta 2 días con rank
+        slope = sum_xy / sum_xx
+
+    return {
+        'mean': np.where(count > 0, mean_y, np.nan),
+        'std': np.where(count > 1, std, np.nan),
+        'min': low,
+        'max': high,
+        'slope': np.where((count > 1) & (sum_xx > 0), slope, np.nan),
+    }
+
+
+class SeriesStats:
+    """
+    Resultado de una versión de datos
+
+    Attributes:
+        daily: Un punto por serie y día (último rank del día) con las
+               columnas móviles (mean_7d, std_7d, min_7d, max_7d, slope_7d, ..., ewma)
+        latest: Última fila de cada serie (índice keyword, country) con las
+                columnas móviles + best_rank, worst_rank, avg_rank, volatility,
+                data_points, first_rank/first_tracked y last_rank/last_ranked
+                (primer/último punto con rank)
+    """
+
+    def __init__(self, daily: pd.DataFrame, latest: pd.DataFrame, windows: Sequence[int]):
+        self.daily = daily
+        self.latest = latest
+        self.windows = tuple(windows)
+
+    def series(self, keyword: str, country: Optional[str] = None,
+               case_insensitive: bool = False) -> pd.DataFrame:
+        """Puntos diarios de una keyword (de un país o de todos)"""
+        keywords = self.daily['keyword']
+        if case_insensitive:
+            mask = keywords.str.lower() == keyword.lower()
+        else:
+            mask = keywords == keyword
+        if country is not None:
+            mask &= self.daily['country'] == country
+        return self.daily[mask]
+
+    def summary(self, keyword: str, country: str) -> Optional[Dict]:
+        """Estadísticas actuales de una serie como dict plano (None si no existe)"""
+        try:
+            row = self.latest.loc[(keyword, country)]
+        except KeyError:
+            return None
+        return {key: _plain(value) for key, value in row.items()}
+
+
+class SeriesStatsEngine:
+    """
+    Motor de estadísticas por serie, cacheado por versión de datos
+
+    Todas las series se calculan a la vez sobre el histórico ordenado una
+    sola vez: el inicio de cada ventana temporal sale de una búsqueda binaria
+    (searchsorted) sobre una clave serie+tiempo, y media, desviación, min/max
+    y pendiente (mínimos cuadrados) de un bucle numpy por desfase dentro de
+    la ventana (ver _window_stats()). La EWMA es groupby().ewm() de pandas.
+    Sin bucles por serie.
+    """
+
+    def __init__(self, windows: Sequence[int] = DEFAULT_WINDOWS,
+                 ewma_span: int = DEFAULT_EWMA_SPAN, max_rank: Optional[int] = None):
+        """
+        Args:
+            windows: Ventanas móviles en días
+            ewma_span: Span (días) de la media exponencial
+            max_rank: Ranks >= max_rank se tratan como sin dato (p.ej. 250 = no visible)
+        """
+        self.windows = tuple(sorted(set(int(w) for w in windows)))
+        self.ewma_span = ewma_span
+        self.max_rank = max_rank
+        self._cache: Dict = {}
+
+    @classmethod
+    def from_config(cls, config: dict, **kwargs) -> 'SeriesStatsEngine':
+        """Crear el motor con las ventanas de config.yaml (sección stats, opcional)"""
+        stats_config = (config or {}).get('stats', {})
+        return cls(
+            windows=stats_config.get('windows', DEFAULT_WINDOWS),
+            ewma_span=stats_config.get('ewma_span', DEFAULT_EWMA_SPAN),
+            **kwargs
+        )
+
+    # === CACHÉ POR VERSIÓN ===
+
+    @staticmethod
+    def fingerprint(df: pd.DataFrame) -> str:
+        """Versión de un DataFrame sin versión externa (hash de su contenido)"""
+        hashed = pd.util.hash_pandas_object(df, index=False).to_numpy()
+        return hashlib.sha1(hashed.tobytes()).hexdigest()
+
+    @staticmethod
+    def file_version(path: Path):
+        """Versión de un CSV: (ruta, mtime_ns, tamaño)"""
+        stat = Path(path).stat()
+        return (str(path), stat.st_mtime_ns, stat.st_size)
+
+    def get(self, df: pd.DataFrame, version=None, date_column: str = 'date') -> SeriesStats:
+        """
+        Estadísticas de un histórico (se calculan una vez por versión)
+
+        Args:
+            df: Histórico (date/timestamp, keyword, country, rank)
+            version: Versión de los datos (None = hash del contenido)
+            date_column: Columna de fecha del DataFrame
+        """
+        if version is None:
+            version = self.fingerprint(df)
+
+        stats = self._cache.get(version)
+        if stats is None:
+            stats = self.compute(df, date_column)
+            if len(self._cache) >= KEEP_VERSIONS:
+                self._cache.pop(next(iter(self._cache)))
+            self._cache[version] = stats
+        return stats
+
+    def get_file(self, path: Path) -> SeriesStats:
+        """Estadísticas de un CSV de rankings (solo se relee si cambia)"""
+        version = self.file_version(path)
+        stats = self._cache.get(version)
+        if stats is None:
+            stats = self.get(pd.read_csv(path), version)
+        return stats
+
+    # === CÁLCULO ===
+
+    def _daily(self, df: pd.DataFrame, date_column: str) -> pd.DataFrame:
+        """Un punto por serie y día (último del día), ordenado por serie y fecha"""
+        daily = pd.DataFrame({
+            'date': pd.to_datetime(df[date_column]),
+            'keyword': df['keyword'],
+            'country': df['country'] if 'country' in df.columns else 'US',
+            'rank': pd.to_numeric(df['rank'], errors='coerce'),
+        }).dropna(subset=['keyword', 'country', 'date'])
+
+        if self.max_rank is not None:
+            daily.loc[daily['rank'] >= self.max_rank, 'rank'] = np.nan
+
+        daily['day'] = daily['date'].dt.normalize()
+        daily = daily.sort_values(SERIES_KEYS + ['date'], kind='mergesort')
+        daily = daily.drop_duplicates(subset=SERIES_KEYS + ['day'], keep='last')
+        return daily.drop(columns='day').reset_index(drop=True)
+
+    def compute(self, df: pd.DataFrame, date_column: str = 'date') -> SeriesStats:
+        """
+        Calcular las estadísticas de todas las series
+
+        Returns:
+            SeriesStats con los puntos diarios y el resumen por serie
+        """
+        daily = self._daily(df, date_column)
+        columns = {}
+
+        # Inicio de cada serie (daily está ordenado por serie y fecha)
+        keys = daily[SERIES_KEYS]
+        first = (keys != keys.shift()).any(axis=1).to_numpy()
+        series_id = np.cumsum(first) - 1
+        series_start = np.flatnonzero(first)
+
+        # Segundos desde el primer punto de la serie (x de la pendiente)
+        seconds = daily['date'].to_numpy().astype('datetime64[s]').astype(np.int64)
+        offset = seconds - seconds[series_start][series_id]
+        ranks = daily['rank'].to_numpy(dtype=float)
+        days = offset / 86400
+
+        # Clave ordenada serie+tiempo: una búsqueda binaria da el inicio de
+        # todas las ventanas sin salir de la serie
+        stride = int(offset.max(initial=0)) + max(self.windows, default=0) * 86400 + 1
+        key = series_id.astype(np.int64) * stride + offset
+
+        for window in self.windows:
+            # Ventana temporal (t - window días, t], como rolling('7D') de pandas
+            start = np.searchsorted(key, key - window * 86400, side='right')
+            stats = _window_stats(ranks, days, start)
+            for name, values in stats.items():
+                columns[f'{name}_{window}d'] = values
+
+        columns['ewma'] = daily.groupby(SERIES_KEYS, sort=True)['rank'] \
+            .ewm(span=self.ewma_span, ignore_na=True).mean().to_numpy()
+
+        daily = daily.assign(**columns)
+        latest = self._summarize(daily)
+        logger.info(f"📐 Estadísticas calculadas: {len(latest)} series, {len(daily)} puntos diarios")
+        return SeriesStats(daily, latest, self.windows)
+
+    @staticmethod
+    def _summarize(daily: pd.DataFrame) -> pd.DataFrame:
+        """Última fila de cada serie + agregados de todo el histórico"""
+        grouped = daily.groupby(SERIES_KEYS, sort=True)
+
+        latest = grouped.tail(1).set_index(SERIES_KEYS)
+        latest = latest.rename(columns={'rank': 'current_rank', 'date': 'last_tracked'})
+
+        overall = grouped['rank'].agg(
+            best_rank='min', worst_rank='max', avg_rank='mean', volatility='std',
+            data_points='count'
+        )
+        # Primer y último punto con rank (los ranks descartados por max_rank no cuentan)
+        ranked_dates = daily['date'].where(daily['rank'].notna()).groupby(
+            [daily[key] for key in SERIES_KEYS], sort=True
+        )
+        overall['first_rank'] = grouped['rank'].first()
+        overall['first_tracked'] = ranked_dates.first()
+        overall['last_rank'] = grouped['rank'].last()
+        overall['last_ranked'] = ranked_dates.last()
+
+        return latest.join(overall)
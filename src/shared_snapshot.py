@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Snapshot compartido entre workers de uvicorn
+Arrays tipados en ficheros .npy mapeados en memoria + respuestas precalculadas
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Lock entre procesos para que solo un worker construya el snapshot (POSIX)
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+    logger.info("ℹ️ fcntl no disponible, snapshots sin lock entre procesos")
+
+META_FILE = "meta.json"
+
+# Formato en disco (entra en el nombre del directorio: cambiarlo invalida snapshots)
+SNAPSHOT_FORMAT = 2
+
+# Versiones que se conservan en disco (la anterior puede seguir mapeada)
+KEEP_VERSIONS = 2
+
+
+class SharedSnapshot:
+    """
+    Caché en disco de un DataFrame y de sus respuestas, compartida por procesos
+
+    Cada versión de datos vive en su propio directorio:
+
+    - columnas numéricas/fecha: un .npy por columna, abierto con mmap_mode='r'
+      (las páginas están una sola vez en la page cache del sistema, da igual
+      cuántos workers las lean)
+    - columnas de texto: códigos int32 mapeados + diccionario en meta.json
+      (se leen como pd.Categorical, sin un objeto Python por fila)
+    - responses/: payloads ya construidos, uno por (endpoint, params)
+
+    Un único proceso construye cada versión (flock); el directorio se
+    publica con un rename atómico, así que los lectores nunca ven un
+    snapshot a medias y no necesitan lock.
+    """
+
+    def __init__(self, root: Path):
+        """
+        Args:
+            root: Directorio donde se guardan los snapshots
+        """
+        self.root = Path(root)
+
+    def _version_dir(self, version) -> Path:
+        digest = hashlib.sha1(repr((SNAPSHOT_FORMAT, version)).encode('utf-8')).hexdigest()[:16]
+        return self.root / digest
+
+    @contextmanager
+    def _build_lock(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        if not FCNTL_AVAILABLE:
+            yield
+            return
+
+        with open(self.root / ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load_frame(self, version, build: Callable[[], pd.DataFrame],
+                   derived: str = None) -> pd.DataFrame:
+        """
+        Obtener el DataFrame de una versión, construyendo el snapshot si falta
+
+        Bloqueante: ejecutar en threadpool.
+
+        Args:
+            version: Versión de datos (debe identificar también el origen)
+            build: Función que lee y tipa los datos (solo la llama un proceso)
+            derived: Nombre de un frame derivado de esa versión (p.ej. el
+                     histórico ordenado); se guarda dentro de su directorio y
+                     se borra con ella. Cargar antes el frame principal.
+
+        Returns:
+            DataFrame con columnas respaldadas por memoria mapeada (solo lectura)
+        """
+        path = self._version_dir(version)
+        if derived is not None:
+            path = path / "derived" / derived
+
+        if not (path / META_FILE).exists():
+            with self._build_lock():
+                # Otro worker pudo construirlo mientras esperábamos el lock
+                if not (path / META_FILE).exists():
+                    self._write_frame(path, build())
+                    if derived is None:
+                        self._prune(keep=path)
+
+        return self._read_frame(path)
+
+    def _write_frame(self, path: Path, df: pd.DataFrame):
+        tmp = path.with_name(path.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        (tmp / "responses").mkdir(parents=True)
+
+        columns = []
+        for i, name in enumerate(df.columns):
+            col = df[name]
+            file_name = f"c{i}.npy"
+            meta = {"name": name, "file": file_name}
+
+            if isinstance(col.dtype, pd.DatetimeTZDtype):
+                meta.update(kind="datetime", tz=str(col.dt.tz))
+                values = col.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy("datetime64[ns]")
+            elif pd.api.types.is_datetime64_dtype(col.dtype):
+                meta["kind"] = "datetime"
+                values = col.to_numpy("datetime64[ns]")
+            elif pd.api.types.is_numeric_dtype(col.dtype) or pd.api.types.is_bool_dtype(col.dtype):
+                meta["kind"] = "numeric"
+                values = col.to_numpy()
+            else:
+                # Texto: diccionario + códigos (-1 = nulo); el diccionario va
+                # ordenado para que ordenar la categórica sea ordenar el texto
+                codes, uniques = pd.factorize(col, sort=True, use_na_sentinel=True)
+                meta.update(kind="dictionary", dictionary=[str(u) for u in uniques])
+                values = codes.astype(np.int32)
+
+            np.save(tmp / file_name, np.ascontiguousarray(values), allow_pickle=False)
+            columns.append(meta)
+
+        with open(tmp / META_FILE, "w") as f:
+            json.dump({"rows": len(df), "columns": columns}, f, ensure_ascii=False)
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+        logger.info(f"💾 Snapshot compartido creado: {path.name} ({len(df)} filas)")
+
+    def _read_frame(self, path: Path) -> pd.DataFrame:
+        with open(path / META_FILE) as f:
+            meta = json.load(f)
+
+        data = {}
+        for column in meta["columns"]:
+            values = np.load(path / column["file"], mmap_mode="r", allow_pickle=False)
+
+            if column["kind"] == "dictionary":
+                # Categórica sobre los códigos: los textos no se expanden por fila
+                data[column["name"]] = pd.Categorical.from_codes(
+                    values, categories=column["dictionary"]
+                )
+            elif column["kind"] == "datetime" and column.get("tz"):
+                data[column["name"]] = pd.Series(values).dt.tz_localize("UTC").dt.tz_convert(column["tz"])
+            else:
+                data[column["name"]] = values
+
+        return pd.DataFrame(data, copy=False)
+
+    def _prune(self, keep: Path):
+        """Borrar versiones antiguas (se conservan las KEEP_VERSIONS más recientes)"""
+        versions = sorted(
+            (p for p in self.root.iterdir() if p.is_dir() and p != keep),
+            key=lambda p: p.stat().st_mtime,
+            reverse=True
+        )
+        # Los procesos que aún tengan mapeados ficheros borrados siguen
+        # leyéndolos hasta que los suelten (semántica POSIX de unlink)
+        for old in versions[KEEP_VERSIONS - 1:]:
+            shutil.rmtree(old, ignore_errors=True)
+
+    def clear(self):
+        """Borrar todos los snapshots (se reconstruyen en la siguiente carga)"""
+        if not self.root.exists():
+            return
+
+        with self._build_lock():
+            for path in self.root.iterdir():
+                if path.is_dir():
+                    shutil.rmtree(path, ignore_errors=True)
+
+    # === RESPUESTAS PRECALCULADAS ===
+
+    def _response_path(self, version, key) -> Path:
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return self._version_dir(version) / "responses" / digest
+
+    def get_response(self, version, key):
+        """
+        Leer un payload precalculado por cualquier worker
+
+        Returns:
+            dict/bytes o None si no existe
+        """
+        path = self._response_path(version, key)
+
+        try:
+            raw = path.read_bytes()
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+
+        # Primer byte: 'j' = JSON, 'b' = bytes tal cual (columnar)
+        if raw[:1] == b"b":
+            return raw[1:]
+        return json.loads(raw[1:])
+
+    def put_response(self, version, key, payload):
+        """
+        Publicar un payload para el resto de workers (escritura atómica)
+
+        Si el snapshot de esa versión ya no existe no se guarda nada.
+        """
+        path = self._response_path(version, key)
+        if not path.parent.is_dir():
+            return
+
+        if isinstance(payload, bytes):
+            raw = b"b" + payload
+        else:
+            try:
+                raw = b"j" + json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            except (TypeError, ValueError) as e:
+                logger.debug(f"Payload no serializable para el snapshot: {e}")
+                return
+
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            tmp.write_bytes(raw)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.debug(f"No se pudo guardar la respuesta en el snapshot: {e}")
+            tmp.unlink(missing_ok=True)
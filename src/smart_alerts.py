@@ -5,12 +5,99 @@ Sistema inteligente de alertas basado en reglas y contexto
 """
 
 import logging
+import operator
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+from typing import Callable, List, Dict, Optional, Sequence, Tuple
 from enum import Enum
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 
+# Límites admitidos en el 'when' de una regla: campo y comparación (inclusiva)
+RULE_BOUNDS = {
+    'prev_min': ('prev', operator.ge),
+    'prev_max': ('prev', operator.le),
+    'current_min': ('current', operator.ge),
+    'current_max': ('current', operator.le),
+    'diff_min': ('diff', operator.ge),
+    'diff_max': ('diff', operator.le),
+    'abs_diff_min': ('abs_diff', operator.ge),
+    'abs_diff_max': ('abs_diff', operator.le),
+}
+
+# Reglas por defecto, en orden (gana la primera que cumple).
+# diff = prev - current: positivo = subió, negativo = bajó
+DEFAULT_SMART_RULES = [
+    # CRITICAL: Keywords TOP que caen
+    {
+        'name': 'top_keyword_critical_drop',
+        'when': {'current_max': 20, 'diff_max': -3},
+        'priority': 'CRITICAL',
+        'emoji': '🚨',
+        'telegram': True
+    },
+    {
+        'name': 'top_keyword_major_drop',
+        'when': {'current_max': 50, 'diff_max': -10},
+        'priority': 'CRITICAL',
+        'emoji': '🚨',
+        'telegram': True
+    },
+    
+    # HIGH: Buenos keywords con caída significativa
+    {
+        'name': 'good_keyword_big_drop',
+        'when': {'current_max': 100, 'diff_max': -15},
+        'priority': 'HIGH',
+        'emoji': '⚠️',
+        'telegram': True
+    },
+    
+    # MEDIUM: Keywords promedio
+    {
+        'name': 'medium_keyword_change',
+        'when': {'current_max': 150, 'abs_diff_min': 15},
+        'priority': 'MEDIUM',
+        'emoji': '📊',
+        'telegram': False  # Solo daily summary
+    },
+    
+    # LOW/IGNORE: Keywords malos fluctuando
+    {
+        'name': 'bad_keyword_fluctuation',
+        'when': {'current_min': 151, 'abs_diff_max': 19},
+        'priority': 'IGNORE',
+        'emoji': '🔇',
+        'telegram': False
+    },
+    
+    # CELEBRATION: Grandes subidas
+    {
+        'name': 'big_win',
+        'when': {'diff_min': 20, 'current_max': 50},
+        'priority': 'CELEBRATION',
+        'emoji': '🎉',
+        'telegram': True
+    },
+    {
+        'name': 'top_10_entry',
+        'when': {'prev_min': 11, 'current_max': 10},
+        'priority': 'CELEBRATION',
+        'emoji': '🎯',
+        'telegram': True
+    },
+    
+    # Subidas menores
+    {
+        'name': 'good_rise',
+        'when': {'diff_min': 10, 'current_max': 100},
+        'priority': 'HIGH',
+        'emoji': '📈',
+        'telegram': True
+    }
+]
+
 
 class AlertPriority(Enum):
     """Niveles de prioridad de alertas"""
@@ -89,6 +176,62 @@ class SmartAlert:
         }
 
 
+def compile_condition(when: Dict) -> Callable:
+    """
+    Compilar el 'when' de una regla a una condición (prev, current, diff)
+    
+    La condición solo usa comparaciones y '&', así que sirve igual para
+    escalares (evaluate_change) que para arrays numpy (evaluate_batch).
+    
+    Args:
+        when: Límites de la regla, p.ej. {'current_max': 20, 'diff_max': -3}
+    
+    Returns:
+        Función (prev, current, diff) -> bool / máscara
+    
+    Raises:
+        ValueError: Si hay límites desconocidos o no numéricos
+    """
+    checks = []
+    for key, bound in (when or {}).items():
+        if key not in RULE_BOUNDS:
+            raise ValueError(f"límite desconocido '{key}' (válidos: {', '.join(RULE_BOUNDS)})")
+        if isinstance(bound, bool) or not isinstance(bound, (int, float)):
+            raise ValueError(f"'{key}' debe ser numérico")
+        field, compare = RULE_BOUNDS[key]
+        checks.append((field, compare, bound))
+    
+    def condition(prev, current, diff):
+        values = {'prev': prev, 'current': current, 'diff': diff, 'abs_diff': abs(diff)}
+        matched = True
+        for field, compare, bound in checks:
+            matched = matched & compare(values[field], bound)
+        return matched
+    
+    return condition
+
+
+def compile_rule(spec: Dict) -> Dict:
+    """
+    Compilar una regla declarativa (config o defaults) a su forma ejecutable
+    
+    Raises:
+        ValueError: Si la regla no es válida
+    """
+    try:
+        priority = AlertPriority(str(spec.get('priority', 'MEDIUM')).upper())
+    except ValueError:
+        raise ValueError(f"prioridad desconocida '{spec.get('priority')}'")
+    
+    return {
+        'name': spec.get('name', 'custom_rule'),
+        'condition': compile_condition(spec.get('when', {})),
+        'priority': priority,
+        'emoji': spec.get('emoji', '🔔'),
+        'telegram': bool(spec.get('telegram', priority != AlertPriority.MEDIUM))
+    }
+
+
 class SmartAlertEngine:
     """Motor de alertas inteligentes"""
     
@@ -97,83 +240,48 @@ class SmartAlertEngine:
         self.smart_rules = self._load_smart_rules()
     
     def _load_smart_rules(self) -> List[Dict]:
-        """Cargar reglas smart desde config o usar defaults"""
-        default_rules = [
-            # CRITICAL: Keywords TOP que caen
-            {
-                'name': 'top_keyword_critical_drop',
-                'condition': lambda r, c, d: c <= 20 and d <= -3,
-                'priority': AlertPriority.CRITICAL,
-                'emoji': '🚨',
-                'telegram': True
-            },
-            {
-                'name': 'top_keyword_major_drop',
-                'condition': lambda r, c, d: c <= 50 and d <= -10,
-                'priority': AlertPriority.CRITICAL,
-                'emoji': '🚨',
-                'telegram': True
-            },
-            
-            # HIGH: Buenos keywords con caída significativa
-            {
-                'name': 'good_keyword_big_drop',
-                'condition': lambda r, c, d: c <= 100 and d <= -15,
-                'priority': AlertPriority.HIGH,
-                'emoji': '⚠️',
-                'telegram': True
-            },
-            
-            # MEDIUM: Keywords promedio
-            {
-                'name': 'medium_keyword_change',
-                'condition': lambda r, c, d: c <= 150 and abs(d) >= 15,
-                'priority': AlertPriority.MEDIUM,
-                'emoji': '📊',
-                'telegram': False  # Solo daily summary
-            },
-            
-            # LOW/IGNORE: Keywords malos fluctuando
-            {
-                'name': 'bad_keyword_fluctuation',
-                'condition': lambda r, c, d: c > 150 and abs(d) < 20,
-                'priority': AlertPriority.IGNORE,
-                'emoji': '🔇',
-                'telegram': False
-            },
+        """
+        Cargar reglas smart desde config (alerts.smart_rules) o usar defaults
+        
+        Formato de cada regla en config.yaml:
+        
+            - name: top_drop
+              when: {current_max: 20, diff_max: -3}
+              priority: CRITICAL
+              emoji: "🚨"
+              telegram: true
+        """
+        custom_rules = self.config.get('alerts', {}).get('smart_rules')
+        
+        if custom_rules:
+            rules = []
+            for spec in custom_rules:
+                try:
+                    rules.append(compile_rule(spec))
+                except (ValueError, AttributeError) as e:
+                    logger.warning(f"⚠️ Regla smart ignorada ({spec!r}): {e}")
             
-            # CELEBRATION: Grandes subidas
-            {
-                'name': 'big_win',
-                'condition': lambda r, c, d: d >= 20 and c <= 50,
-                'priority': AlertPriority.CELEBRATION,
-                'emoji': '🎉',
-                'telegram': True
-            },
-            {
-                'name': 'top_10_entry',
-                'condition': lambda r, c, d: r > 10 and c <= 10,
-                'priority': AlertPriority.CELEBRATION,
-                'emoji': '🎯',
-                'telegram': True
-            },
+            if rules:
+                logger.info(f"🧠 {len(rules)} reglas smart cargadas desde config")
+                return rules
             
-            # Subidas menores
-            {
-                'name': 'good_rise',
-                'condition': lambda r, c, d: d >= 10 and c <= 100,
-                'priority': AlertPriority.HIGH,
-                'emoji': '📈',
-                'telegram': True
-            }
-        ]
+            logger.warning("⚠️ Ninguna regla smart válida en config, usando defaults")
         
-        # Si hay smart_rules en config, usarlas (futuro)
-        if 'smart_rules' in self.config.get('alerts', {}):
-            # TODO: Parsear reglas custom del config
-            pass
+        return [compile_rule(spec) for spec in DEFAULT_SMART_RULES]
+    
+    def _build_alert(self, keyword: str, country: str, prev_rank: int,
+                     current_rank: int, rule: Dict) -> SmartAlert:
+        """Crear y enriquecer la alerta de un cambio que cumple una regla"""
+        diff = prev_rank - current_rank
+        alert_type = 'rise' if diff > 0 else 'drop'
+        alert = SmartAlert(alert_type, keyword, country, prev_rank, current_rank, diff)
+        alert.priority = rule['priority']
+        alert.emoji = rule['emoji']
         
-        return default_rules
+        # Añadir contexto e insights
+        self._enrich_alert(alert)
+        
+        return alert
     
     def evaluate_change(self, keyword: str, country: str, prev_rank: int, 
                        current_rank: int) -> Optional[SmartAlert]:
@@ -203,16 +311,63 @@ class SmartAlertEngine:
             logger.debug(f"Ignorando cambio: {keyword} ({prev_rank}→{current_rank})")
             return None
         
-        # Crear alerta
-        alert_type = 'rise' if diff > 0 else 'drop'
-        alert = SmartAlert(alert_type, keyword, country, prev_rank, current_rank, diff)
-        alert.priority = matched_rule['priority']
-        alert.emoji = matched_rule['emoji']
+        return self._build_alert(keyword, country, prev_rank, current_rank, matched_rule)
+    
+    def evaluate_batch(self, keywords: Sequence[str], countries: Sequence[str],
+                       prev_ranks: Sequence[float],
+                       current_ranks: Sequence[float]) -> List[SmartAlert]:
+        """
+        Evaluar todos los cambios de un snapshot de una vez
         
-        # Añadir contexto e insights
-        self._enrich_alert(alert)
+        Cada regla se aplica como máscara sobre los arrays, en orden y solo
+        sobre las filas que aún no cumplían ninguna (gana la primera, igual
+        que en evaluate_change). Las alertas solo se crean para las filas
+        que disparan.
         
-        return alert
+        Args:
+            keywords: Keyword de cada fila
+            countries: País de cada fila
+            prev_ranks: Ranking anterior de cada fila
+            current_ranks: Ranking actual de cada fila
+        
+        Returns:
+            Alertas en el orden de entrada (sin las ignoradas)
+        """
+        prev = np.asarray(prev_ranks, dtype=float)
+        current = np.asarray(current_ranks, dtype=float)
+        diff = prev - current
+        n = len(prev)
+        
+        # Filas sin ranking en alguno de los dos días no se evalúan
+        pending = ~(np.isnan(prev) | np.isnan(current))
+        matched = np.full(n, -1)
+        
+        for i, rule in enumerate(self.smart_rules):
+            if not pending.any():
+                break
+            mask = np.broadcast_to(rule['condition'](prev, current, diff), n) & pending
+            matched[mask] = i
+            pending &= ~mask
+        
+        firing = [
+            i for i, rule in enumerate(self.smart_rules)
+            if rule['priority'] != AlertPriority.IGNORE
+        ]
+        selected = np.flatnonzero(np.isin(matched, firing))
+        logger.debug(f"Smart engine: {len(selected)}/{n} cambios disparan alerta")
+        
+        keywords = np.asarray(keywords, dtype=object)[selected].tolist()
+        countries = np.asarray(countries, dtype=object)[selected].tolist()
+        
+        return [
+            self._build_alert(keyword, country, prev_rank, current_rank, self.smart_rules[rule])
+            for keyword, country, prev_rank, current_rank, rule in zip(
+                keywords, countries,
+                prev[selected].astype(int).tolist(),
+                current[selected].astype(int).tolist(),
+                matched[selected].tolist()
+            )
+        ]
     
     def _enrich_alert(self, alert: SmartAlert):
         """Añadir contexto, insights y acciones a la alerta"""
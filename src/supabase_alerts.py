@@ -6,7 +6,10 @@ Versión actualizada que lee configuración de BD y guarda histórico
 
 import logging
 import os
-from typing import List, Dict, Optional
+from bisect import bisect_right
+from collections import defaultdict
+from contextlib import nullcontext
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime, timedelta
 
 from supabase_client import get_supabase_client
@@ -14,6 +17,12 @@ from smart_alerts import SmartAlertEngine, AlertPriority
 
 logger = logging.getLogger(__name__)
 
+# Threshold por defecto si la alerta no define uno
+DEFAULT_ALERT_THRESHOLD = 5
+
+# Tamaño de página de PostgREST al leer rankings
+RANKINGS_PAGE_SIZE = 1000
+
 # Telegram (si está disponible)
 try:
     import requests
@@ -22,6 +31,16 @@ except ImportError:
     REQUESTS_AVAILABLE = False
     logger.warning("⚠️ requests no instalado")
 
+# Métricas Prometheus (opcional: sin ellas el envío no se mide)
+try:
+    from metrics import observe_telegram_send
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
+    def observe_telegram_send(sender: str):
+        return nullcontext()
+
 
 class SupabaseAlertManager:
     """
@@ -89,33 +108,135 @@ class SupabaseAlertManager:
         
         # 3. Procesar cada alerta del usuario
         for alert_config in alerts.data:
-            user_profile = alert_config['profiles']
-            
             # Filtrar cambios según configuración de la alerta
             relevant_changes = self._filter_relevant_changes(alert_config, changes)
             
-            if not relevant_changes:
-                continue
-            
-            logger.info(
-                f"📬 {len(relevant_changes)} alertas para "
-                f"{user_profile['email']}"
-            )
-            
-            # Formatear mensaje
-            message = self._format_alert_message(alert_config, relevant_changes)
-            
-            # Enviar según canales habilitados
-            sent = False
+            if relevant_changes:
+                self._dispatch_alert(alert_config, relevant_changes)
+    
+    def check_and_send_alerts_batch(self, app_ids: List[str]):
+        """
+        Verificar cambios y enviar alertas para varias apps en una sola pasada
+        
+        Pensado para ejecutarse una vez al final de un tracking multi-app:
+        carga las alertas de todas las apps en una query, obtiene los cambios
+        de todas las keywords con una query por ventana de tiempo y genera
+        todas las notificaciones por usuario recorriendo los datos una vez.
+        
+        Args:
+            app_ids: UUIDs de las apps a verificar
+        """
+        app_ids = list(dict.fromkeys(a for a in app_ids if a))
+        
+        if not app_ids:
+            return
+        
+        logger.info(f"🔍 Verificando alertas (batch) para {len(app_ids)} apps...")
+        
+        # 1. Alertas activas de todas las apps (1 query)
+        alerts = self.supabase.client.table('alerts')\
+            .select('*, profiles!inner(id, email, telegram_user_id)')\
+            .in_('app_id', app_ids)\
+            .eq('is_active', True)\
+            .execute()
+        
+        if not alerts.data:
+            logger.info("ℹ️ No hay alertas activas configuradas")
+            return
+        
+        alerts_index = self._index_alert_configs(alerts.data)
+        
+        logger.info(
+            f"📋 {len(alerts.data)} alertas activas en "
+            f"{len(alerts_index)} apps"
+        )
+        
+        # 2. Cambios de todas las apps (1 query por ventana)
+        changes_by_app = self._get_recent_changes_batch(list(alerts_index.keys()))
+        
+        total_changes = sum(len(c) for c in changes_by_app.values())
+        
+        if not total_changes:
+            logger.info("✅ No hay cambios significativos")
+            return
+        
+        logger.info(f"📊 {total_changes} cambios detectados")
+        
+        # 3. Una pasada: cada alerta toma el prefijo de cambios >= su threshold
+        for app_id, configs in alerts_index.items():
+            changes = changes_by_app.get(app_id)
             
-            if alert_config.get('telegram_enabled'):
-                sent = self._send_telegram_alert(user_profile, message)
+            if not changes:
+                continue
             
-            if alert_config.get('email_enabled'):
-                sent = self._send_email_alert(user_profile['email'], message)
+            magnitudes = [-abs(c['diff']) for c in changes]
             
-            # Guardar en histórico
-            self._save_to_history(alert_config, relevant_changes, message, sent)
+            for threshold, alert_config in configs:
+                candidates = changes[:bisect_right(magnitudes, -threshold)]
+                
+                if not candidates:
+                    # Thresholds ordenados: el resto tampoco tendrá cambios
+                    break
+                
+                relevant_changes = self._filter_relevant_changes(
+                    alert_config, candidates
+                )
+                
+                if relevant_changes:
+                    self._dispatch_alert(alert_config, relevant_changes)
+    
+    def _index_alert_configs(self, alert_configs: List[Dict]) -> Dict[str, List[Tuple[int, Dict]]]:
+        """
+        Indexar configuraciones de alerta por app y threshold
+        
+        Args:
+            alert_configs: Filas de la tabla 'alerts'
+        
+        Returns:
+            Dict app_id -> lista de (threshold, alert_config) ordenada por threshold
+        """
+        index: Dict[str, List[Tuple[int, Dict]]] = defaultdict(list)
+        
+        for alert_config in alert_configs:
+            threshold = alert_config.get('threshold')
+            if threshold is None:
+                threshold = DEFAULT_ALERT_THRESHOLD
+            index[alert_config['app_id']].append((threshold, alert_config))
+        
+        for configs in index.values():
+            configs.sort(key=lambda item: item[0])
+        
+        return dict(index)
+    
+    def _dispatch_alert(self, alert_config: Dict, relevant_changes: List[Dict]):
+        """
+        Formatear, enviar y guardar en histórico una alerta
+        
+        Args:
+            alert_config: Configuración de la alerta (con 'profiles')
+            relevant_changes: Cambios que disparan esta alerta
+        """
+        user_profile = alert_config['profiles']
+        
+        logger.info(
+            f"📬 {len(relevant_changes)} alertas para "
+            f"{user_profile['email']}"
+        )
+        
+        # Formatear mensaje
+        message = self._format_alert_message(alert_config, relevant_changes)
+        
+        # Enviar según canales habilitados
+        sent = False
+        
+        if alert_config.get('telegram_enabled'):
+            sent = self._send_telegram_alert(user_profile, message)
+        
+        if alert_config.get('email_enabled'):
+            sent = self._send_email_alert(user_profile['email'], message)
+        
+        # Guardar en histórico
+        self._save_to_history(alert_config, relevant_changes, message, sent)
     
     def _get_recent_changes(self, app_id: str, hours: int = 24) -> List[Dict]:
         """
@@ -128,35 +249,66 @@ class SupabaseAlertManager:
         Returns:
             Lista de cambios detectados
         """
+        return self._get_recent_changes_batch([app_id], hours).get(app_id, [])
+    
+    def _get_recent_changes_batch(self, app_ids: List[str],
+                                  hours: int = 24) -> Dict[str, List[Dict]]:
+        """
+        Obtener cambios significativos de varias apps con una query por ventana
+        
+        Los rankings de la ventana se leen de una vez (paginando por bloques
+        de PostgREST) junto con los datos de su keyword, así que el número de
+        round trips no depende del número de keywords.
+        
+        Args:
+            app_ids: UUIDs de las apps
+            hours: Ventana de tiempo para comparar
+        
+        Returns:
+            Dict app_id -> cambios ordenados por magnitud descendente
+        """
         try:
-            # Obtener keywords de la app
-            keywords = self.supabase.client.table('keywords')\
-                .select('id, keyword, country')\
-                .eq('app_id', app_id)\
-                .eq('is_active', True)\
-                .execute()
-            
-            if not keywords.data:
-                return []
-            
-            changes = []
             cutoff_time = datetime.utcnow() - timedelta(hours=hours)
             
-            for kw in keywords.data:
-                # Obtener últimos 2 rankings
-                rankings = self.supabase.client.table('rankings')\
-                    .select('rank, tracked_at')\
-                    .eq('keyword_id', kw['id'])\
+            rows = []
+            offset = 0
+            
+            while True:
+                page = self.supabase.client.table('rankings')\
+                    .select(
+                        'keyword_id, rank, tracked_at, '
+                        'keywords!inner(keyword, country, app_id, is_active)'
+                    )\
+                    .in_('keywords.app_id', app_ids)\
+                    .eq('keywords.is_active', True)\
                     .gte('tracked_at', cutoff_time.isoformat())\
+                    .order('keyword_id')\
                     .order('tracked_at', desc=True)\
-                    .limit(2)\
+                    .range(offset, offset + RANKINGS_PAGE_SIZE - 1)\
                     .execute()
                 
-                if not rankings.data or len(rankings.data) < 2:
+                rows.extend(page.data or [])
+                
+                if not page.data or len(page.data) < RANKINGS_PAGE_SIZE:
+                    break
+                
+                offset += RANKINGS_PAGE_SIZE
+            
+            # Últimos 2 rankings por keyword (filas ya ordenadas desc)
+            latest: Dict[str, List[Dict]] = {}
+            for row in rows:
+                pair = latest.setdefault(row['keyword_id'], [])
+                if len(pair) < 2:
+                    pair.append(row)
+            
+            changes_by_app: Dict[str, List[Dict]] = defaultdict(list)
+            
+            for keyword_id, pair in latest.items():
+                if len(pair) < 2:
                     continue
                 
-                current = rankings.data[0]
-                previous = rankings.data[1]
+                current, previous = pair
+                kw = current['keywords']
                 
                 # Calcular cambio (None significa no aparece en top 250)
                 current_rank = current['rank'] if current['rank'] else 999
@@ -165,8 +317,8 @@ class SupabaseAlertManager:
                 
                 # Solo cambios significativos (>= 3 posiciones)
                 if abs(diff) >= 3:
-                    changes.append({
-                        'keyword_id': kw['id'],
+                    changes_by_app[kw['app_id']].append({
+                        'keyword_id': keyword_id,
                         'keyword': kw['keyword'],
                         'country': kw['country'],
                         'prev_rank': prev_rank,
@@ -175,11 +327,14 @@ class SupabaseAlertManager:
                         'tracked_at': current['tracked_at']
                     })
             
-            return changes
+            for changes in changes_by_app.values():
+                changes.sort(key=lambda c: abs(c['diff']), reverse=True)
+            
+            return dict(changes_by_app)
             
         except Exception as e:
             logger.error(f"Error obteniendo cambios: {e}")
-            return []
+            return {}
     
     def _filter_relevant_changes(self, alert_config: Dict, 
                                  changes: List[Dict]) -> List[Dict]:
@@ -194,7 +349,9 @@ class SupabaseAlertManager:
             Cambios relevantes para esta alerta
         """
         alert_type = alert_config.get('alert_type', 'all')
-        threshold = alert_config.get('threshold', 5)
+        threshold = alert_config.get('threshold')
+        if threshold is None:
+            threshold = DEFAULT_ALERT_THRESHOLD
         
         relevant = []
         
@@ -318,8 +475,9 @@ class SupabaseAlertManager:
                 'parse_mode': 'Markdown'
             }
             
-            response = requests.post(url, json=payload, timeout=10)
-            response.raise_for_status()
+            with observe_telegram_send("supabase_alerts"):
+                response = requests.post(url, json=payload, timeout=10)
+                response.raise_for_status()
             
             logger.info(f"✅ Alerta Telegram enviada a {user_profile['email']}")
             return True
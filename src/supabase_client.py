@@ -283,6 +283,85 @@ class SupabaseClient:
             logger.error(f"Error getting keyword trend: {e}")
             return None
     
+    def get_latest_ranks(self, keyword_ids: List[str], lookback: int = 3) -> Dict[str, int]:
+        """
+        Get the most recent rank of each keyword (one query)
+        
+        Args:
+            keyword_ids: Keywords to look up
+            lookback: Rows fetched per keyword (older runs are ignored)
+        
+        Returns:
+            {keyword_id: rank}
+        """
+        if not keyword_ids:
+            return {}
+        
+        try:
+            response = self.client.table('rankings')\
+                .select('keyword_id, rank, tracked_at')\
+                .in_('keyword_id', keyword_ids)\
+                .order('tracked_at', desc=True)\
+                .limit(len(keyword_ids) * lookback)\
+                .execute()
+            
+            latest = {}
+            for row in response.data:
+                latest.setdefault(row['keyword_id'], row['rank'])
+            return latest
+        except Exception as e:
+            logger.error(f"Error fetching latest ranks: {e}")
+            return {}
+    
+    # -------------------------------------------------------------------------
+    # KPI Snapshots
+    # -------------------------------------------------------------------------
+    
+    def save_kpi_snapshots(self, app_id: str, records: List[Dict],
+                           job_id: Optional[str] = None) -> bool:
+        """Save the per-run KPI records computed at ingest time (kpi_snapshots)"""
+        try:
+            data = [
+                {
+                    **{k: v for k, v in record.items() if k != 'run_date'},
+                    'app_id': app_id,
+                    'job_id': job_id
+                }
+                for record in records
+            ]
+            
+            self.client.table('kpi_snapshots')\
+                .upsert(data, on_conflict='app_id,scope,scope_value,run_at')\
+                .execute()
+            logger.info(f"✅ {len(data)} KPI snapshots saved")
+            return True
+        except Exception as e:
+            logger.error(f"Error saving KPI snapshots: {e}")
+            return False
+    
+    def get_latest_kpis(self, app_id: str, scope: str = 'overall',
+                        scope_value: str = '') -> Optional[Dict]:
+        """Get the latest KPI snapshot of an app (None if never computed)"""
+        history = self.get_kpi_history(app_id, scope, scope_value, limit=1)
+        return history[-1] if history else None
+    
+    def get_kpi_history(self, app_id: str, scope: str = 'overall',
+                        scope_value: str = '', limit: int = 30) -> List[Dict]:
+        """Get the last KPI snapshots of an app, oldest first (trend lines)"""
+        try:
+            response = self.client.table('kpi_snapshots')\
+                .select('*')\
+                .eq('app_id', app_id)\
+                .eq('scope', scope)\
+                .eq('scope_value', scope_value)\
+                .order('run_at', desc=True)\
+                .limit(limit)\
+                .execute()
+            return list(reversed(response.data))
+        except Exception as e:
+            logger.error(f"Error fetching KPI snapshots: {e}")
+            return []
+    
     # -------------------------------------------------------------------------
     # Alert Operations
     # -------------------------------------------------------------------------
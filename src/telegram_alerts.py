@@ -5,6 +5,7 @@ Envío de notificaciones cuando hay cambios en rankings
 """
 
 import logging
+from contextlib import nullcontext
 from typing import List, Dict, Optional
 from datetime import datetime
 from pathlib import Path
@@ -40,6 +41,16 @@ except ImportError:
     EXPERT_PRO_AVAILABLE = False
     logger.warning("⚠️ aso_expert_pro no disponible (usando versión básica)")
 
+# Métricas Prometheus (opcional: sin ellas el envío no se mide)
+try:
+    from metrics import observe_telegram_send
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
+    def observe_telegram_send(sender: str):
+        return nullcontext()
+
 
 class AlertManager:
     """Gestor de alertas para notificar cambios en rankings"""
@@ -77,6 +88,15 @@ class AlertManager:
         
         if self.test_mode:
             logger.warning("🧪 MODO TEST activado - Las alertas se mostrarán pero NO se enviarán")
+        
+        # Analizadores expertos (se reutilizan: su caché de análisis queda en memoria)
+        self._experts = {}
+    
+    def _expert(self, expert_class):
+        """Instancia reutilizable de un analizador experto"""
+        if expert_class not in self._experts:
+            self._experts[expert_class] = expert_class(self.config)
+        return self._experts[expert_class]
     
     def send_telegram_message(self, message: str, parse_mode: str = 'Markdown') -> bool:
         """
@@ -110,8 +130,9 @@ class AlertManager:
                 'parse_mode': parse_mode
             }
             
-            response = requests.post(url, json=payload, timeout=10)
-            response.raise_for_status()
+            with observe_telegram_send("alert_manager"):
+                response = requests.post(url, json=payload, timeout=10)
+                response.raise_for_status()
             
             logger.info("✅ Mensaje Telegram enviado correctamente")
             return True
@@ -390,13 +411,17 @@ class AlertManager:
         """
         Generar análisis experto SIN enviarlo (solo retornar el texto)
         
+        Los analizadores se reutilizan entre llamadas y guardan el análisis
+        por par de snapshots: si los dos últimos días no han cambiado no se
+        recalcula nada.
+        
         Returns:
             String con el análisis formateado, o None si hay error
         """
         # Intentar versión PRO primero
         if EXPERT_PRO_AVAILABLE:
             try:
-                expert = ASOExpertPro(self.config)
+                expert = self._expert(ASOExpertPro)
                 analysis = expert.analyze_comprehensive()
                 
                 if 'error' in analysis:
@@ -413,7 +438,7 @@ class AlertManager:
         # Fallback: versión básica
         if EXPERT_AVAILABLE:
             try:
-                expert = ASOExpert(self.config)
+                expert = self._expert(ASOExpert)
                 analysis = expert.analyze_comprehensive()
                 
                 if 'error' in analysis:
@@ -21,6 +21,8 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from rank_tracker import RankTracker
 from telegram_alerts import AlertManager
 from report_formatter import ReportFormatter
+from kpi_store import KPIStore, kpi_file_for
+from series_stats import SeriesStatsEngine
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -43,6 +45,7 @@ class ASOBot:
         self.tracker = None
         self.telegram = None
         self.formatter = ReportFormatter()  # Inicializar formateador
+        self.series_stats = SeriesStatsEngine.from_config(self.config)  # Stats por serie (/history)
         
         # Definir teclado persistente
         self.keyboard = [
@@ -207,6 +210,28 @@ Cuando ejecutas `/track`, el sistema detecta automáticamente cambios importante
                 await update.message.reply_text("❌ No hay datos históricos aún.\n\n💡 Ejecuta `/track` primero para generar datos.", parse_mode='Markdown')
                 return
             
+            # KPIs precalculados por el tracker: no hace falta leer el histórico
+            kpi_store = KPIStore(kpi_file_for(ranks_file))
+            kpis = kpi_store.latest()
+            if kpis and kpis['checks']:
+                status = f"""
+📊 *Estado Actual - {self.config['app']['name']}*
+
+📅 Última actualización: {kpis['run_date']}
+📦 Keywords totales: {kpis['checks']}
+👁️ Visibles (top 250): {kpis['visible']} ({kpis['visible']/kpis['checks']*100:.1f}%)
+
+🏆 Distribución:
+  • Top 10: {kpis['top_10']}
+  • Top 30: {kpis['top_30']}
+
+🥇 Mejor keyword: `{kpis['best_keyword']}` #{kpis['best_rank']}
+
+📈 Tracking dates: {len(kpi_store.history())}
+"""
+                await update.message.reply_text(status, parse_mode='Markdown')
+                return
+            
             df = pd.read_csv(ranks_file)
             
             # Validar que el CSV no esté vacío
@@ -361,61 +386,69 @@ Cuando ejecutas `/track`, el sistema detecta automáticamente cambios importante
                 await update.message.reply_text("❌ No hay datos históricos aún")
                 return
             
-            df = pd.read_csv(ranks_file)
-            df['date'] = pd.to_datetime(df['date'])
-            df['date_only'] = df['date'].dt.date
+            # Estadísticas por serie (se recalculan solo si cambia el CSV)
+            stats = self.series_stats.get_file(ranks_file)
             
-            # Buscar keyword (case insensitive)
-            df_keyword = df[df['keyword'].str.lower() == keyword.lower()]
+            # Buscar keyword (case insensitive); un punto por día y país
+            df_history = stats.series(keyword, case_insensitive=True)
             
-            if len(df_keyword) == 0:
+            if len(df_history) == 0:
                 await update.message.reply_text(
                     f"❌ No se encontró la keyword `{keyword}`\n\n💡 Verifica que esté escrita correctamente.",
                     parse_mode='Markdown'
                 )
                 return
             
-            # Agrupar por fecha y tomar el último rank de cada día
-            df_history = df_keyword.sort_values('date').drop_duplicates(
-                subset=['date_only'], keep='last'
-            )
-            
-            # Ordenar por fecha
-            df_history = df_history.sort_values('date_only')
+            short, long = stats.windows[0], stats.windows[-1]
             
             # Construir mensaje
-            message = f"📊 *Historial: `{keyword}`*\n\n"
-            
-            for _, row in df_history.iterrows():
-                date = row['date_only']
-                rank = int(row['rank'])
-                message += f"📅 {date} → #{rank}\n"
-            
-            # Calcular estadísticas
-            best_rank = int(df_history['rank'].min())
-            worst_rank = int(df_history['rank'].max())
-            avg_rank = df_history['rank'].mean()
-            current_rank = int(df_history.iloc[-1]['rank'])
-            
-            message += f"\n📈 *Estadísticas*\n"
-            message += f"🥇 Mejor: #{best_rank}\n"
-            message += f"📉 Peor: #{worst_rank}\n"
-            message += f"📊 Promedio: #{avg_rank:.1f}\n"
-            message += f"📍 Actual: #{current_rank}\n"
-            
-            # Tendencia
-            if len(df_history) >= 2:
-                first_rank = int(df_history.iloc[0]['rank'])
-                trend_diff = first_rank - current_rank
+            message = f"📊 *Historial: `{keyword}`*\n"
+            
+            for (kw, country), series in df_history.groupby(['keyword', 'country'], sort=True):
+                summary = stats.summary(kw, country)
+                
+                message += f"\n🌍 *{country}*\n"
+                
+                # Últimos días (la ventana larga) para no pasar del límite de Telegram
+                for row in series.tail(long).itertuples(index=False):
+                    rank = f"#{int(row.rank)}" if pd.notna(row.rank) else "—"
+                    message += f"📅 {row.date.date()} → {rank}\n"
+                
+                if not summary['data_points']:
+                    continue
+                
+                message += f"\n📈 *Estadísticas*\n"
+                message += f"🥇 Mejor: #{int(summary['best_rank'])}\n"
+                message += f"📉 Peor: #{int(summary['worst_rank'])}\n"
+                message += f"📊 Promedio: #{summary['avg_rank']:.1f}\n"
+                message += f"📍 Actual: #{int(summary['last_rank'])}\n"
+                
+                for window in stats.windows:
+                    if summary[f'mean_{window}d'] is not None:
+                        spread = summary[f'std_{window}d']
+                        message += (f"📆 {window}d: media #{summary[f'mean_{window}d']:.1f}"
+                                    f"{f' (±{spread:.1f})' if spread is not None else ''}, "
+                                    f"rango #{int(summary[f'min_{window}d'])}-#{int(summary[f'max_{window}d'])}\n")
+                
+                if summary['ewma'] is not None:
+                    message += f"〰️ EWMA: #{summary['ewma']:.1f}\n"
                 
-                if trend_diff > 0:
-                    trend = f"↑ Subió {trend_diff} posiciones desde el inicio"
-                elif trend_diff < 0:
-                    trend = f"↓ Bajó {abs(trend_diff)} posiciones desde el inicio"
-                else:
-                    trend = "= Sin cambios desde el inicio"
+                slope = summary[f'slope_{short}d']
+                if slope is not None:
+                    message += f"📐 Ritmo {short}d: {-slope:+.1f} posiciones/día\n"
                 
-                message += f"\n🎯 Tendencia: {trend}"
+                # Tendencia
+                if summary['data_points'] >= 2:
+                    trend_diff = int(summary['first_rank']) - int(summary['last_rank'])
+                    
+                    if trend_diff > 0:
+                        trend = f"↑ Subió {trend_diff} posiciones desde el inicio"
+                    elif trend_diff < 0:
+                        trend = f"↓ Bajó {abs(trend_diff)} posiciones desde el inicio"
+                    else:
+                        trend = "= Sin cambios desde el inicio"
+                    
+                    message += f"🎯 Tendencia: {trend}\n"
             
             await update.message.reply_text(message, parse_mode='Markdown')
         
@@ -5,12 +5,28 @@ Predicción de interés en keywords usando Google Trends y análisis de datos
 """
 
 import logging
+import sys
+from pathlib import Path
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 import pandas as pd
 
+sys.path.insert(0, str(Path(__file__).parent))
+
+from series_stats import SeriesStatsEngine
+from trends_fetcher import (
+    DEFAULT_CACHE_FILE, DEFAULT_MAX_REQUESTS, DEFAULT_REQUEST_DELAY, TrendsFetcher
+)
+
 logger = logging.getLogger(__name__)
 
+# Rank a partir del cual una keyword no es visible (iTunes devuelve 250)
+VISIBLE_RANK = 250
+
+# Puntos diarios mínimos y desviación (posiciones) para marcar una keyword como volátil
+VOLATILITY_MIN_POINTS = 7
+VOLATILITY_THRESHOLD = 20
+
 try:
     from pytrends.request import TrendReq
     PYTRENDS_AVAILABLE = True
@@ -39,10 +55,26 @@ class TrendAnalyzer:
         self.google_trends_enabled = config['trends']['google_trends']['enabled']
         self.ai_enabled = config['trends']['ai_analysis']['enabled']
         
+        # Estadísticas móviles por (keyword, país), solo ranks visibles
+        self.series_stats = SeriesStatsEngine.from_config(config, max_rank=VISIBLE_RANK)
+        
+        # Último histórico leído con load_history() y su versión de archivo
+        self._history = None
+        
         # Inicializar Google Trends
         if self.google_trends_enabled and PYTRENDS_AVAILABLE:
             try:
                 self.pytrends = TrendReq(hl='en-US', tz=360)
+                
+                # Lotes de 5 términos con ancla común + caché en disco
+                trends_config = config['trends']['google_trends']
+                self.fetcher = TrendsFetcher(
+                    self.pytrends,
+                    cache_file=Path(trends_config.get('cache_file', DEFAULT_CACHE_FILE)),
+                    anchor=trends_config.get('anchor'),
+                    max_requests=trends_config.get('max_requests', DEFAULT_MAX_REQUESTS),
+                    request_delay=trends_config.get('request_delay', DEFAULT_REQUEST_DELAY)
+                )
                 logger.info("✅ Google Trends inicializado")
             except Exception as e:
                 logger.error(f"❌ Error inicializando Google Trends: {e}")
@@ -77,66 +109,74 @@ class TrendAnalyzer:
         if not self.google_trends_enabled:
             return None
         
-        try:
-            # Construir payload
-            self.pytrends.build_payload(
-                kw_list=[keyword],
-                cat=0,
-                timeframe=timeframe,
-                geo=region
-            )
-            
-            # Obtener interés a lo largo del tiempo
-            interest_over_time = self.pytrends.interest_over_time()
-            
-            if interest_over_time.empty:
-                logger.warning(f"⚠️  No hay datos de tendencias para '{keyword}' en {region}")
-                return None
-            
-            # Calcular estadísticas
-            values = interest_over_time[keyword].values
-            current_value = values[-1]
-            avg_value = values.mean()
-            max_value = values.max()
-            min_value = values.min()
-            
-            # Calcular tendencia (últimos 7 días vs 7 anteriores)
-            if len(values) >= 14:
-                recent_avg = values[-7:].mean()
-                previous_avg = values[-14:-7].mean()
-                trend_direction = "rising" if recent_avg > previous_avg else "falling"
-                trend_strength = abs(recent_avg - previous_avg) / previous_avg * 100
-            else:
-                trend_direction = "stable"
-                trend_strength = 0
-            
-            result = {
-                'keyword': keyword,
-                'region': region,
-                'current_interest': int(current_value),
-                'avg_interest': round(avg_value, 1),
-                'max_interest': int(max_value),
-                'min_interest': int(min_value),
-                'trend_direction': trend_direction,
-                'trend_strength': round(trend_strength, 1),
-                'timeframe': timeframe,
-                'last_updated': datetime.now()
-            }
-            
-            logger.info(f"📈 Tendencia para '{keyword}' ({region}): "
-                       f"{trend_direction} ({trend_strength:.1f}%)")
-            
-            return result
-            
-        except Exception as e:
-            logger.error(f"❌ Error obteniendo tendencias para '{keyword}': {e}")
+        interest = self.fetcher.fetch([keyword], region=region, timeframe=timeframe)
+        if keyword not in interest:
+            logger.warning(f"⚠️  No hay datos de tendencias para '{keyword}' en {region}")
             return None
+        
+        return self._trend_stats(keyword, region, timeframe, interest[keyword])
+    
+    def _trend_stats(self, keyword: str, region: str, timeframe: str,
+                     interest: pd.Series) -> Optional[Dict]:
+        """
+        Estadísticas de tendencia de una serie de interés
+        
+        Args:
+            keyword: Keyword de la serie
+            region: Región
+            timeframe: Período de la serie
+            interest: Interés a lo largo del tiempo (escala común del fetcher)
+        
+        Returns:
+            Diccionario con datos de tendencia
+        """
+        values = interest.to_numpy(dtype=float)
+        if len(values) == 0:
+            return None
+        
+        # Calcular estadísticas
+        current_value = values[-1]
+        avg_value = values.mean()
+        max_value = values.max()
+        min_value = values.min()
+        
+        # Calcular tendencia (últimos 7 días vs 7 anteriores)
+        if len(values) >= 14:
+            recent_avg = values[-7:].mean()
+            previous_avg = values[-14:-7].mean()
+            trend_direction = "rising" if recent_avg > previous_avg else "falling"
+            trend_strength = abs(recent_avg - previous_avg) / previous_avg * 100 if previous_avg > 0 else 0
+        else:
+            trend_direction = "stable"
+            trend_strength = 0
+        
+        result = {
+            'keyword': keyword,
+            'region': region,
+            'current_interest': int(current_value),
+            'avg_interest': round(avg_value, 1),
+            'max_interest': int(max_value),
+            'min_interest': int(min_value),
+            'trend_direction': trend_direction,
+            'trend_strength': round(trend_strength, 1),
+            'timeframe': timeframe,
+            'last_updated': datetime.now()
+        }
+        
+        logger.info(f"📈 Tendencia para '{keyword}' ({region}): "
+                   f"{trend_direction} ({trend_strength:.1f}%)")
+        
+        return result
     
     def analyze_multiple_keywords(self, keywords: List[str], 
                                   region: str = 'US') -> pd.DataFrame:
         """
         Analizar tendencias de múltiples keywords
         
+        Se piden en lotes de 4 keywords más el ancla (ceil(N/4) peticiones,
+        0 si están en caché) y los intereses quedan en una escala común, así
+        que el orden por current_interest compara keywords entre sí.
+        
         Args:
             keywords: Lista de keywords
             region: Región a analizar
@@ -144,10 +184,15 @@ class TrendAnalyzer:
         Returns:
             DataFrame con análisis de todos los keywords
         """
-        results = []
+        if not self.google_trends_enabled:
+            return pd.DataFrame()
+        
+        timeframe = 'today 3-m'
+        interest = self.fetcher.fetch(keywords, region=region, timeframe=timeframe)
         
-        for keyword in keywords:
-            trend = self.get_keyword_trend(keyword, region=region)
+        results = []
+        for keyword, series in interest.items():
+            trend = self._trend_stats(keyword, region, timeframe, series)
             if trend:
                 results.append(trend)
         
@@ -173,21 +218,15 @@ class TrendAnalyzer:
             return {}
         
         try:
-            # Obtener datos de último año
-            self.pytrends.build_payload(
-                kw_list=[keyword],
-                timeframe='today 12-m',
-                geo=region
-            )
-            
-            interest = self.pytrends.interest_over_time()
+            # Obtener datos de último año (caché compartida con el resto de análisis)
+            interest = self.fetcher.fetch([keyword], region=region, timeframe='today 12-m')
             
-            if interest.empty:
+            if keyword not in interest:
                 return {}
             
             # Detectar picos estacionales
             values = interest[keyword].values
-            dates = interest.index
+            dates = interest[keyword].index
             
             # Encontrar meses con mayor interés
             monthly_avg = []
@@ -275,69 +314,98 @@ Responde de forma concisa (máx 200 palabras)."""
             logger.error(f"❌ Error obteniendo insights IA: {e}")
             return None
     
+    def load_history(self) -> pd.DataFrame:
+        """
+        Leer el histórico de rankings (storage.ranks_file)
+        
+        El DataFrame devuelto queda asociado a la versión del CSV: al pasarlo
+        a analyze_rank_history() / get_recommendations() las estadísticas se
+        cachean por esa versión sin indicar data_version.
+        
+        Returns:
+            DataFrame con el histórico completo
+        """
+        ranks_file = Path(self.config['storage']['ranks_file'])
+        version = SeriesStatsEngine.file_version(ranks_file)
+        history_df = pd.read_csv(ranks_file)
+        self._history = (history_df, version)
+        return history_df
+    
+    def _data_version(self, history_df: pd.DataFrame, data_version):
+        """Versión explícita o, si el frame es el de load_history(), la del CSV"""
+        if data_version is None and self._history is not None and history_df is self._history[0]:
+            return self._history[1]
+        return data_version
+    
     def analyze_rank_history(self, history_df: pd.DataFrame, 
-                            keyword: str, country: str) -> Dict:
+                            keyword: str, country: str, data_version=None) -> Dict:
         """
         Analizar histórico de rankings para un keyword específico
         
+        Las estadísticas salen de SeriesStatsEngine (todas las series se
+        calculan una vez por versión del histórico, solo ranks visibles).
+        
         Args:
             history_df: DataFrame con histórico completo
             keyword: Keyword a analizar
             country: País
+            data_version: Versión del histórico, p.ej.
+                          SeriesStatsEngine.file_version(ranks_file); no hace
+                          falta con el frame de load_history(). Sin ninguna
+                          se hashea el DataFrame entero en cada llamada
         
         Returns:
             Diccionario con análisis
         """
-        # Filtrar datos
-        data = history_df[
-            (history_df['keyword'] == keyword) &
-            (history_df['country'] == country) &
-            (history_df['rank'] < 250)  # Solo rankings visibles
-        ].sort_values('date')
-        
-        if len(data) < 2:
+        version = self._data_version(history_df, data_version)
+        stats = self.series_stats.get(history_df, version=version)
+        summary = stats.summary(keyword, country)
+        
+        if summary is None or summary['data_points'] < 2:
             return {'error': 'Datos insuficientes'}
         
-        # Calcular estadísticas
-        ranks = data['rank'].values
-        current_rank = ranks[-1]
-        best_rank = ranks.min()
-        worst_rank = ranks.max()
-        avg_rank = ranks.mean()
-        
-        # Tendencia (últimos 7 días)
-        if len(ranks) >= 7:
-            recent_trend = ranks[-7:].mean()
-            previous_trend = ranks[-14:-7].mean() if len(ranks) >= 14 else avg_rank
-            trend = "improving" if recent_trend < previous_trend else "declining"
+        # Tendencia: pendiente de la ventana corta (negativo = sube posiciones)
+        window = stats.windows[0]
+        slope = summary[f'slope_{window}d']
+        if summary['data_points'] >= 7 and slope is not None:
+            trend = "improving" if slope < 0 else "declining"
         else:
             trend = "stable"
         
-        # Volatilidad (desviación estándar)
-        volatility = ranks.std()
-        
         return {
             'keyword': keyword,
             'country': country,
-            'current_rank': int(current_rank),
-            'best_rank': int(best_rank),
-            'worst_rank': int(worst_rank),
-            'avg_rank': round(avg_rank, 1),
+            'current_rank': int(summary['last_rank']),
+            'best_rank': int(summary['best_rank']),
+            'worst_rank': int(summary['worst_rank']),
+            'avg_rank': round(summary['avg_rank'], 1),
             'trend': trend,
-            'volatility': round(volatility, 1),
-            'data_points': len(data),
-            'first_tracked': data.iloc[0]['date'],
-            'last_tracked': data.iloc[-1]['date']
+            'slope': slope,
+            'ewma': summary['ewma'],
+            'rolling': {
+                f'{w}d': {
+                    'mean': summary[f'mean_{w}d'],
+                    'std': summary[f'std_{w}d'],
+                    'min': summary[f'min_{w}d'],
+                    'max': summary[f'max_{w}d'],
+                }
+                for w in stats.windows
+            },
+            'volatility': round(summary['volatility'], 1),
+            'data_points': summary['data_points'],
+            'first_tracked': summary['first_tracked'],
+            'last_tracked': summary['last_ranked']
         }
     
     def get_recommendations(self, history_df: pd.DataFrame, 
-                           trends_enabled: bool = False) -> List[str]:
+                           trends_enabled: bool = False, data_version=None) -> List[str]:
         """
         Generar recomendaciones basadas en análisis
         
         Args:
             history_df: DataFrame con histórico
             trends_enabled: Si están habilitados los análisis de tendencias
+            data_version: Versión del histórico (ver analyze_rank_history())
         
         Returns:
             Lista de recomendaciones
@@ -368,16 +436,21 @@ Responde de forma concisa (máx 200 palabras)."""
                 f"Considera reforzarlo en title/subtitle."
             )
         
-        # Recomendación 3: Keywords volátiles
-        for kw in latest_data['keyword'].unique():
-            kw_data = history_df[history_df['keyword'] == kw]['rank']
-            if len(kw_data) >= 7:
-                volatility = kw_data.std()
-                if volatility > 20:
-                    recommendations.append(
-                        f"⚠️ '{kw}' tiene alta volatilidad (±{volatility:.0f} posiciones). "
-                        f"Monitoriza competencia o cambios de algoritmo."
-                    )
+        # Recomendación 3: Keywords volátiles (desviación en la ventana larga, por país)
+        version = self._data_version(history_df, data_version)
+        stats = self.series_stats.get(history_df, version=version)
+        window = stats.windows[-1]
+        series = stats.latest[stats.latest.index.get_level_values('keyword').isin(latest_data['keyword'])]
+        volatile = series[
+            (series['data_points'] >= VOLATILITY_MIN_POINTS) &
+            (series[f'std_{window}d'] > VOLATILITY_THRESHOLD)
+        ].sort_values(f'std_{window}d', ascending=False)
+        
+        for (kw, country), volatility in volatile[f'std_{window}d'].items():
+            recommendations.append(
+                f"⚠️ '{kw}' ({country}) tiene alta volatilidad (±{volatility:.0f} posiciones "
+                f"en {window} días). Monitoriza competencia o cambios de algoritmo."
+            )
         
         if len(recommendations) == 0:
             recommendations.append("✅ Todo parece estable. Continúa monitorizando.")
@@ -416,6 +489,13 @@ def test_analyzer():
             print(f"   Meses pico: {', '.join(seasonal['peak_months'])}")
     else:
         print("⚠️ Google Trends no disponible")
+    
+    # Recomendaciones sobre el histórico (stats cacheadas por versión del CSV)
+    if Path(config['storage']['ranks_file']).exists():
+        history_df = analyzer.load_history()
+        print(f"\n💡 Recomendaciones:")
+        for recommendation in analyzer.get_recommendations(history_df):
+            print(f"   {recommendation}")
 
 
 if __name__ == "__main__":
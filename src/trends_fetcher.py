@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Capa de descarga de Google Trends para TrendAnalyzer
+Payloads de 5 términos con ancla común, caché persistente y presupuesto de peticiones
+"""
+
+import json
+import logging
+import os
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Términos por payload que admite pytrends (uno es el ancla)
+MAX_TERMS = 5
+
+DEFAULT_CACHE_FILE = Path('data/trends_cache.json')
+
+# Días que se conservan en la caché (las entradas son válidas solo el día en que se piden)
+CACHE_DAYS = 7
+
+# Interés medio mínimo del ancla en un payload para reescalar con ella: por
+# debajo casi todos los puntos son "<1" (0) y el ratio de medias no es fiable
+MIN_ANCHOR_MEAN = 1.0
+
+# Peticiones a Google Trends por ejecución y pausa entre ellas (rate limit agresivo)
+DEFAULT_MAX_REQUESTS = 20
+DEFAULT_REQUEST_DELAY = 1.0
+
+
+class TrendsFetcher:
+    """
+    Series de interés de Google Trends en lotes de 5 términos
+
+    Cada payload lleva el mismo término ancla más 4 keywords. Google
+    normaliza cada payload a su propio máximo (100), así que los lotes se
+    reescalan para que el ancla coincida con la del primer lote: todas las
+    series quedan en la misma escala y son comparables entre sí.
+
+    El ancla debe tener volumen: la configurada (un término genérico de
+    mucho interés) o, si no hay, la keyword con más interés del primer
+    payload (5 keywords). Los lotes en los que el ancla no llega a
+    MIN_ANCHOR_MEAN no se pueden reescalar y se descartan (con aviso).
+
+    Las series se guardan en una caché en disco por (keyword, región,
+    timeframe, día); repetir el análisis el mismo día no hace peticiones.
+    """
+
+    def __init__(self, pytrends, cache_file: Path = DEFAULT_CACHE_FILE,
+                 anchor: Optional[str] = None, max_requests: int = DEFAULT_MAX_REQUESTS,
+                 request_delay: float = DEFAULT_REQUEST_DELAY):
+        """
+        Args:
+            pytrends: Cliente TrendReq ya inicializado
+            cache_file: Fichero JSON de la caché
+            anchor: Término ancla (None = la keyword con más interés del primer payload)
+            max_requests: Máximo de peticiones por instancia
+            request_delay: Segundos entre peticiones
+        """
+        self.pytrends = pytrends
+        self.cache_file = Path(cache_file)
+        self.anchor = anchor or None
+        self.max_requests = max_requests
+        self.request_delay = request_delay
+        self.requests_made = 0
+        self._last_request = 0.0
+        self._cache = self._load_cache()
+
+    # === CACHÉ ===
+
+    @staticmethod
+    def _cache_key(keyword: str, region: str, timeframe: str, day: str) -> str:
+        return json.dumps([keyword, region, timeframe, day], ensure_ascii=False)
+
+    def _load_cache(self) -> Dict[str, Dict]:
+        if not self.cache_file.exists():
+            return {}
+
+        try:
+            with open(self.cache_file, 'r') as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️  Caché de Trends ilegible, se ignora: {e}")
+            return {}
+
+        # Descartar días antiguos
+        oldest = (date.today() - timedelta(days=CACHE_DAYS)).isoformat()
+        return {k: v for k, v in entries.items() if json.loads(k)[3] >= oldest}
+
+    def _save_cache(self):
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.cache_file.with_name(self.cache_file.name + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self._cache, f, ensure_ascii=False)
+        os.replace(tmp, self.cache_file)
+
+    def _cached(self, keyword: str, region: str, timeframe: str,
+                anchor: Optional[str]) -> Optional[pd.Series]:
+        entry = self._cache.get(self._cache_key(keyword, region, timeframe, date.today().isoformat()))
+        # Solo sirve si está en la escala del mismo ancla (None = cualquier escala)
+        if entry is None or (anchor is not None and entry['anchor'] != anchor):
+            return None
+        return pd.Series(entry['values'], index=pd.to_datetime(entry['dates']), name=keyword)
+
+    def _store(self, series: pd.Series, region: str, timeframe: str, anchor: str):
+        key = self._cache_key(series.name, region, timeframe, date.today().isoformat())
+        self._cache[key] = {
+            'anchor': anchor,
+            'dates': [d.strftime('%Y-%m-%d') for d in series.index],
+            'values': [round(float(v), 3) for v in series.values],
+        }
+
+    def _cached_anchor(self, keywords: List[str], region: str, timeframe: str) -> Optional[str]:
+        """Ancla elegida hoy para estas keywords en una petición anterior (None si no hay)"""
+        day = date.today().isoformat()
+        for keyword in keywords:
+            entry = self._cache.get(self._cache_key(keyword, region, timeframe, day))
+            if entry is not None and self._cache_key(entry['anchor'], region, timeframe, day) in self._cache:
+                return entry['anchor']
+        return None
+
+    # === DESCARGA ===
+
+    def _request(self, terms: List[str], region: str, timeframe: str) -> Optional[pd.DataFrame]:
+        """Una petición a Google Trends (respetando presupuesto y pausa)"""
+        if self.requests_made >= self.max_requests:
+            return None
+
+        wait = self.request_delay - (time.monotonic() - self._last_request)
+        if wait > 0:
+            time.sleep(wait)
+
+        self.requests_made += 1
+        try:
+            self.pytrends.build_payload(kw_list=terms, cat=0, timeframe=timeframe, geo=region)
+            return self.pytrends.interest_over_time()
+        except Exception as e:
+            logger.error(f"❌ Error obteniendo tendencias para {terms}: {e}")
+            return None
+        finally:
+            self._last_request = time.monotonic()
+
+    def fetch(self, keywords: Iterable[str], region: str = 'US',
+              timeframe: str = 'today 3-m') -> Dict[str, pd.Series]:
+        """
+        Series de interés de varias keywords en una escala común
+
+        Args:
+            keywords: Keywords a consultar
+            region: Región (US, ES, etc.)
+            timeframe: Período ('today 3-m', 'today 12-m', etc.)
+
+        Returns:
+            {keyword: Serie de interés}; faltan las keywords sin datos o que
+            no cupieron en el presupuesto de peticiones
+        """
+        keywords = list(dict.fromkeys(keywords))
+        if not keywords:
+            return {}
+
+        # Ancla configurada, o la que eligió hoy el primer payload de estas keywords
+        anchor = self.anchor or self._cached_anchor(keywords, region, timeframe)
+        results = {}
+        reference = None
+
+        # Una sola keyword sin ancla configurada: la escala da igual
+        if self.anchor is None and len(keywords) == 1:
+            series = self._cached(keywords[0], region, timeframe, None)
+            if series is not None:
+                results[keywords[0]] = series
+        elif anchor is not None:
+            for keyword in keywords:
+                series = self._cached(keyword, region, timeframe, anchor)
+                if series is not None:
+                    results[keyword] = series
+            reference = self._cached(anchor, region, timeframe, anchor)
+
+        missing = [k for k in keywords if k not in results and k != anchor]
+        anchor_pending = anchor in keywords and anchor not in results
+
+        if not missing and not anchor_pending:
+            logger.info(f"📦 Tendencias de {len(results)} keywords desde caché ({region})")
+            return {k: results[k] for k in keywords if k in results}
+
+        requests_before = self.requests_made
+
+        if anchor is None:
+            # Sin ancla: el primer payload son 5 keywords y el ancla es la de más interés
+            first, missing = missing[:MAX_TERMS], missing[MAX_TERMS:]
+            data = self._request(first, region, timeframe)
+            if data is not None and not data.empty:
+                means = data[[k for k in first if k in data.columns]].astype(float).mean()
+                if not means.empty:
+                    anchor = means.idxmax()
+                    reference = data[anchor].astype(float).rename(anchor)
+                    for keyword in means.index:
+                        series = data[keyword].astype(float).rename(keyword)
+                        self._store(series, region, timeframe, anchor)
+                        results[keyword] = series
+                    logger.info(f"⚓ Ancla de Google Trends ({region}): '{anchor}' (interés medio {means.max():.1f})")
+
+            if anchor is None:
+                logger.warning(f"⚠️  No hay datos de tendencias para {first} en {region}")
+                missing = []
+
+        batch_size = MAX_TERMS - 1
+        batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+        if reference is None and anchor is not None and not batches:
+            # Solo falta el ancla
+            batches = [[]]
+
+        for batch in batches:
+            if reference is not None and reference.mean() < MIN_ANCHOR_MEAN:
+                logger.warning(f"⚠️  El ancla '{anchor}' no tiene volumen en {region} "
+                               f"(media {reference.mean():.1f}): {len(missing) - sum(k in results for k in missing)} "
+                               f"keywords sin escala común, configura trends.google_trends.anchor")
+                break
+
+            data = self._request([anchor] + batch, region, timeframe)
+            if data is None:
+                if self.requests_made >= self.max_requests:
+                    logger.warning(f"⚠️  Presupuesto de Google Trends agotado ({self.max_requests} peticiones), "
+                                   f"{len(missing) - sum(k in results for k in missing)} keywords sin datos")
+                    break
+                continue
+
+            if data.empty or anchor not in data.columns:
+                logger.warning(f"⚠️  No hay datos de tendencias para {batch} en {region}")
+                continue
+
+            batch_anchor = data[anchor].astype(float)
+
+            if reference is None:
+                # Primer lote del día: fija la escala
+                reference = batch_anchor.rename(anchor)
+                self._store(reference, region, timeframe, anchor)
+                scale = 1.0
+            else:
+                batch_mean = batch_anchor.mean()
+                if batch_mean < MIN_ANCHOR_MEAN:
+                    # Otro término del lote domina el payload y aplasta el ancla
+                    logger.warning(f"⚠️  Ancla '{anchor}' sin volumen en el lote {batch} ({region}, "
+                                   f"media {batch_mean:.1f}), se descarta")
+                    continue
+                scale = reference.mean() / batch_mean
+
+            for keyword in batch:
+                if keyword in data.columns:
+                    series = (data[keyword].astype(float) * scale).rename(keyword)
+                    self._store(series, region, timeframe, anchor)
+                    results[keyword] = series
+
+        if reference is not None and anchor in keywords:
+            results[anchor] = reference
+
+        if self.requests_made > requests_before:
+            self._save_cache()
+
+        logger.info(f"📈 Tendencias de {len(results)}/{len(keywords)} keywords ({region}), "
+                    f"{self.requests_made - requests_before} peticiones a Google Trends")
+
+        # Mismo orden que la entrada
+        return {k: results[k] for k in keywords if k in results}
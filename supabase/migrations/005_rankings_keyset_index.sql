@@ -0,0 +1,21 @@
+-- ============================================================================
+-- Migration 005: Keyset Index for History Export
+-- ============================================================================
+-- Description: Composite index for cursor pagination on (tracked_at, keyword_id)
+-- Author: ASO Rank Guard
+-- Date: 2026-10-18
+-- Dependencies: 002_tracking_tables.sql (rankings)
+-- ============================================================================
+
+-- /api/rankings/export pagina con ORDER BY tracked_at, keyword_id y el filtro
+-- (tracked_at > t) OR (tracked_at = t AND keyword_id > k). Con este índice cada
+-- página es un index range scan, sin ordenar ni saltar filas con OFFSET.
+CREATE INDEX IF NOT EXISTS idx_rankings_tracked_keyword
+  ON public.rankings(tracked_at, keyword_id);
+
+-- Rollback:
+-- DROP INDEX IF EXISTS public.idx_rankings_tracked_keyword;
+
+-- ============================================================================
+-- END OF MIGRATION 005
+-- ============================================================================
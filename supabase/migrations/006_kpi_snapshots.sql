@@ -0,0 +1,145 @@
+-- ============================================================================
+-- Migration 006: KPI Snapshots
+-- ============================================================================
+-- Description: Per-run KPI table (overall + per country) written at ingest time
+-- Author: ASO Rank Guard
+-- Date: 2026-10-18
+-- Dependencies: 002_tracking_tables.sql (tracking_jobs), 004_functions_triggers.sql (get_app_stats)
+-- ============================================================================
+
+-- ============================================================================
+-- TABLE: kpi_snapshots
+-- Purpose: KPIs de cada tracking run (top 10/30/50/100, visibilidad, media,
+--          mejores keywords y movers). Los escribe el tracker al guardar los
+--          rankings; API, bots y get_app_stats() los leen sin recalcular.
+-- RLS: Enabled (users can only see KPIs of their apps)
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS public.kpi_snapshots (
+  id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+  app_id UUID NOT NULL REFERENCES public.apps(id) ON DELETE CASCADE,
+  job_id UUID REFERENCES public.tracking_jobs(id) ON DELETE SET NULL,
+  run_at TIMESTAMPTZ NOT NULL,
+  scope TEXT NOT NULL CHECK (scope IN ('overall', 'country')),
+  scope_value TEXT NOT NULL DEFAULT '', -- '' para overall, código de país si no
+
+  checks INT NOT NULL,
+  keywords INT NOT NULL,
+  ranked INT NOT NULL,
+  top_10 INT NOT NULL,
+  top_30 INT NOT NULL,
+  top_50 INT NOT NULL,
+  top_100 INT NOT NULL,
+  visible INT NOT NULL,
+  top100_rate NUMERIC(5, 1) NOT NULL,
+  avg_rank NUMERIC(6, 1),
+  avg_rank_visible NUMERIC(6, 1),
+  best_keyword TEXT,
+  best_rank INT,
+  top_keywords JSONB NOT NULL DEFAULT '[]'::jsonb,
+  movers JSONB NOT NULL DEFAULT '[]'::jsonb,
+
+  created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+
+  CONSTRAINT unique_kpi_run UNIQUE(app_id, scope, scope_value, run_at)
+);
+
+-- Último KPI / histórico de un ámbito: index range scan
+CREATE INDEX IF NOT EXISTS idx_kpi_snapshots_app_scope_run
+  ON public.kpi_snapshots(app_id, scope, scope_value, run_at DESC);
+
+COMMENT ON TABLE public.kpi_snapshots IS 'Per-run KPI aggregates computed at ingest time';
+COMMENT ON COLUMN public.kpi_snapshots.top100_rate IS 'Percentage of checks ranked in the top 100';
+COMMENT ON COLUMN public.kpi_snapshots.visible IS 'Checks ranked below 250 (visible in search)';
+COMMENT ON COLUMN public.kpi_snapshots.movers IS 'Largest rank changes vs the previous run (positive = improvement)';
+
+-- ============================================================================
+-- RLS
+-- ============================================================================
+
+ALTER TABLE public.kpi_snapshots ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view KPIs for own apps"
+  ON public.kpi_snapshots
+  FOR SELECT
+  USING (
+    EXISTS (
+      SELECT 1 FROM public.apps
+      WHERE apps.id = kpi_snapshots.app_id
+        AND apps.user_id = auth.uid()
+    )
+  );
+
+CREATE POLICY "Service role can insert KPIs"
+  ON public.kpi_snapshots
+  FOR INSERT
+  WITH CHECK (true); -- Service role bypass RLS, pero la política existe para claridad
+
+-- ============================================================================
+-- FUNCTION: Get app statistics (reads the latest KPI snapshot)
+-- Falls back to the per-keyword scan when the app has no snapshot yet
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION public.get_app_stats(p_app_id UUID)
+RETURNS JSON AS $$
+DECLARE
+  result JSON;
+  snapshot public.kpi_snapshots%ROWTYPE;
+BEGIN
+  SELECT * INTO snapshot
+  FROM public.kpi_snapshots
+  WHERE app_id = p_app_id
+    AND scope = 'overall'
+    AND scope_value = ''
+  ORDER BY run_at DESC
+  LIMIT 1;
+
+  IF FOUND THEN
+    SELECT json_build_object(
+      'total_keywords', COUNT(*),
+      'active_keywords', COUNT(*) FILTER (WHERE k.is_active = true),
+      'top10_count', snapshot.top_10,
+      'top50_count', snapshot.top_50,
+      'top100_count', snapshot.top_100,
+      'top100_rate', snapshot.top100_rate,
+      'avg_rank', snapshot.avg_rank,
+      'best_rank', snapshot.best_rank,
+      'last_tracked', snapshot.run_at,
+      'movers', snapshot.movers
+    ) INTO result
+    FROM public.keywords k
+    WHERE k.app_id = p_app_id;
+
+    RETURN result;
+  END IF;
+
+  SELECT json_build_object(
+    'total_keywords', COUNT(DISTINCT k.id),
+    'active_keywords', COUNT(DISTINCT k.id) FILTER (WHERE k.is_active = true),
+    'top10_count', COUNT(DISTINCT k.id) FILTER (WHERE r.rank <= 10),
+    'top50_count', COUNT(DISTINCT k.id) FILTER (WHERE r.rank <= 50),
+    'avg_rank', ROUND(AVG(r.rank)::numeric, 1),
+    'best_rank', MIN(r.rank),
+    'last_tracked', MAX(r.tracked_at)
+  ) INTO result
+  FROM public.keywords k
+  LEFT JOIN LATERAL (
+    SELECT rank, tracked_at
+    FROM public.rankings
+    WHERE keyword_id = k.id
+    ORDER BY tracked_at DESC
+    LIMIT 1
+  ) r ON true
+  WHERE k.app_id = p_app_id;
+
+  RETURN result;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Rollback:
+-- DROP TABLE IF EXISTS public.kpi_snapshots;
+-- (y volver a crear get_app_stats() desde 004_functions_triggers.sql)
+
+-- ============================================================================
+-- END OF MIGRATION 006
+-- ============================================================================
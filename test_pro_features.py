@@ -169,6 +169,37 @@ def test_dashboard_generator():
         return False
 
 
+def test_cannibalization_clusters():
+    """Test Cannibalization Clusters"""
+    print("🧪 Testing Cannibalization Clusters...")
+    try:
+        from src.keyword_clusters import KeywordClusterer, MIN_CLUSTER_SIZE, tokenize
+        
+        with open('config/config.yaml.example') as f:
+            keywords = yaml.safe_load(f)['keywords']
+        
+        clusterer = KeywordClusterer()
+        clusters = clusterer.cluster(keywords, min_size=MIN_CLUSTER_SIZE)
+        
+        # Un nicho no debe colapsar en un solo cluster
+        largest = max(len(group) for group in clusters)
+        assert largest <= len(keywords) // 4, f"Cluster too large: {largest}/{len(keywords)}"
+        
+        # Todas las keywords de un cluster comparten las mismas 2+ palabras
+        for group in clusters:
+            shared = frozenset.intersection(*(tokenize(kw) for kw in group))
+            assert len(shared) >= 2, f"Cluster without shared words: {group}"
+        
+        # Deterministas: no dependen del orden de entrada
+        assert clusterer.cluster(list(reversed(keywords)), min_size=MIN_CLUSTER_SIZE) == clusters
+        
+        print(f"   ✅ OK - {len(clusters)} clusters, largest {largest}/{len(keywords)} keywords")
+        return True
+    except Exception as e:
+        print(f"   ❌ FAIL - {e}")
+        return False
+
+
 def main():
     """Run all tests"""
     print("="*60)
@@ -183,6 +214,7 @@ def main():
         ("Seasonal Patterns", test_seasonal_patterns),
         ("Cost Calculator", test_cost_calculator),
         ("Dashboard Generator", test_dashboard_generator),
+        ("Cannibalization Clusters", test_cannibalization_clusters),
     ]
     
     results = []